@@ -186,6 +186,20 @@ def create_app(config_class=Config) -> Flask:
     # Register routes and error handlers
     register_routes(app)
     register_error_handlers(app)
+
+    # Keep the shared quota snapshot fresh; /api/quota/* only reads it
+    try:
+        from services.quota_snapshots import start_quota_refresher
+        start_quota_refresher(app)
+    except Exception as e:
+        logger.warning(f"Quota refresher not started: {e}")
+
+    # Optional materialised admin dashboard totals (DASHBOARD_MATERIALIZED_COUNTERS)
+    try:
+        from services.dashboard_stats import init_dashboard_counters
+        init_dashboard_counters(app)
+    except Exception as e:
+        logger.warning(f"Dashboard counters not enabled: {e}")
     
     return app
 
@@ -240,6 +254,16 @@ CREATE TABLE IF NOT EXISTS signup_meta (
             if 'full_name' not in meta_columns:
                 with db.engine.begin() as conn:
                     conn.execute(text("ALTER TABLE signup_meta ADD COLUMN full_name VARCHAR(255)"))
+        # Indexes behind the per-user dashboard counts and access lookups (create_all skips existing tables)
+        lookup_indexes = [
+            ('virtual_host', 'user_id'), ('virtual_host', 'linux_username'),
+            ('email_domain', 'virtual_host_id'), ('email_account', 'domain_id'),
+            ('dns_record', 'zone_id'), ('database', 'owner_id'),
+        ]
+        with db.engine.begin() as conn:
+            for table, column in lookup_indexes:
+                if table in tables:
+                    conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON "{table}" ({column})'))
     except Exception as e:
         # Do not block app start; log only
         logger.warning(f"Ensure schema migrations failed: {e}")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dashboard resource counts, per-count queries vs one grouped query.
+
+Builds a throwaway SQLite database with N virtual hosts (default 10000)
+spread over U users (default 1000); every vhost has an email domain with 3
+accounts, a DNS zone with 5 records, an SSL certificate and a database.
+It then times, per dashboard request:
+
+  legacy     the previous get_dashboard_stats: one COUNT per resource plus a
+             VirtualHost.query.filter_by(user_id=...).all() for each of the
+             email, DNS and SSL counts (debug prints left out)
+  grouped    services.dashboard_stats.count_resources: one SELECT of
+             scalar subqueries
+  counters   DashboardCounters.totals: the materialised admin totals
+
+for regular users (a sample of S users) and for an admin, and reports the
+SQL statements each needed. The results of legacy and grouped are compared.
+
+Usage (from backend/):
+    python benchmarks/bench_dashboard_stats.py [--vhosts 10000] [--users 1000] [--sample 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from models.base import db  # noqa: E402
+from models.user import User  # noqa: E402
+from services.dashboard_stats import COUNTED_MODELS, DashboardCounters, count_resources  # noqa: E402
+from models.database import Database  # noqa: E402
+from models.dns import DNSZone, DNSRecord  # noqa: E402
+from models.email import EmailDomain, EmailAccount  # noqa: E402
+from models.ssl_certificate import SSLCertificate  # noqa: E402
+from models.virtual_host import VirtualHost  # noqa: E402
+
+
+def populate(vhosts: int, users: int) -> None:
+    db.session.execute(insert(User.__table__), [
+        {'id': u + 1, 'username': f'user{u:05d}', 'role': 'user', 'is_admin': False, 'is_system_user': False}
+        for u in range(users)
+    ])
+    owners = [(v % users) + 1 for v in range(vhosts)]
+    db.session.execute(insert(VirtualHost.__table__), [
+        {'id': v + 1, 'domain': f'site{v:06d}.test', 'document_root': f'/home/user{owners[v] - 1:05d}/public_html',
+         'linux_username': f'user{owners[v] - 1:05d}', 'user_id': owners[v]}
+        for v in range(vhosts)
+    ])
+    db.session.execute(insert(Database.__table__), [
+        {'id': v + 1, 'name': f'db{v:06d}', 'owner_id': owners[v]} for v in range(vhosts)
+    ])
+    db.session.execute(insert(EmailDomain.__table__), [
+        {'id': v + 1, 'domain': f'site{v:06d}.test', 'virtual_host_id': v + 1} for v in range(vhosts)
+    ])
+    db.session.execute(insert(EmailAccount.__table__), [
+        {'id': v * 3 + a + 1, 'username': f'box{a}', 'password': 'x', 'domain_id': v + 1}
+        for v in range(vhosts) for a in range(3)
+    ])
+    db.session.execute(insert(DNSZone.__table__), [
+        {'id': v + 1, 'domain_name': f'site{v:06d}.test', 'serial': '2024010101'} for v in range(vhosts)
+    ])
+    db.session.execute(insert(DNSRecord.__table__), [
+        {'id': v * 5 + r + 1, 'zone_id': v + 1, 'name': f'r{r}', 'record_type': 'A', 'content': '192.0.2.1'}
+        for v in range(vhosts) for r in range(5)
+    ])
+    db.session.execute(insert(SSLCertificate.__table__), [
+        {'id': v + 1, 'domain': f'site{v:06d}.test', 'user_id': owners[v]} for v in range(vhosts)
+    ])
+    db.session.commit()
+
+
+def legacy_counts(user_id: int, is_admin: bool) -> dict:
+    """The per-count queries get_dashboard_stats used to run"""
+    if is_admin:
+        return {
+            'virtualHosts': VirtualHost.query.count(),
+            'databases': Database.query.count(),
+            'emailAccounts': EmailAccount.query.count(),
+            'dnsRecords': DNSRecord.query.count(),
+            'sslCertificates': SSLCertificate.query.count(),
+        }
+    counts = {
+        'virtualHosts': VirtualHost.query.filter_by(user_id=user_id).count(),
+        'databases': Database.query.filter_by(owner_id=user_id).count(),
+    }
+    user_vhost_ids = [vh.id for vh in VirtualHost.query.filter_by(user_id=user_id).all()]
+    counts['emailAccounts'] = EmailAccount.query.join(EmailDomain).filter(
+        EmailDomain.virtual_host_id.in_(user_vhost_ids)).count()
+    user_domains = [vh.domain for vh in VirtualHost.query.filter_by(user_id=user_id).all()]
+    counts['dnsRecords'] = DNSRecord.query.join(DNSZone).filter(DNSZone.domain_name.in_(user_domains)).count()
+    user_domains = [vh.domain for vh in VirtualHost.query.filter_by(user_id=user_id).all()]
+    counts['sslCertificates'] = SSLCertificate.query.filter(SSLCertificate.domain.in_(user_domains)).count()
+    return counts
+
+
+def timed(label: str, func, calls: int, statements: list) -> list:
+    """Run func() calls times; print per-call latency and statements, return the results"""
+    before = len(statements)
+    start = time.perf_counter()
+    results = [func(i) for i in range(calls)]
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<9} {elapsed / calls * 1000:8.3f} ms/call  "
+          f"{(len(statements) - before) / calls:5.1f} statements/call")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vhosts', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--sample', type=int, default=200, help='regular users timed')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            populate(args.vhosts, args.users)
+            print(f"populated {args.vhosts} vhosts / {args.users} users in {time.perf_counter() - start:.1f}s")
+
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+            sample = [(i * args.users // args.sample) + 1 for i in range(min(args.sample, args.users))]
+            users = {u.id: u.username for u in User.query.filter(User.id.in_(sample))}
+
+            print(f"regular user ({len(sample)} users, {args.vhosts // args.users} vhosts each):")
+            old = timed('legacy', lambda i: legacy_counts(sample[i], False), len(sample), statements)
+            new = timed('grouped', lambda i: count_resources(sample[i], users[sample[i]], False),
+                        len(sample), statements)
+            mismatches = sum(1 for a, b in zip(old, new) if a != b)
+
+            print("admin (whole tables):")
+            rounds = 20
+            old_admin = timed('legacy', lambda i: legacy_counts(0, True), rounds, statements)
+            new_admin = timed('grouped', lambda i: count_resources(None, None, True), rounds, statements)
+            counters = DashboardCounters()
+            counters.rebuild()
+            counted = timed('counters', lambda i: counters.totals(), rounds, statements)
+            mismatches += sum(1 for a, b, c in zip(old_admin, new_admin, counted) if not a == b == c)
+
+            print(f"totals: {dict((key, new_admin[0][key]) for key in COUNTED_MODELS)}")
+            print(f"result mismatches: {mismatches}")
+            return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: stat/access syscalls per directory listing.
+
+Creates a directory with N entries (default 50,000) and lists it with the old
+per-entry pipeline (entry.stat + os.stat for permissions + 3x os.access) and
+with FileService._list_directory_contents, which derives everything from one
+entry.stat(). Syscalls are counted by wrapping os.stat/os.lstat/os.access and
+the scandir entries; run under `strace -c -f` for kernel-level numbers.
+
+Usage (from backend/):
+    python benchmarks/bench_listing_syscalls.py [--entries 50000] [--keep]
+"""
+
+import argparse
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.file_service import FileService  # noqa: E402
+
+
+class CountingEntry:
+    """DirEntry proxy that counts the syscalls a real DirEntry would make."""
+
+    def __init__(self, entry, counter):
+        self._entry = entry
+        self._counter = counter
+        self._stat_cached = False
+        self._lstat_cached = False
+
+    @property
+    def name(self):
+        return self._entry.name
+
+    @property
+    def path(self):
+        return self._entry.path
+
+    def _follow(self):
+        if not self._stat_cached:
+            self._counter['stat'] += 1
+            self._stat_cached = True
+
+    def stat(self, *, follow_symlinks=True):
+        if follow_symlinks:
+            self._follow()
+        elif not self._lstat_cached:
+            self._counter['lstat'] += 1
+            self._lstat_cached = True
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def is_dir(self, *, follow_symlinks=True):
+        # d_type answers this for free unless the entry is a symlink to follow
+        if follow_symlinks and self._entry.is_symlink():
+            self._follow()
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, *, follow_symlinks=True):
+        if follow_symlinks and self._entry.is_symlink():
+            self._follow()
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+
+class CountingScandir:
+    def __init__(self, real_scandir, path, counter):
+        self._it = real_scandir(path)
+        self._counter = counter
+
+    def __iter__(self):
+        for entry in self._it:
+            yield CountingEntry(entry, self._counter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._it.close()
+
+
+def install_counters(counter):
+    """Patch os functions so every stat-family call is counted; returns an undo callable."""
+    originals = {name: getattr(os, name) for name in ('stat', 'lstat', 'access', 'scandir')}
+
+    def counted(name):
+        real = originals[name]
+
+        def wrapper(*args, **kwargs):
+            counter[name] += 1
+            return real(*args, **kwargs)
+        return wrapper
+
+    os.stat = counted('stat')
+    os.lstat = counted('lstat')
+    os.access = counted('access')
+    os.scandir = lambda path='.': CountingScandir(originals['scandir'], path, counter)
+
+    def undo():
+        for name, func in originals.items():
+            setattr(os, name, func)
+    return undo
+
+
+def legacy_list(service, full_path, base_dir):
+    """The per-entry pipeline as it was before the single-stat rewrite."""
+    items = []
+    with os.scandir(full_path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+                is_file = entry.is_file()
+                stat_info = entry.stat()
+                items.append({
+                    'name': entry.name,
+                    'type': service._get_file_type(entry.name) if is_file else 'folder',
+                    'size': stat_info.st_size if is_file else None,
+                    'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
+                    'path': os.path.relpath(entry.path, base_dir).replace(os.sep, '/'),
+                    'permissions': service._get_file_permissions(entry.path),
+                    'isDir': is_dir,
+                    'isSymlink': entry.is_symlink(),
+                    'isReadable': os.access(entry.path, os.R_OK),
+                    'isWritable': os.access(entry.path, os.W_OK),
+                    'isExecutable': os.access(entry.path, os.X_OK)
+                })
+            except OSError:
+                continue
+    return sorted(items, key=lambda x: (x['type'] != 'folder', x['name'].lower()))
+
+
+def build_tree(root, entries):
+    for i in range(entries):
+        path = os.path.join(root, f'file_{i:06d}.txt')
+        with open(path, 'w') as f:
+            f.write('x' * (i % 512))
+        if i % 100 == 0:
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+    # A few symlinks so the follow-symlink path is exercised as well
+    for i in range(0, entries, 1000):
+        os.symlink(os.path.join(root, f'file_{i:06d}.txt'), os.path.join(root, f'link_{i:06d}'))
+
+
+def measure(label, func):
+    counter = Counter()
+    undo = install_counters(counter)
+    try:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+    finally:
+        undo()
+    syscalls = counter['stat'] + counter['lstat'] + counter['access']
+    print(f"{label:<10} entries={len(result):>7}  stat={counter['stat']:>7}  lstat={counter['lstat']:>5}  "
+          f"access={counter['access']:>7}  total={syscalls:>7}  "
+          f"per-entry={syscalls / max(len(result), 1):.2f}  time={elapsed:.3f}s")
+    return syscalls, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--keep', action='store_true', help='keep the generated directory')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='listing-bench-')
+    try:
+        print(f"Creating {args.entries} entries in {root} ...")
+        build_tree(root, args.entries)
+        service = FileService.__new__(FileService)
+        service.root_dir = root
+
+        # Warm the dentry/inode caches so both runs see the same page cache state
+        legacy_list(service, root, root)
+
+        before, before_time = measure('before', lambda: legacy_list(service, root, root))
+        after, after_time = measure('after', lambda: service._list_directory_contents(root, root, lazy_sizes=True))
+        print(f"syscalls: {before} -> {after} ({before / max(after, 1):.1f}x fewer), "
+              f"time: {before_time:.3f}s -> {after_time:.3f}s")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-threaded ZipFile.write vs ParallelArchiver by core count.
+
+Builds a synthetic public_html tree (default 2 GB): ~70% compressible
+HTML/CSS/JS text spread over many small files plus a few large logs, ~30%
+incompressible images that are stored rather than deflated. Each run archives
+the full tree and the table reports wall time, throughput and speedup against
+the single-threaded baseline.
+
+Usage (from backend/):
+    python benchmarks/bench_parallel_archive.py [--size-mb 2048] [--workers 1,2,4,8] [--tar] [--keep]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.file_service import FileService  # noqa: E402
+from services.parallel_archive import ParallelArchiver  # noqa: E402
+
+WORDS = ('<div class="row">', '</div>', '<p>', 'lorem', 'ipsum', 'dolor', 'function', 'return',
+         'var', '{', '}', 'color:', '#fff;', 'margin:', '0 auto;', 'wp-content', 'jquery', 'null')
+
+
+def make_text(size: int, rng: random.Random) -> bytes:
+    chunk = ' '.join(rng.choice(WORDS) for _ in range(20000)).encode()
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+
+def build_site(root: str, size_mb: int, seed: int = 1) -> int:
+    """Create the synthetic tree and return the number of files."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    text_block = make_text(4 * 1024 * 1024, rng)
+    written = 0
+    files = 0
+    while written < target:
+        section = os.path.join(root, 'public_html', f'section{files // 500:03d}')
+        os.makedirs(section, exist_ok=True)
+        kind = rng.random()
+        if kind < 0.30:
+            size = rng.randint(50 * 1024, 2 * 1024 * 1024)
+            name, data = f'img{files}.jpg', os.urandom(size)
+        elif kind < 0.31:
+            size = rng.randint(20, 60) * 1024 * 1024
+            name, data = f'access{files}.log', (text_block * (size // len(text_block) + 1))[:size]
+        else:
+            size = rng.randint(1024, 64 * 1024)
+            offset = rng.randint(0, len(text_block) - size)
+            name = f'page{files}.' + rng.choice(('html', 'css', 'js', 'php'))
+            data = text_block[offset:offset + size]
+        with open(os.path.join(section, name), 'wb') as f:
+            f.write(data)
+        written += len(data)
+        files += 1
+    return files
+
+
+def members(base_dir: str):
+    items = [os.path.join(base_dir, 'public_html')]
+    for filepath, arcname in FileService._iter_zip_members(base_dir, items):
+        yield filepath, arcname, FileService._zip_compress_type(arcname, True)
+
+
+def run_baseline(base_dir: str, out: str) -> float:
+    start = time.perf_counter()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for filepath, arcname, compress_type in members(base_dir):
+            zf.write(filepath, arcname, compress_type=compress_type)
+    return time.perf_counter() - start
+
+
+def run_parallel(base_dir: str, out: str, workers: int, tar: bool) -> float:
+    archiver = ParallelArchiver(workers=workers)
+    archiver.executor.submit(int).result()  # start the pool outside the timed region
+    try:
+        start = time.perf_counter()
+        if tar:
+            archiver.write_tar(out, base_dir, [os.path.join(base_dir, 'public_html')], compression='gz')
+        else:
+            archiver.write_zip(out, members(base_dir))
+        return time.perf_counter() - start
+    finally:
+        archiver.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--workers', default='',
+                        help='comma-separated worker counts (default: powers of two up to the core count)')
+    parser.add_argument('--tar', action='store_true', help='also benchmark tar.gz output')
+    parser.add_argument('--keep', action='store_true', help='keep the generated tree')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(',')]
+    else:
+        counts = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+
+    base_dir = tempfile.mkdtemp(prefix='bench-archive-')
+    try:
+        print(f"Building {args.size_mb} MB synthetic site in {base_dir} ...")
+        files = build_site(base_dir, args.size_mb)
+        print(f"{files} files, {cores} cores\n")
+        out = os.path.join(base_dir, 'out.archive')
+
+        # Warm the page cache so the first run is not penalised
+        for filepath, _, _ in members(base_dir):
+            with open(filepath, 'rb') as f:
+                while f.read(1024 * 1024):
+                    pass
+
+        baseline = run_baseline(base_dir, out)
+        mb = args.size_mb
+        print(f"{'mode':<16}{'workers':>8}{'seconds':>10}{'MB/s':>10}{'speedup':>9}{'size MB':>10}")
+        print(f"{'zip (zipfile)':<16}{1:>8}{baseline:>10.2f}{mb / baseline:>10.1f}{1.0:>9.2f}"
+              f"{os.path.getsize(out) / 1048576:>10.1f}")
+        modes = [('zip (parallel)', False)] + ([('tar.gz', True)] if args.tar else [])
+        for label, tar in modes:
+            for workers in counts:
+                elapsed = run_parallel(base_dir, out, workers, tar)
+                print(f"{label:<16}{workers:>8}{elapsed:>10.2f}{mb / elapsed:>10.1f}{baseline / elapsed:>9.2f}"
+                      f"{os.path.getsize(out) / 1048576:>10.1f}")
+    finally:
+        if args.keep:
+            print(f"\nTree kept at {base_dir}")
+        else:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rate limits across forked worker processes, per-worker memory vs shared SQLite.
+
+Creates each store in the parent, then forks W workers (default 8), as
+gunicorn does with --preload. Every worker sends H hits (default 500) for
+the same client key against a limit of L requests per hour (default 100),
+so exactly L hits should be admitted in total:
+
+  memory     utils.rate_limit_store.MemoryWindowStore, one copy per worker:
+             up to W x L admitted
+  sqlite     utils.rate_limit_store.SQLiteWindowStore on a throwaway WAL
+             database shared by all workers: L admitted
+
+It also reports the mean hit latency seen by the workers. A second SQLite
+round gives every worker its own key and checks each one gets exactly L.
+Exits non-zero if the SQLite store admits anything but the limit.
+
+Usage (from backend/):
+    python benchmarks/bench_rate_limit_workers.py [--workers 8] [--hits 500] [--limit 100]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_limit_store import MemoryWindowStore, SQLiteWindowStore  # noqa: E402
+
+WINDOW = 3600
+
+
+def fork_workers(store, workers: int, hits: int, limit: int, shared_key: bool) -> list:
+    """Fork workers that hammer store; return [(admitted, seconds spent in hit)] per worker"""
+    children = []
+    for worker in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            key = 'rate_limit:sw:general_api:user_1' if shared_key else f'rate_limit:sw:general_api:user_{worker}'
+            admitted = 0
+            start = time.perf_counter()
+            for _ in range(hits):
+                allowed, _ = store.hit(key, limit, WINDOW)
+                admitted += allowed
+            elapsed = time.perf_counter() - start
+            os.write(write_fd, f"{admitted} {elapsed}".encode())
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    results = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as pipe:
+            admitted, elapsed = pipe.read().split()
+        os.waitpid(pid, 0)
+        results.append((int(admitted), float(elapsed)))
+    return results
+
+
+def report(label: str, results: list, hits: int) -> int:
+    admitted = sum(count for count, _ in results)
+    latency = sum(elapsed for _, elapsed in results) / (len(results) * hits) * 1e6
+    print(f"  {label:<8} {admitted:6d} admitted  {latency:8.1f} us/hit")
+    return admitted
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--hits', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.workers} workers x {args.hits} hits on one key, limit {args.limit}/h:")
+        report('memory', fork_workers(MemoryWindowStore(), args.workers, args.hits, args.limit, True), args.hits)
+        store = SQLiteWindowStore(os.path.join(tmp, 'shared.db'))
+        admitted = report('sqlite', fork_workers(store, args.workers, args.hits, args.limit, True), args.hits)
+        failures += admitted != args.limit
+
+        print(f"{args.workers} workers x {args.hits} hits, one key each:")
+        store = SQLiteWindowStore(os.path.join(tmp, 'per_key.db'))
+        results = fork_workers(store, args.workers, args.hits, args.limit, False)
+        report('sqlite', results, args.hits)
+        failures += sum(count != args.limit for count, _ in results)
+
+    print(f"limit violations: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: in-memory rate limiter, timestamp log vs sliding window counter.
+
+Replays H hits (default 200000) spread over K client keys (default 20000)
+with the general_api rule (100 requests per hour) through:
+
+  legacy     the previous RateLimiter._is_allowed_memory: a list of request
+             timestamps per key, rebuilt with a list comprehension on every
+             hit and never evicted
+  sliding    utils.rate_limit_store.MemoryWindowStore: three counters per key,
+             sharded locks, idle keys swept
+
+and reports throughput, the memory held by the store afterwards (tracemalloc)
+and, for the sliding store, throughput with T threads (default 8). A hot-key
+run (one client hammering the limit) shows the cost of the legacy log
+growing with every rejected request. Finally idle-key eviction is checked
+with a 1 second window.
+
+Usage (from backend/):
+    python benchmarks/bench_rate_limiter.py [--hits 200000] [--keys 20000] [--threads 8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_limit_store import MemoryWindowStore  # noqa: E402
+
+LIMIT, WINDOW = 100, 3600
+
+
+class LegacyMemoryStore:
+    """The timestamp log RateLimiter._is_allowed_memory used to keep"""
+
+    def __init__(self):
+        self.memory_store = {}
+
+    def hit(self, key, limit, window, cost=1):
+        now = time.time()
+        cutoff = now - window
+        if key in self.memory_store:
+            self.memory_store[key] = [req_time for req_time in self.memory_store[key] if req_time > cutoff]
+        else:
+            self.memory_store[key] = []
+        self.memory_store[key].append(now)
+        current_requests = len(self.memory_store[key])
+        return current_requests <= limit, {
+            'limit': limit,
+            'remaining': max(0, limit - current_requests),
+            'reset': int(now + window),
+            'current': current_requests
+        }
+
+
+def run(label: str, make_store, keys: list) -> None:
+    """Replay keys through a fresh store; print hits/s, then replay again under tracemalloc for the memory held"""
+    store = make_store()
+    start = time.perf_counter()
+    denied = 0
+    for key in keys:
+        allowed, _ = store.hit(key, LIMIT, WINDOW)
+        denied += not allowed
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    store = make_store()
+    for key in keys:
+        store.hit(key, LIMIT, WINDOW)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<8} {len(keys) / elapsed:12,.0f} hits/s  {held / 1024 / 1024:8.2f} MiB held  "
+          f"{denied:7d} denied")
+
+
+def run_threads(store, keys: list, threads: int) -> None:
+    chunks = [keys[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=lambda c: [store.hit(k, LIMIT, WINDOW) for k in c], args=(chunk,))
+               for chunk in chunks]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    print(f"  sliding  {len(keys) / elapsed:12,.0f} hits/s  with {threads} threads")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hits', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    spread = [f"rate_limit:general_api:user_{rng.randrange(args.keys)}" for _ in range(args.hits)]
+    hot = ['rate_limit:general_api:user_1'] * min(args.hits, 20000)
+
+    print(f"{args.hits} hits over {args.keys} keys (limit {LIMIT}/{WINDOW}s):")
+    run('legacy', LegacyMemoryStore, spread)
+    run('sliding', MemoryWindowStore, spread)
+    run_threads(MemoryWindowStore(), spread, args.threads)
+
+    print(f"{len(hot)} hits on one key:")
+    run('legacy', LegacyMemoryStore, hot)
+    run('sliding', MemoryWindowStore, hot)
+
+    store = MemoryWindowStore(sweep_interval=0)
+    for i in range(1000):
+        store.hit(f"idle_{i}", LIMIT, 1)
+    time.sleep(2.1)
+    evicted = store.sweep()
+    print(f"idle keys evicted after two 1s windows: {evicted}/1000, {len(store)} left")
+    return 0 if evicted == 1000 and len(store) == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
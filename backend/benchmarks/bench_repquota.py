@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one ``repquota -a`` pass vs one ``quota -u`` process per user.
+
+Generates a repquota report for N synthetic users (default 5000; a mix of
+users under quota, over the soft limit with grace, over the hard limit and
+without a passwd entry) and times:
+
+  bulk      one ``cat`` of the whole report (standing in for repquota) plus
+            parse_repquota and a per-user QuotaReport.entry_for lookup
+  per-user  one ``cat`` of a single-user ``quota -u`` output per user, i.e.
+            just the process spawns the old refresh paid; measured on a
+            sample and extrapolated to N
+
+``--check`` instead parses every report in data/repquota/ and compares it
+with the expected .json next to it (the parser corpus).
+
+Usage (from backend/):
+    python benchmarks/bench_repquota.py [--users 5000] [--sample 500]
+    python benchmarks/bench_repquota.py --check
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.quota_report import QuotaReport, parse_repquota  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'repquota')
+
+HEADER = """*** Report for user quotas on device /dev/vda1
+Block grace time: 7days; Inode grace time: 7days
+                        Block limits                File limits
+User            used    soft    hard  grace    used  soft  hard  grace
+----------------------------------------------------------------------
+"""
+
+QUOTA_U_OUTPUT = """Disk quotas for user alice (uid 1001):
+     Filesystem  blocks   quota   limit   grace   files   quota   limit   grace
+      /dev/vda1  102400  512000  614400             830       0       0
+"""
+
+
+def build_report(users: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    lines = [HEADER]
+    for i in range(users):
+        name = f'#{100000 + i}' if i % 50 == 0 else f'user{i:05d}'
+        soft = rng.choice((0, 512000, 1048576, 5242880))
+        hard = int(soft * 1.2)
+        used = rng.randint(0, int(soft * 1.3) if soft else 4194304)
+        files = rng.randint(0, 200000)
+        if soft and used > soft:
+            grace = 'none' if used > hard else rng.choice(('6days', '23:59', '00:05'))
+            lines.append(f"{name:<10}+-  {used:>7} {soft:>7} {hard:>7} {grace:>6} {files:>7}     0     0       \n")
+        else:
+            lines.append(f"{name:<10}--  {used:>7} {soft:>7} {hard:>7}        {files:>7}     0     0       \n")
+    return ''.join(lines)
+
+
+def check_corpus() -> int:
+    failures = 0
+    cases = sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt')))
+    for path in cases:
+        with open(path) as f:
+            parsed = parse_repquota(f.read())
+        with open(path[:-4] + '.json') as f:
+            expected = json.load(f)
+        status = 'ok' if parsed == expected else 'FAIL'
+        if parsed != expected:
+            failures += 1
+            print(json.dumps(parsed, indent=2, sort_keys=True))
+        print(f"{status:<6}{os.path.basename(path)}")
+    print(f"\n{len(cases) - failures}/{len(cases)} corpus reports parsed as expected")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--sample', type=int, default=500, help='per-user spawns to time before extrapolating')
+    parser.add_argument('--check', action='store_true', help='verify the parser against the corpus and exit')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(check_corpus())
+
+    workdir = tempfile.mkdtemp(prefix='bench-repquota-')
+    report_path = os.path.join(workdir, 'repquota.txt')
+    quota_path = os.path.join(workdir, 'quota.txt')
+    with open(report_path, 'w') as f:
+        f.write(build_report(args.users))
+    with open(quota_path, 'w') as f:
+        f.write(QUOTA_U_OUTPUT)
+    names = [f'user{i:05d}' for i in range(args.users)]
+
+    try:
+        start = time.perf_counter()
+        output = subprocess.run(['cat', report_path], capture_output=True, text=True, check=True).stdout
+        spawned = time.perf_counter()
+        report = QuotaReport(parse_repquota(output), mounts={'/dev/vda1': ['/']})
+        parsed = time.perf_counter()
+        found = sum(1 for i, name in enumerate(names) if report.entry_for(name, '/home/' + name, 100000 + i))
+        bulk = time.perf_counter() - start
+
+        sample = min(args.sample, args.users)
+        start = time.perf_counter()
+        for _ in range(sample):
+            subprocess.run(['cat', quota_path], capture_output=True, text=True, check=True)
+        per_user = (time.perf_counter() - start) / sample * args.users
+
+        print(f"{args.users} users, {len(report)} report entries, {found} matched\n")
+        print(f"{'path':<28}{'processes':>10}{'seconds':>10}")
+        print(f"{'bulk (repquota)':<28}{1:>10}{bulk:>10.3f}")
+        print(f"{'  of which parse':<28}{'':>10}{parsed - spawned:>10.3f}")
+        print(f"{'per-user (quota -u), est.':<28}{args.users:>10}{per_user:>10.3f}")
+        print(f"\nspeedup: {per_user / bulk:.1f}x (per-user figure counts process spawns only)")
+    finally:
+        for path in (report_path, quota_path):
+            os.unlink(path)
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ from .database import Database
 from .dns import DNSRecord
 from .email import EmailAccount
 from .ssl_certificate import SSLCertificate, SSLCertificateLog
+from .dashboard_counter import DashboardCounter
 
 # Make sure all models are available
 __all__ = [
@@ -19,5 +20,6 @@ __all__ = [
     'DNSRecord',
     'EmailAccount',
     'SSLCertificate',
-    'SSLCertificateLog'
+    'SSLCertificateLog',
+    'DashboardCounter'
 ] 
\ No newline at end of file
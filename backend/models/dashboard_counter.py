@@ -0,0 +1,17 @@
+from datetime import datetime
+from models.database import db
+
+class DashboardCounter(db.Model):
+    """Materialised row count of one resource table (see services.dashboard_stats)"""
+    __tablename__ = 'dashboard_counter'
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'value': self.value,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -33,7 +33,7 @@ class DNSZone(db.Model):
 
 class DNSRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    zone_id = db.Column(db.Integer, db.ForeignKey('dns_zone.id'), nullable=False)
+    zone_id = db.Column(db.Integer, db.ForeignKey('dns_zone.id'), nullable=False, index=True)
     name = db.Column(db.String(255), nullable=False)
     record_type = db.Column(db.String(10), nullable=False)  # A, AAAA, CNAME, MX, TXT, etc.
     content = db.Column(db.String(255), nullable=False)
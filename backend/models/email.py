@@ -4,7 +4,7 @@ from models.database import db
 class EmailDomain(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     domain = db.Column(db.String(255), unique=True, nullable=False)
-    virtual_host_id = db.Column(db.Integer, db.ForeignKey('virtual_host.id'), nullable=True)
+    virtual_host_id = db.Column(db.Integer, db.ForeignKey('virtual_host.id'), nullable=True, index=True)
     status = db.Column(db.String(50), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -26,7 +26,7 @@ class EmailDomain(db.Model):
 
 class EmailAccount(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    domain_id = db.Column(db.Integer, db.ForeignKey('email_domain.id'), nullable=False)
+    domain_id = db.Column(db.Integer, db.ForeignKey('email_domain.id'), nullable=False, index=True)
     username = db.Column(db.String(64), nullable=False)
     password = db.Column(db.String(255), nullable=False)
     quota = db.Column(db.Integer, default=1024)  # MB
@@ -5,13 +5,13 @@ class VirtualHost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     domain = db.Column(db.String(255), unique=True, nullable=False)
     document_root = db.Column(db.String(255), nullable=False)
-    linux_username = db.Column(db.String(32), nullable=False)  # Removed unique=True
+    linux_username = db.Column(db.String(32), nullable=False, index=True)  # Removed unique=True
     server_admin = db.Column(db.String(255))
     php_version = db.Column(db.String(10))
     status = db.Column(db.String(50), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     aliases = db.relationship('VirtualHostAlias', backref='virtual_host', lazy='select', cascade='all, delete-orphan')
     
     def to_dict(self):
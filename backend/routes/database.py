@@ -13,7 +13,7 @@ from werkzeug.security import generate_password_hash
 
 
 def _is_admin(user):
-    return bool(getattr(user, 'is_admin', False) or getattr(user, 'role', '') == 'admin' or getattr(user, 'username', '') == 'root')
+    return bool(getattr(user, 'admin', False))
 
 
 database_bp = Blueprint('database', __name__)
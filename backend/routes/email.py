@@ -3,6 +3,7 @@ from models.email import EmailDomain, EmailAccount, EmailForwarder, EmailAlias,
 from models.virtual_host import VirtualHost
 from services.email_service import EmailService
 from services.maildb_reader import MailDbReader
+from services.access_index import access_index
 import crypt
 import secrets
 from utils.auth import token_required
@@ -27,16 +28,11 @@ def get_domains(current_user):
     """
     try:
         # Determine accessible virtual hosts
-        is_admin = (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root')
-        if is_admin:
+        vhost_ids = access_index.vhost_ids_for(current_user)
+        if vhost_ids is None:
             virtual_hosts = VirtualHost.query.all()
         else:
-            virtual_hosts = VirtualHost.query.filter(
-                or_(
-                    VirtualHost.user_id == current_user.id,
-                    VirtualHost.linux_username == current_user.username
-                )
-            ).all()
+            virtual_hosts = VirtualHost.query.filter(VirtualHost.id.in_(vhost_ids)).all() if vhost_ids else []
         
         domain_names = [vh.domain for vh in virtual_hosts]
         domain_name_to_vh = {vh.domain: vh for vh in virtual_hosts}
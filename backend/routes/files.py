@@ -1,14 +1,45 @@
-from flask import Blueprint, request, jsonify, send_file
-from services.file_service import FileService
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context, current_app
+from services.file_service import FileService, DEFAULT_PAGE_SIZE
+from services.file_jobs import get_file_job_manager, TERMINAL_STATUSES
 from utils.security import sanitize_filename, sanitize_path, is_safe_path
 from utils.auth import token_required
 from models.virtual_host import VirtualHost
 import os
+import json
+import time
+import mimetypes
+import unicodedata
+from urllib.parse import quote
+from werkzeug.http import quote_header_value
 from utils.permissions import can_access_virtual_host
 
 files_bp = Blueprint('files', __name__)
 file_service = None  # Initialize as None first
 
+MAX_SIZE_PATHS = 500
+
+def _parse_accel_redirect_map(value):
+    """'/home/:/protected-home/,/var/www/:/protected-www/' -> [('/home/', '/protected-home/'), ...]"""
+    mapping = []
+    for pair in (value or '').split(','):
+        if ':' in pair:
+            prefix, location = pair.split(':', 1)
+            mapping.append((prefix.strip(), location.strip()))
+    # Longest prefix wins
+    return sorted(mapping, key=lambda item: len(item[0]), reverse=True)
+
+def _parse_flag(value, default=True):
+    """JSON booleans or query strings ('true'/'false', '1'/'0', 'yes'/'no') -> bool"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', 'off', '')
+    return bool(value)
+
+# nginx offload for downloads. Each filesystem prefix needs a matching internal location, e.g.
+#   location /protected-home/ { internal; alias /home/; }
+ACCEL_REDIRECT_MAP = _parse_accel_redirect_map(os.environ.get('FILE_DOWNLOAD_ACCEL_REDIRECT'))
+
 def init_file_service():
     global file_service
     if file_service is None:
@@ -21,23 +52,84 @@ def list_directory(current_user):
         init_file_service()
         path = request.args.get('path', '/')
         domain = request.args.get('domain')  # Optional domain filter
+        # Return uncached folder sizes as pending; clients fetch them via /sizes
+        lazy_sizes = request.args.get('lazySizes', 'false').lower() == 'true'
+
+        # Any paging/sort/filter parameter switches to the paginated response shape:
+        # {items, nextCursor, hasMore, total, sort, order, prefix}
+        paged = any(k in request.args for k in ('limit', 'cursor', 'sort', 'prefix'))
+        page_args = {}
+        if paged:
+            try:
+                limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+            except ValueError:
+                return jsonify({'error': 'limit must be an integer'}), 400
+            page_args = {
+                'page_size': limit,
+                'cursor': request.args.get('cursor') or None,
+                'sort_by': request.args.get('sort', 'name'),
+                'order': request.args.get('order', 'asc').lower(),
+                'prefix': request.args.get('prefix') or None
+            }
         
         # If domain is specified, restrict to domain's directory
         if domain:
             domain_path = file_service.get_domain_path(domain, current_user.id)
             if domain_path:
-                items = file_service.list_domain_directory(domain, path, current_user.id)
+                items = file_service.list_domain_directory(domain, path, current_user.id, lazy_sizes=lazy_sizes, **page_args)
             else:
                 return jsonify({'error': 'Domain not found or access denied'}), 404
         else:
             # System file access - only admin/root users allowed
             if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
                 return jsonify({'error': 'Access denied. System file management requires admin privileges.'}), 403
-            items = file_service.list_directory(path)
+            if paged:
+                items = file_service.list_directory_page(path, **page_args)
+            else:
+                items = file_service.list_directory(path)
             
         return jsonify(items)
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/sizes', methods=['POST'])
+@token_required
+def get_directory_sizes(current_user):
+    """Compute folder sizes for a batch of paths, streamed as NDJSON in completion order"""
+    try:
+        init_file_service()
+        data = request.get_json() or {}
+        paths = data.get('paths') or []
+        domain = data.get('domain')
+
+        if not isinstance(paths, list) or not paths:
+            return jsonify({'error': 'paths must be a non-empty list'}), 400
+        if len(paths) > MAX_SIZE_PATHS:
+            return jsonify({'error': f'At most {MAX_SIZE_PATHS} paths per request'}), 400
+
+        # Validate access up front so errors are returned before streaming starts
+        if domain:
+            targets = file_service.resolve_domain_size_targets(domain, paths, current_user.id)
+        else:
+            if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
+                return jsonify({'error': 'Access denied. System file management requires admin privileges.'}), 403
+            targets = file_service.resolve_size_targets(paths)
+
+        def generate():
+            for result in file_service.iter_directory_sizes(targets):
+                yield json.dumps(result) + '\n'
+
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        # Ask nginx not to buffer so each result reaches the client as soon as it is ready
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -285,6 +377,132 @@ def upload_file(current_user):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@files_bp.route('/uploads', methods=['POST'])
+@token_required
+def init_upload(current_user):
+    """Start a resumable upload: {domain?, path, filename, size}; then PUT chunks and POST /complete"""
+    try:
+        init_file_service()
+        data = request.get_json() or {}
+        domain = data.get('domain')
+        path = data.get('path', '/')
+        filename = data.get('filename')
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'size must be an integer'}), 400
+
+        if domain:
+            session = file_service.init_domain_upload(domain, path, filename, size, current_user.id)
+        else:
+            if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
+                return jsonify({'error': 'Access denied. System file upload requires admin privileges.'}), 403
+            session = file_service.init_upload(path, filename, size, current_user.id)
+        return jsonify(session), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>', methods=['GET'])
+@token_required
+def get_upload_status(current_user, upload_id):
+    """Received byte ranges, used to resume after a reconnect"""
+    try:
+        init_file_service()
+        return jsonify(file_service.get_upload_status(upload_id, current_user.id))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@token_required
+def put_upload_chunk(current_user, upload_id):
+    """Raw chunk body written at ?offset=N; each chunk must fit in MAX_CONTENT_LENGTH"""
+    try:
+        init_file_service()
+        try:
+            offset = int(request.args.get('offset', ''))
+        except ValueError:
+            return jsonify({'error': 'offset query parameter is required'}), 400
+        length = request.content_length
+        if length is None:
+            return jsonify({'error': 'Content-Length is required'}), 411
+
+        session = file_service.write_upload_chunk(upload_id, offset, request.stream, length, current_user.id)
+        return jsonify(session)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@token_required
+def complete_upload(current_user, upload_id):
+    """Finish an upload: {checksum?, algorithm? (sha256|sha1|md5)}"""
+    try:
+        init_file_service()
+        data = request.get_json(silent=True) or {}
+        file_data = file_service.complete_upload(upload_id, current_user.id, checksum=data.get('checksum'),
+                                                 algorithm=data.get('algorithm', 'sha256'))
+        return jsonify(file_data)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@token_required
+def abort_upload(current_user, upload_id):
+    try:
+        init_file_service()
+        file_service.abort_upload(upload_id, current_user.id)
+        return jsonify({'success': True})
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _file_etag(stat_info):
+    """Strong validator from inode, mtime and size: changes whenever the file is replaced or rewritten"""
+    return f"{stat_info.st_ino:x}-{stat_info.st_mtime_ns:x}-{stat_info.st_size:x}"
+
+def _attachment_header(filename):
+    """Content-Disposition for a download, quoted the way send_file does it"""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename={quote_header_value(filename)}'
+    except UnicodeEncodeError:
+        fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return (f"attachment; filename={quote_header_value(fallback)}; "
+                f"filename*=UTF-8''{quote(filename, safe='!#$&+^`|~')}")
+
+def _send_download(full_path):
+    """Send a file with ETag, 304, Range and If-Range support, or hand it to nginx via X-Accel-Redirect"""
+    real_path = os.path.realpath(full_path)
+    for prefix, location in ACCEL_REDIRECT_MAP:
+        if real_path.startswith(prefix):
+            # nginx serves the bytes (sendfile, ranges, conditional requests); the worker returns at once
+            response = Response(status=200)
+            response.headers['X-Accel-Redirect'] = quote(location + real_path[len(prefix):])
+            response.headers['Content-Type'] = mimetypes.guess_type(real_path)[0] or 'application/octet-stream'
+            response.headers['Content-Disposition'] = _attachment_header(os.path.basename(real_path))
+            return response
+
+    stat_info = os.stat(real_path)
+    # conditional=True makes werkzeug answer If-None-Match/If-Modified-Since with 304 and
+    # Range/If-Range with 206/416; the file body goes through wsgi.file_wrapper (sendfile under gunicorn)
+    response = send_file(real_path, as_attachment=True, download_name=os.path.basename(full_path),
+                         etag=_file_etag(stat_info), last_modified=stat_info.st_mtime,
+                         conditional=True, max_age=0)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
 @files_bp.route('/download', methods=['GET'])
 @token_required
 def download_file(current_user):
@@ -308,7 +526,7 @@ def download_file(current_user):
                 return jsonify({'error': 'Invalid path'}), 400
             if not os.path.exists(full_path) or not os.path.isfile(full_path):
                 return jsonify({'error': 'File not found'}), 404
-            return send_file(full_path, as_attachment=True)
+            return _send_download(full_path)
         else:
             # System file download - only admin/root users allowed
             if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
@@ -323,7 +541,7 @@ def download_file(current_user):
             if not os.path.exists(full_path) or not os.path.isfile(full_path):
                 return jsonify({'error': 'File not found'}), 404
 
-            return send_file(full_path, as_attachment=True)
+            return _send_download(full_path)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -361,17 +579,60 @@ def zip_items(current_user):
         items = data.get('items') or []
         zip_name = data.get('zipName')
         domain = data.get('domain')
+        # Store jpg/png/gz/zip etc. without deflate (default) to save CPU
+        store_compressed = _parse_flag(data.get('storeCompressed'))
+        # 'zip' (default), 'tar.gz' or 'tar.zst'
+        archive_format = data.get('format', 'zip')
 
         if domain:
-            result = file_service.zip_domain_items(domain, base_path, items, zip_name, current_user.id)
+            result = file_service.zip_domain_items(domain, base_path, items, zip_name, current_user.id,
+                                                   store_compressed=store_compressed, archive_format=archive_format)
         else:
             if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
                 return jsonify({'error': 'Access denied. System zip requires admin privileges.'}), 403
-            result = file_service.zip_items(base_path, items, zip_name)
+            result = file_service.zip_items(base_path, items, zip_name, store_compressed=store_compressed,
+                                            archive_format=archive_format)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@files_bp.route('/zip-download', methods=['GET', 'POST'])
+@token_required
+def zip_download(current_user):
+    """Stream a zip of the selected items straight into the response, without writing an archive to disk"""
+    try:
+        init_file_service()
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            items = data.get('items') or []
+        else:
+            # GET lets browsers download directly: ?items=a&items=b&token=...
+            data = request.args
+            items = request.args.getlist('items')
+        base_path = data.get('path', '/')
+        zip_name = data.get('zipName')
+        domain = data.get('domain')
+        store_compressed = _parse_flag(data.get('storeCompressed'))
+
+        # Resolve and validate everything before the first byte is sent
+        if domain:
+            archive_name, chunks = file_service.stream_domain_zip(domain, base_path, items, zip_name, current_user.id,
+                                                                  store_compressed=store_compressed)
+        else:
+            if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
+                return jsonify({'error': 'Access denied. System zip requires admin privileges.'}), 403
+            archive_name, chunks = file_service.stream_zip(base_path, items, zip_name, store_compressed=store_compressed)
+
+        response = Response(stream_with_context(chunks), mimetype='application/zip')
+        response.headers['Content-Disposition'] = _attachment_header(archive_name)
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @files_bp.route('/unzip', methods=['POST'])
 @token_required
 def unzip_item(current_user):
@@ -417,4 +678,153 @@ def create_file(current_user):
             
         return jsonify(file_data)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def _build_file_job(job_type, data, domain, user_id):
+    """Return (params, fn) for a background job; fn(progress) runs the same FileService call as the sync route"""
+    if job_type == 'zip':
+        params = {
+            'path': data.get('path', '/'),
+            'items': data.get('items') or [],
+            'zipName': data.get('zipName'),
+            'storeCompressed': _parse_flag(data.get('storeCompressed')),
+            'format': data.get('format', 'zip')
+        }
+        if not params['items']:
+            raise ValueError('items is required')
+        if domain:
+            return params, lambda progress: file_service.zip_domain_items(
+                domain, params['path'], params['items'], params['zipName'], user_id,
+                store_compressed=params['storeCompressed'], archive_format=params['format'], progress=progress)
+        return params, lambda progress: file_service.zip_items(
+            params['path'], params['items'], params['zipName'],
+            store_compressed=params['storeCompressed'], archive_format=params['format'], progress=progress)
+
+    if job_type == 'unzip':
+        params = {'archivePath': data.get('archivePath'), 'destination': data.get('destination')}
+        if not params['archivePath']:
+            raise ValueError('archivePath is required')
+        if domain:
+            return params, lambda progress: file_service.unzip_domain_item(
+                domain, params['archivePath'], params['destination'], user_id, progress=progress)
+        return params, lambda progress: file_service.unzip_item(
+            params['archivePath'], params['destination'], progress=progress)
+
+    if job_type == 'copy':
+        params = {'sourcePath': data.get('sourcePath'), 'destPath': data.get('destPath')}
+        if not params['sourcePath'] or not params['destPath']:
+            raise ValueError('sourcePath and destPath are required')
+        if domain:
+            return params, lambda progress: file_service.copy_domain_item(
+                domain, params['sourcePath'], params['destPath'], user_id, progress=progress)
+        return params, lambda progress: file_service.copy_item(
+            params['sourcePath'], params['destPath'], progress=progress)
+
+    if job_type == 'delete':
+        params = {'path': data.get('path')}
+        if not params['path']:
+            raise ValueError('path is required')
+        if domain:
+            return params, lambda progress: {
+                'success': file_service.delete_domain_item(domain, params['path'], user_id, progress=progress)
+            }
+        return params, lambda progress: {'success': file_service.delete_item(params['path'], progress=progress)}
+
+    raise ValueError(f'Unsupported job type: {job_type}')
+
+def _can_access_job(current_user, job):
+    return job is not None and (current_user.admin or job['userId'] == current_user.id)
+
+@files_bp.route('/jobs', methods=['POST'])
+@token_required
+def submit_file_job(current_user):
+    """Queue a zip/unzip/copy/delete job and return 202 with its id; poll /jobs/<id> or stream /jobs/<id>/events"""
+    try:
+        init_file_service()
+        data = request.get_json() or {}
+        job_type = data.get('type')
+        domain = data.get('domain')
+
+        if not domain and not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
+            return jsonify({'error': 'Access denied. System file operations require admin privileges.'}), 403
+
+        params, fn = _build_file_job(job_type, data, domain, current_user.id)
+        params['domain'] = domain
+        job = get_file_job_manager().submit(current_app._get_current_object(), job_type, current_user.id, params, fn)
+        return jsonify(job), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/jobs', methods=['GET'])
+@token_required
+def list_file_jobs(current_user):
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        # Admins may pass all=true to see every user's jobs
+        show_all = request.args.get('all', 'false').lower() == 'true' and (
+            current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'
+        )
+        jobs = get_file_job_manager().list(None if show_all else current_user.id, limit)
+        return jsonify({'jobs': jobs})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_file_job(current_user, job_id):
+    try:
+        job = get_file_job_manager().get(job_id)
+        if not _can_access_job(current_user, job):
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/jobs/<job_id>', methods=['DELETE'])
+@token_required
+def cancel_file_job(current_user, job_id):
+    """Request cancellation; the job stops at its next file and reports status 'cancelled'"""
+    try:
+        manager = get_file_job_manager()
+        if not _can_access_job(current_user, manager.get(job_id)):
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(manager.cancel(job_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/jobs/<job_id>/events', methods=['GET'])
+@token_required
+def stream_file_job(current_user, job_id):
+    """Server-Sent Events: one 'progress' event per change until the job finishes (EventSource can pass ?token=)"""
+    try:
+        manager = get_file_job_manager()
+        if not _can_access_job(current_user, manager.get(job_id)):
+            return jsonify({'error': 'Job not found'}), 404
+
+        def generate():
+            last_payload = None
+            last_sent = time.time()
+            while True:
+                job = manager.get(job_id)
+                if job is None:
+                    break
+                payload = json.dumps(job)
+                if payload != last_payload:
+                    yield f"event: progress\ndata: {payload}\n\n"
+                    last_payload = payload
+                    last_sent = time.time()
+                elif time.time() - last_sent > 15:
+                    yield ": keepalive\n\n"
+                    last_sent = time.time()
+                if job['status'] in TERMINAL_STATUSES:
+                    break
+                time.sleep(0.5)
+
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -22,8 +22,8 @@ def get_user_quota_usage(current_user, username):
                 current_user.username == 'root' or current_user.username == username):
             return jsonify({'error': 'Permission denied'}), 403
         
-        # Get storage usage
-        storage_usage = quota_monitoring_service.get_user_storage_usage(username)
+        # Get storage usage from the snapshot (a refresh is queued if the user has none yet)
+        storage_usage = quota_monitoring_service.get_snapshot_user_storage_usage(username)
         if not storage_usage:
             return jsonify({'error': 'User not found or quota not available'}), 404
         
@@ -42,12 +42,14 @@ def get_user_quota_usage(current_user, username):
                 EmailDomain.domain == current_user.email.split('@')[1] if current_user.email else None
             ).all()
         
-        # Get email quota usage
-        email_usage = []
-        for account in email_accounts:
-            email_quota_info = quota_monitoring_service.get_email_quota_usage(account.id, email_service)
-            if email_quota_info:
-                email_usage.append(email_quota_info)
+        # Get email quota usage from the snapshot; accounts it doesn't know yet are measured in one batch
+        email_snapshot = quota_monitoring_service.get_snapshot_email_quota_usage(
+            [account.id for account in email_accounts]
+        )
+        missing = [account.id for account in email_accounts if account.id not in email_snapshot]
+        if missing:
+            email_snapshot.update(quota_monitoring_service.get_email_quota_usage_batch(missing, email_service)['usage'])
+        email_usage = [email_snapshot[account.id] for account in email_accounts if account.id in email_snapshot]
         
         response_data = {
             'username': username,
@@ -76,10 +78,10 @@ def get_user_quota_usage(current_user, username):
 def get_all_users_quota_usage(current_user):
     """Get quota usage for all users (admin only)."""
     try:
-        # Check for a 'refresh' query parameter to force a cache refresh
+        # A 'refresh' query parameter queues a full refresh; the response is the current snapshot
         force_refresh = request.args.get('refresh', 'false').lower() == 'true'
 
-        # Get all users quota usage (uses cache by default)
+        # Get all users quota usage from the shared snapshot
         all_usage = quota_monitoring_service.get_all_users_quota_usage(force_refresh=force_refresh)
         
         # Get quota alerts, passing the already fetched data to avoid a second slow call
@@ -113,14 +115,13 @@ def get_quota_alerts(current_user):
     """Get quota alerts for users approaching or exceeding limits."""
     try:
         threshold = request.args.get('threshold', 80.0, type=float)
-        alerts = quota_monitoring_service.get_quota_alerts(threshold)
+        all_usage = quota_monitoring_service.get_all_users_quota_usage()
+        alerts = quota_monitoring_service.get_quota_alerts(threshold, all_usage_data=all_usage)
         
         return jsonify({
             'alerts': alerts,
             'threshold_percent': threshold,
-            'timestamp': quota_monitoring_service.get_all_users_quota_usage().get(
-                list(quota_monitoring_service.get_all_users_quota_usage().keys())[0]
-            )['last_updated'] if quota_monitoring_service.get_all_users_quota_usage() else None
+            'timestamp': list(all_usage.values())[0]['last_updated'] if all_usage else None
         })
         
     except Exception as e:
@@ -143,8 +144,8 @@ def get_email_quota_usage(current_user, account_id):
                 account.username == current_user.username):
             return jsonify({'error': 'Permission denied'}), 403
         
-        # Get quota usage
-        email_quota_info = quota_monitoring_service.get_email_quota_usage(account_id, email_service)
+        # Get quota usage from the snapshot
+        email_quota_info = quota_monitoring_service.get_snapshot_email_quota_usage([account_id]).get(account_id)
         if not email_quota_info:
             return jsonify({'error': 'Email account not found or quota not available'}), 404
         
@@ -160,17 +161,16 @@ def get_email_quota_usage(current_user, account_id):
 @token_required
 @admin_required
 def refresh_user_quota(current_user, username):
-    """Force refresh quota usage for a specific user (admin only)."""
+    """Queue a quota usage refresh for a specific user (admin only)."""
     try:
-        # Force refresh by getting fresh data
-        storage_usage = quota_monitoring_service.get_user_storage_usage(username)
-        if not storage_usage:
-            return jsonify({'error': 'User not found or quota not available'}), 404
+        # The background refresher measures the user; respond with the current snapshot meanwhile
+        quota_monitoring_service.request_refresh(username)
+        storage_usage = quota_monitoring_service.get_snapshot_user_storage_usage(username)
         
         return jsonify({
-            'message': f'Quota usage refreshed for {username}',
+            'message': f'Quota usage refresh queued for {username}',
             'data': storage_usage
-        })
+        }), 202
         
     except Exception as e:
         print(f"Error refreshing quota for {username}: {e}")
@@ -216,6 +216,53 @@ def set_user_quota(current_user, username):
         return jsonify({'error': str(e)}), 500
 
 
+@quota_bp.route('/api/quota/history/<username>', methods=['GET'])
+@token_required
+def get_user_quota_history(current_user, username):
+    """Get recorded storage usage and a days-until-full projection for a user."""
+    try:
+        if not (current_user.is_admin or current_user.role == 'admin' or
+                current_user.username == 'root' or current_user.username == username):
+            return jsonify({'error': 'Permission denied'}), 403
+
+        period = request.args.get('period', 'day')
+        method = request.args.get('method', 'linear')
+        try:
+            history = quota_monitoring_service.get_usage_history(username, period, method)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not history:
+            return jsonify({'error': 'No quota history for this user'}), 404
+
+        return jsonify(history)
+
+    except Exception as e:
+        print(f"Error getting quota history for {username}: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
+@quota_bp.route('/api/quota/projections', methods=['GET'])
+@token_required
+@admin_required
+def get_quota_projections(current_user):
+    """Get users projected to reach their quota limit, soonest first (admin only)."""
+    try:
+        days = request.args.get('days', 7.0, type=float)
+        projections = quota_monitoring_service.get_usage_projections(horizon_days=days)
+
+        return jsonify({
+            'horizon_days': days,
+            'users': projections,
+            'count': len(projections)
+        })
+
+    except Exception as e:
+        print(f"Error getting quota projections: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
 @quota_bp.route('/api/quota/stats', methods=['GET'])
 @token_required
 @admin_required
@@ -6,6 +6,7 @@ from models.signup_meta import SignupMeta
 from models.user import User
 from utils.crypto import encrypt_text, decrypt_text
 from utils.auth import token_required, admin_required
+from utils.principal import invalidate_principal
 from services.user_service import UserService
 from services.linux_user_service import LinuxUserService
 from services.mysql_service import MySQLService
@@ -280,6 +281,7 @@ def update_signup_request(current_user, req_id):
                 req.options_json = options
 
         db.session.commit()
+        invalidate_principal(user.id)
         
         # Enrich response with updated user details
         resp = req.to_dict()
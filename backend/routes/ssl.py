@@ -3,23 +3,19 @@ from models.ssl_certificate import SSLCertificate, SSLCertificateLog, db
 from services.ssl_service import SSLService
 from datetime import datetime
 from utils.auth import permission_required
+from services.access_index import access_index
 
 ssl_bp = Blueprint('ssl', __name__)
 ssl_service = SSLService()
 
 
 def _is_admin(user):
-    return bool(getattr(user, 'is_admin', False) or getattr(user, 'role', '') == 'admin' or getattr(user, 'username', '') == 'root')
+    return bool(getattr(user, 'admin', False))
 
 
 def _user_domains(current_user):
-    from models.virtual_host import VirtualHost
-    if _is_admin(current_user):
-        return None  # Admin sees all domains
-    vhosts = VirtualHost.query.filter(
-        (VirtualHost.user_id == current_user.id) | (VirtualHost.linux_username == current_user.username)
-    ).all()
-    return [vh.domain for vh in vhosts]
+    # None for admins: they see all domains
+    return access_index.domains_for(current_user)
 
 @ssl_bp.route('/api/ssl/certificates', methods=['GET'])
 @permission_required('ssl', 'read')
@@ -1,17 +1,18 @@
-from flask import Blueprint, jsonify, request, current_app
-from functools import wraps
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from utils.auth import token_required, admin_required
 from utils.rate_limiter import rate_limit, check_rate_limit_status, reset_rate_limit
+from utils.id_name_cache import id_name_cache
+from utils.cache import cached, response_cache
+from services.metrics_sampler import get_metrics_sampler
+from services.service_state import get_service_state_provider
+from services.dashboard_stats import get_dashboard_counts
 from services.sync_check_service import SyncCheckService
 from services.postfix_sql_maps_service import PostfixSQLMapsService, MySQLConnectionConfig
 from services.backup_service import BackupService
 from models.virtual_host import VirtualHost
-from models.database import Database
-from models.email import EmailAccount
-from models.dns import DNSRecord
-from models.ssl_certificate import SSLCertificate
 import platform
 import time
+import json
 import subprocess
 import os
 from datetime import datetime, timedelta
@@ -29,70 +30,36 @@ sync_check_service = SyncCheckService()
 backup_service = BackupService()
 postfix_maps_service = PostfixSQLMapsService()
 
-# Simple in-memory cache
-_cache = {}
-_cache_timeout = {}
+def _latest_metrics():
+    """Latest sample from the background metrics sampler"""
+    sampler = get_metrics_sampler()
+    sample = sampler.latest() if sampler else None
+    if sample is None:
+        raise RuntimeError('System metrics are not available')
+    return sample
 
-def cache_result(timeout_seconds=60):
-    """Decorator to cache function results"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Create cache key from function name and arguments
-            cache_key = f"{func.__name__}:{str(args)}:{str(sorted(kwargs.items()))}"
-            current_time = time.time()
-            
-            # Check if we have cached result and it's still valid
-            if (cache_key in _cache and 
-                cache_key in _cache_timeout and 
-                current_time < _cache_timeout[cache_key]):
-                return _cache[cache_key]
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            _cache[cache_key] = result
-            _cache_timeout[cache_key] = current_time + timeout_seconds
-            
-            return result
-        return wrapper
-    return decorator
+def _dashboard_metrics(sample):
+    """Dashboard view of a metrics sample (the shape /api/dashboard/system-stats returns)"""
+    disk = sample['disk']
+    network = sample['network'] or {}
+    return {
+        'cpu': round(sample['cpu']['percent'], 1),
+        'memory': round(sample['memory']['percent'], 1),
+        'disk': round((disk['used'] / disk['total']) * 100, 1),
+        'uptime': int(sample['timestamp'] - sample['boot_time']),
+        'loadAverage': sample['load_average'] or [0, 0, 0],
+        'networkStats': {
+            'upload': network.get('bytes_sent', 0),
+            'download': network.get('bytes_recv', 0),
+            'uploadRate': network.get('send_rate'),
+            'downloadRate': network.get('recv_rate')
+        }
+    }
 
-@cache_result(timeout_seconds=30)
 def get_system_stats():
-    """Get system statistics with caching"""
+    """Get system statistics from the latest metrics sample"""
     try:
-        # CPU usage
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # Memory usage
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        
-        # Disk usage
-        disk = psutil.disk_usage('/')
-        disk_percent = (disk.used / disk.total) * 100
-        
-        # System uptime
-        boot_time = psutil.boot_time()
-        uptime = time.time() - boot_time
-        
-        # Load average
-        load_avg = os.getloadavg()
-        
-        # Network stats
-        net_io = psutil.net_io_counters()
-        
-        return {
-            'cpu': round(cpu_percent, 1),
-            'memory': round(memory_percent, 1),
-            'disk': round(disk_percent, 1),
-            'uptime': int(uptime),
-            'loadAverage': list(load_avg),
-            'networkStats': {
-                'upload': net_io.bytes_sent,
-                'download': net_io.bytes_recv
-            }
-        }
+        return _dashboard_metrics(_latest_metrics())
     except Exception as e:
         print(f"Error getting system stats: {e}")
         return {
@@ -104,9 +71,8 @@ def get_system_stats():
             'networkStats': {'upload': 0, 'download': 0}
         }
 
-@cache_result(timeout_seconds=60)
 def get_service_status():
-    """Get service status with caching"""
+    """Get service status from the shared service-state provider (one systemctl call for all units)"""
     services = [
         {'name': 'Nginx', 'service': 'nginx'},
         {'name': 'MySQL', 'service': 'mysql'},
@@ -116,96 +82,54 @@ def get_service_status():
         {'name': 'SSH', 'service': 'ssh'},
     ]
     
+    states = get_service_state_provider().get_states(service['service'] for service in services)
+    now = time.time()
+    
     result = []
     for service in services:
-        try:
-            # Check if service is active
-            status_result = subprocess.run(
-                ['systemctl', 'is-active', service['service']],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            is_active = status_result.stdout.strip() == 'active'
-            
-            # Get service uptime if active
-            uptime = 0
-            if is_active:
-                try:
-                    uptime_result = subprocess.run(
-                        ['systemctl', 'show', service['service'], '--property=ActiveEnterTimestamp'],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if uptime_result.returncode == 0:
-                        timestamp_line = uptime_result.stdout.strip()
-                        if '=' in timestamp_line:
-                            timestamp_str = timestamp_line.split('=', 1)[1]
-                            if timestamp_str and timestamp_str != 'n/a':
-                                start_time = datetime.fromisoformat(timestamp_str.replace(' ', 'T'))
-                                uptime = int((datetime.now() - start_time).total_seconds())
-                except Exception:
-                    uptime = 0
-            
-            result.append({
-                'name': service['name'],
-                'status': 'running' if is_active else 'stopped',
-                'uptime': uptime,
-                'pid': None  # Could be enhanced to get actual PID
-            })
-            
-        except subprocess.TimeoutExpired:
-            result.append({
-                'name': service['name'],
-                'status': 'timeout',
-                'uptime': 0,
-                'pid': None
-            })
-        except Exception as e:
-            print(f"Error checking service {service['name']}: {e}")
-            result.append({
-                'name': service['name'],
-                'status': 'error',
-                'uptime': 0,
-                'pid': None
-            })
+        state = states[service['service']]
+        is_active = state['active_state'] == 'active'
+        if is_active:
+            status = 'running'
+        elif state['active_state'] in ('timeout', 'error'):
+            status = state['active_state']
+        else:
+            status = 'stopped'
+        
+        result.append({
+            'name': service['name'],
+            'status': status,
+            'uptime': int(now - state['active_since']) if is_active and state['active_since'] else 0,
+            'pid': state['main_pid'],
+            'memory': state['memory_current']
+        })
     
     return result
 
 @system_bp.route('/api/system/status')
 def get_system_status():
     try:
-        # Get system load
-        load_avg = os.getloadavg() if hasattr(os, 'getloadavg') else [0, 0, 0]
-        
-        # Get memory usage
-        memory = psutil.virtual_memory()
-        
-        # Get disk usage
-        disk = psutil.disk_usage('/')
-        
-        # Get CPU usage
-        cpu_percent = psutil.cpu_percent(interval=1)
+        sample = _latest_metrics()
+        memory = sample['memory']
+        disk = sample['disk']
         
         return jsonify({
             'success': True,
             'data': {
-                'load_average': load_avg,
+                'load_average': sample['load_average'] or [0, 0, 0],
                 'memory': {
-                    'total': memory.total,
-                    'used': memory.used,
-                    'free': memory.free,
-                    'percent': memory.percent
+                    'total': memory['total'],
+                    'used': memory['used'],
+                    'free': memory['free'],
+                    'percent': memory['percent']
                 },
                 'disk': {
-                    'total': disk.total,
-                    'used': disk.used,
-                    'free': disk.free,
-                    'percent': (disk.used / disk.total) * 100
+                    'total': disk['total'],
+                    'used': disk['used'],
+                    'free': disk['free'],
+                    'percent': (disk['used'] / disk['total']) * 100
                 },
-                'cpu_percent': cpu_percent
+                'cpu_percent': sample['cpu']['percent']
             }
         })
     except Exception as e:
@@ -276,6 +200,61 @@ def get_dashboard_system_stats():
             'error': 'Failed to get system statistics'
         }), 500
 
+@system_bp.route('/api/dashboard/system-stats/stream')
+@token_required
+def stream_dashboard_system_stats(current_user):
+    """Server-Sent Events: a 'snapshot' event, then 'delta' events with only the changed fields.
+
+    Every connected client reads the shared metrics sampler, so extra tabs add
+    no psutil calls. ?interval= sets the push rate in seconds (never faster
+    than the sampler); EventSource can pass ?token=. Streams end after
+    METRICS_STREAM_MAX_SECONDS and the browser reconnects on its own.
+    """
+    try:
+        sampler = get_metrics_sampler()
+        if sampler is None:
+            return jsonify({
+                'success': False,
+                'error': 'psutil not available. Install with: pip install psutil'
+            }), 503
+
+        default_interval = float(os.environ.get('METRICS_STREAM_INTERVAL', 2))
+        interval = min(60.0, max(sampler.interval, request.args.get('interval', default_interval, type=float)))
+        max_seconds = float(os.environ.get('METRICS_STREAM_MAX_SECONDS', 3600))
+
+        def generate():
+            started = time.time()
+            last = None
+            last_ts = 0.0
+            last_sent = started
+            yield f"retry: {int(interval * 1000)}\n\n"
+            while time.time() - started < max_seconds:
+                sample = sampler.wait_for_sample(last_ts + interval - sampler.interval / 2, timeout=15)
+                if sample is None:
+                    yield ": keepalive\n\n"
+                    continue
+                last_ts = sample['timestamp']
+                current = _dashboard_metrics(sample)
+                if last is None:
+                    yield f"event: snapshot\ndata: {json.dumps({'timestamp': last_ts, **current})}\n\n"
+                    last_sent = time.time()
+                else:
+                    changed = {key: value for key, value in current.items() if last.get(key) != value}
+                    if changed:
+                        yield f"event: delta\ndata: {json.dumps({'timestamp': last_ts, **changed})}\n\n"
+                        last_sent = time.time()
+                    elif time.time() - last_sent > 15:
+                        yield ": keepalive\n\n"
+                        last_sent = time.time()
+                last = current
+
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @system_bp.route('/api/dashboard/services')
 def get_dashboard_services():
     """Get service status"""
@@ -319,17 +298,21 @@ def get_dashboard_activities():
             'error': 'Failed to get activities'
         }), 500
 
+@cached(ttl=60)
+def _server_info():
+    return {
+        'hostname': platform.node(),
+        'os': f"{platform.system()} {platform.release()}",
+        'architecture': platform.machine(),
+        'python_version': platform.python_version(),
+        'uptime': int(time.time() - psutil.boot_time())
+    }
+
 @system_bp.route('/api/dashboard/server-info')
 def get_server_info():
     """Get server information"""
     try:
-        info = {
-            'hostname': platform.node(),
-            'os': f"{platform.system()} {platform.release()}",
-            'architecture': platform.machine(),
-            'python_version': platform.python_version(),
-            'uptime': int(time.time() - psutil.boot_time())
-        }
+        info = _server_info()
         
         return jsonify({
             'success': True,
@@ -342,112 +325,23 @@ def get_server_info():
             'error': 'Failed to get server information'
         }), 500
 
+@cached(ttl=30)
+def _dashboard_counts(user_id, username, is_admin):
+    """Resource counts shown on the dashboard for one user (one grouped query, or the materialised totals)"""
+    return get_dashboard_counts(user_id, username, is_admin)
+
 @system_bp.route('/api/dashboard/stats')
 @token_required
 def get_dashboard_stats(current_user):
     """Get dashboard statistics for the current user"""
     try:
-        # Check if user is admin
-        is_admin = current_user.role == 'admin' or current_user.is_admin
-        
-        # Count virtual hosts
-        try:
-            if is_admin:
-                virtual_hosts_count = VirtualHost.query.count()
-            else:
-                virtual_hosts_count = VirtualHost.query.filter_by(user_id=current_user.id).count()
-        except Exception as e:
-            print(f"Dashboard: Error counting virtual hosts: {e}")
-            virtual_hosts_count = 0
-        
-        # Count databases
-        try:
-            if is_admin:
-                databases_count = Database.query.count()
-            else:
-                # Database model uses 'owner_id' not 'user_id'
-                databases_count = Database.query.filter_by(owner_id=current_user.id).count()
-        except Exception as e:
-            print(f"Dashboard: Error counting databases: {e}")
-            databases_count = 0
-        
-        # Count email accounts
-        try:
-            if is_admin:
-                email_accounts_count = EmailAccount.query.count()
-            else:
-                # Email accounts are linked to virtual hosts through email domains
-                user_vhosts = VirtualHost.query.filter_by(user_id=current_user.id).all()
-                user_vhost_ids = [vh.id for vh in user_vhosts]
-                
-                # Count email accounts in user's virtual host domains
-                email_accounts_count = EmailAccount.query.join(EmailDomain).filter(
-                    EmailDomain.virtual_host_id.in_(user_vhost_ids)
-                ).count()
-        except Exception as e:
-            print(f"Dashboard: Error counting email accounts: {e}")
-            email_accounts_count = 0
-        
-        # Count DNS records
-        try:
-            if is_admin:
-                dns_records_count = DNSRecord.query.count()
-            else:
-                # DNS records are linked to virtual hosts through DNS zones
-                user_vhosts = VirtualHost.query.filter_by(user_id=current_user.id).all()
-                user_domains = [vh.domain for vh in user_vhosts]
-                
-                # Count DNS records in user's virtual host domains
-                dns_records_count = DNSRecord.query.join(DNSZone).filter(
-                    DNSZone.domain_name.in_(user_domains)
-                ).count()
-        except Exception as e:
-            print(f"Dashboard: Error counting DNS records: {e}")
-            dns_records_count = 0
-        
-        # Count SSL certificates
-        try:
-            if is_admin:
-                ssl_certificates_count = SSLCertificate.query.count()
-            else:
-                # SSL certificates are linked to virtual hosts by domain
-                user_vhosts = VirtualHost.query.filter_by(user_id=current_user.id).all()
-                user_domains = [vh.domain for vh in user_vhosts]
-                
-                # Count SSL certificates for user's virtual host domains
-                ssl_certificates_count = SSLCertificate.query.filter(
-                    SSLCertificate.domain.in_(user_domains)
-                ).count()
-        except Exception as e:
-            print(f"Dashboard: Error counting SSL certificates: {e}")
-            ssl_certificates_count = 0
-        
-        ftp_accounts_count = 0  # FTP removed from system
-        
-        # Debug logging for non-admin users
-        if not is_admin:
-            print(f"Dashboard Debug - User {current_user.username} (ID: {current_user.id}):")
-            print(f"  - Virtual Hosts: {virtual_hosts_count}")
-            print(f"  - Databases: {databases_count}")
-            print(f"  - Email Accounts: {email_accounts_count}")
-            print(f"  - DNS Records: {dns_records_count}")
-            print(f"  - SSL Certificates: {ssl_certificates_count}")
-            
-            # Additional debug info
-            user_vhosts = VirtualHost.query.filter_by(user_id=current_user.id).all()
-            print(f"  - User's Virtual Hosts: {[vh.domain for vh in user_vhosts]}")
+        # Check if user is admin (precomputed on the principal; includes root)
+        is_admin = current_user.admin
         
+        # Counts are cached per user for a short while; the dashboard polls this endpoint
         result = {
             'success': True,
-            'data': {
-                'virtualHosts': virtual_hosts_count,
-                'databases': databases_count,
-                'emailAccounts': email_accounts_count,
-                'dnsRecords': dns_records_count,
-                'sslCertificates': ssl_certificates_count,
-                'ftpAccounts': ftp_accounts_count,
-                'isAdmin': is_admin
-            }
+            'data': _dashboard_counts(current_user.id, current_user.username, is_admin)
         }
         
         return jsonify(result)
@@ -536,6 +430,7 @@ def restart_service(current_user, service):
         # Linux production mode - actual restart
         result = subprocess.run(['systemctl', 'restart', service], 
                               capture_output=True, text=True, timeout=30)
+        get_service_state_provider().invalidate(service)
         
         if result.returncode == 0:
             return jsonify({
@@ -613,6 +508,7 @@ def auto_fix_sync_issues(current_user):
 def system_health_check(current_user):
     """ตรวจสอบสุขภาพระบบโดยรวม"""
     try:
+        sample = _latest_metrics()
         health_data = {
             'timestamp': datetime.now().isoformat(),
             'system': {
@@ -622,18 +518,18 @@ def system_health_check(current_user):
                 'load_average': None
             },
             'resources': {
-                'cpu_percent': psutil.cpu_percent(interval=1),
+                'cpu_percent': sample['cpu']['percent'],
                 'memory': {
-                    'total': psutil.virtual_memory().total,
-                    'available': psutil.virtual_memory().available,
-                    'percent': psutil.virtual_memory().percent,
-                    'used': psutil.virtual_memory().used
+                    'total': sample['memory']['total'],
+                    'available': sample['memory']['available'],
+                    'percent': sample['memory']['percent'],
+                    'used': sample['memory']['used']
                 },
                 'disk': {
-                    'total': psutil.disk_usage('/').total,
-                    'free': psutil.disk_usage('/').free,
-                    'used': psutil.disk_usage('/').used,
-                    'percent': psutil.disk_usage('/').percent
+                    'total': sample['disk']['total'],
+                    'free': sample['disk']['free'],
+                    'used': sample['disk']['used'],
+                    'percent': sample['disk']['percent']
                 }
             },
             'services': sync_check_service.check_system_health(),
@@ -650,7 +546,7 @@ def system_health_check(current_user):
                     uptime_seconds = float(f.readline().split()[0])
                     health_data['system']['uptime'] = uptime_seconds
                 
-                health_data['system']['load_average'] = os.getloadavg()
+                health_data['system']['load_average'] = sample['load_average']
             except Exception:
                 pass
         
@@ -746,6 +642,50 @@ def reset_user_rate_limits(current_user):
             'error': str(e)
         }), 500
 
+@system_bp.route('/api/system/name-cache', methods=['GET'])
+@token_required
+@admin_required
+def get_name_cache_stats(current_user):
+    """Hit/miss counters of the uid/gid name cache (admin only)"""
+    return jsonify({
+        'success': True,
+        'data': id_name_cache.get_stats()
+    })
+
+@system_bp.route('/api/system/name-cache', methods=['DELETE'])
+@token_required
+@admin_required
+def clear_name_cache(current_user):
+    """Drop cached uid/gid names, e.g. after editing users outside the panel (admin only)"""
+    id_name_cache.invalidate()
+    return jsonify({
+        'success': True,
+        'message': 'Name cache cleared'
+    })
+
+@system_bp.route('/api/system/cache', methods=['GET'])
+@token_required
+@admin_required
+def get_response_cache_stats(current_user):
+    """Hit/miss, eviction and single-flight counters of the response cache (admin only)"""
+    return jsonify({
+        'success': True,
+        'data': response_cache.get_stats()
+    })
+
+@system_bp.route('/api/system/cache', methods=['DELETE'])
+@token_required
+@admin_required
+def clear_response_cache(current_user):
+    """Drop cached responses; ?prefix= limits it to matching keys (admin only)"""
+    prefix = request.args.get('prefix')
+    removed = response_cache.invalidate(prefix=prefix) if prefix else response_cache.invalidate()
+    return jsonify({
+        'success': True,
+        'message': 'Response cache cleared',
+        'removed': removed
+    })
+
 @system_bp.route('/api/system/config-validation', methods=['GET'])
 @token_required
 @admin_required
@@ -1017,63 +957,31 @@ def get_system_metrics(current_user):
                 'error': 'psutil not available. Install with: pip install psutil'
             }), 503
         
-        # CPU usage
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
-        
-        # Memory usage
-        memory = psutil.virtual_memory()
-        
-        # Disk usage
-        disk = psutil.disk_usage('/')
-        
-        # Network I/O (if available)
-        try:
-            network = psutil.net_io_counters()
-            network_data = {
-                'bytes_sent': network.bytes_sent,
-                'bytes_recv': network.bytes_recv,
-                'packets_sent': network.packets_sent,
-                'packets_recv': network.packets_recv
-            }
-        except Exception:
-            network_data = None
-        
-        # Load average (Linux only)
-        load_avg = None
-        try:
-            if hasattr(psutil, 'getloadavg'):
-                load_avg = psutil.getloadavg()
-        except Exception:
-            pass
-        
-        # Process count
-        process_count = len(psutil.pids())
+        sample = _latest_metrics()
+        memory = sample['memory']
+        disk = sample['disk']
         
         return jsonify({
             'success': True,
             'data': {
-                'timestamp': datetime.now().isoformat(),
-                'cpu': {
-                    'percent': cpu_percent,
-                    'count': cpu_count
-                },
+                'timestamp': datetime.fromtimestamp(sample['timestamp']).isoformat(),
+                'cpu': sample['cpu'],
                 'memory': {
-                    'total': memory.total,
-                    'available': memory.available,
-                    'percent': memory.percent,
-                    'used': memory.used
+                    'total': memory['total'],
+                    'available': memory['available'],
+                    'percent': memory['percent'],
+                    'used': memory['used']
                 },
                 'disk': {
-                    'total': disk.total,
-                    'used': disk.used,
-                    'free': disk.free,
-                    'percent': disk.percent
+                    'total': disk['total'],
+                    'used': disk['used'],
+                    'free': disk['free'],
+                    'percent': disk['percent']
                 },
-                'network': network_data,
+                'network': sample['network'],
                 'system': {
-                    'load_average': load_avg,
-                    'process_count': process_count
+                    'load_average': sample['load_average'],
+                    'process_count': sample['process_count']
                 }
             }
         })
@@ -1084,6 +992,36 @@ def get_system_metrics(current_user):
             'error': str(e)
         }), 500 
 
+@system_bp.route('/api/system/metrics/history', methods=['GET'])
+@token_required
+def get_system_metrics_history(current_user):
+    """Recent metrics samples from the sampler's rolling window (?seconds=300)"""
+    try:
+        sampler = get_metrics_sampler()
+        if sampler is None:
+            return jsonify({
+                'success': False,
+                'error': 'psutil not available. Install with: pip install psutil'
+            }), 503
+        
+        seconds = request.args.get('seconds', type=float)
+        samples = sampler.history(seconds)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'interval': sampler.interval,
+                'count': len(samples),
+                'samples': samples
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @system_bp.route('/api/dashboard/debug-user-data')
 @token_required
 def debug_user_data(current_user):
@@ -1179,8 +1117,8 @@ def debug_user_data(current_user):
 def get_dashboard_debug_stats(current_user):
     """Debug endpoint to check dashboard statistics"""
     try:
-        # Check if user is admin
-        is_admin = current_user.role == 'admin' or current_user.is_admin
+        # Check if user is admin (precomputed on the principal; includes root)
+        is_admin = current_user.admin
         
         # Get all virtual hosts for debugging
         all_vhosts = VirtualHost.query.all()
@@ -19,6 +19,8 @@ from services.nginx_service import NginxService
 from services.mysql_service import MySQLService
 from services.ssl_service import SSLService
 from models.database import db
+from services.access_index import access_index
+from utils.principal import invalidate_principal
 
 user_bp = Blueprint('user', __name__)
 user_service = UserService()
@@ -747,6 +749,7 @@ def delete_system_user(current_user, username):
         # 2. All FTP accounts have been removed from system
 
         db.session.commit()
+        access_index.invalidate()
 
         # 2. Delete Linux user account itself (home dir, maildir, etc.)
         success, message = linux_service.delete_user(username)
@@ -767,6 +770,7 @@ def delete_system_user(current_user, username):
 
                 db.session.delete(app_user)
                 db.session.commit()
+                invalidate_principal(app_user.id)
         except Exception as e:
             db.session.rollback()
             # Not fatal to system deletion; include warning in response
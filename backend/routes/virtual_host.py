@@ -16,6 +16,7 @@ from config import Config
 import os
 from utils.settings_util import get_dns_default_ip, get_primary_domain
 from utils.auth import token_required
+from services.access_index import access_index
 from utils.permissions import (
     check_virtual_host_permission, 
     can_access_virtual_host, 
@@ -196,6 +197,7 @@ def create_subdomain_virtual_host(current_user):
 
         # Commit all changes
         db.session.commit()
+        access_index.invalidate()
 
         return jsonify({
             'success': True,
@@ -469,16 +471,13 @@ def _auto_fix_virtual_host(virtual_host):
 @token_required
 def get_virtual_hosts(current_user):
     try:
-        # Admin/root can see all virtual hosts
-        if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
+        # Admin/root can see all virtual hosts; regular users the ones in their access index
+        # (linux_username matches their username OR they are the creator)
+        vhost_ids = access_index.vhost_ids_for(current_user)
+        if vhost_ids is None:
             virtual_hosts = VirtualHost.query.all()
         else:
-            # Regular users see virtual hosts where linux_username matches their username
-            # OR where they are the creator (user_id matches)
-            virtual_hosts = VirtualHost.query.filter(
-                (VirtualHost.linux_username == current_user.username) | 
-                (VirtualHost.user_id == current_user.id)
-            ).all()
+            virtual_hosts = VirtualHost.query.filter(VirtualHost.id.in_(vhost_ids)).all() if vhost_ids else []
         
         result = [vh.to_dict() for vh in virtual_hosts]
         
@@ -787,6 +786,7 @@ def create_virtual_host(current_user):
         print("Step 7: Saving everything to database...")
         try:
             db.session.commit()
+            access_index.invalidate()
             print(f"✓ All database changes committed successfully for {domain}")
             response_data['steps_completed'].append('7. All data saved to database')
         except Exception as e:
@@ -988,6 +988,8 @@ def update_virtual_host(current_user, id):
             # Continue even if Nginx service fails
         
         db.session.commit()
+        # File operations resolve through cached VhostRefs (domain, document root)
+        access_index.invalidate()
         
         return jsonify({
             'success': True,
@@ -1144,6 +1146,7 @@ def delete_virtual_host(current_user, id):
         
         # Commit all changes
         db.session.commit()
+        access_index.invalidate()
         
         # Prepare response message
         deleted_items = [key for key, value in deletion_summary.items() if value]
@@ -1239,6 +1242,7 @@ def admin_transfer_virtual_host(current_user, id):
         old_user = User.query.get(virtual_host.user_id)
         virtual_host.user_id = new_user_id
         db.session.commit()
+        access_index.invalidate()
         
         return jsonify({
             'success': True,
@@ -1578,6 +1582,7 @@ def create_virtual_host_for_existing_user(current_user):
         print("Step 5: Saving everything to database...")
         try:
             db.session.commit()
+            access_index.invalidate()
             print(f"✓ All database changes committed successfully for {domain}")
             response_data['steps_completed'].append('5. All data saved to database')
         except Exception as e:
@@ -0,0 +1,96 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from flask import g, has_request_context
+from models.virtual_host import VirtualHost
+from utils.cache import get_generations, response_cache
+from utils.permissions import is_admin_user
+from utils.principal import invalidate_principal
+
+ACCESS_KEY_PREFIX = 'access:vhosts:'
+ACCESS_INDEX_TTL = float(os.environ.get('ACCESS_INDEX_TTL', 300))
+
+_COLUMNS = (VirtualHost.id, VirtualHost.domain, VirtualHost.document_root,
+            VirtualHost.linux_username, VirtualHost.user_id)
+
+
+@dataclass(frozen=True)
+class VhostRef:
+    """The virtual host columns access checks and file operations need"""
+    id: int
+    domain: str
+    document_root: str
+    linux_username: str
+    user_id: int
+
+
+class AccessIndex:
+    """Which virtual hosts (by domain) each user can reach.
+
+    A user reaches the vhosts they created (user_id) and the ones running as
+    their Linux user (linux_username == username); admins reach every vhost.
+    The per-user domain -> vhost map is built with one query, kept in the
+    shared response cache across requests and memoised on flask.g for the
+    rest of the request. Cache keys carry the index generation from the
+    host-wide generation store. Call ``invalidate`` after creating, deleting,
+    updating or transferring a virtual host: it bumps the generation, so every
+    worker stops using its cached maps on the next lookup.
+    """
+
+    def user_vhosts(self, user_id: int, username: str) -> Dict[str, VhostRef]:
+        """domain -> VhostRef the user reaches by ownership or Linux username"""
+        memo = g.setdefault('_access_index', {}) if has_request_context() else {}
+        memo_key = (user_id, username)
+        if memo_key not in memo:
+            generation, = get_generations().get((ACCESS_KEY_PREFIX,))
+            rows = response_cache.get_or_compute(
+                f"{ACCESS_KEY_PREFIX}{user_id}:{username}:{generation}",
+                lambda: self._query(user_id, username),
+                ACCESS_INDEX_TTL
+            )
+            memo[memo_key] = {row[1]: VhostRef(*row) for row in rows}
+        return memo[memo_key]
+
+    @staticmethod
+    def _query(user_id: int, username: str) -> List[list]:
+        rows = VirtualHost.query.with_entities(*_COLUMNS).filter(
+            (VirtualHost.user_id == user_id) | (VirtualHost.linux_username == username)
+        ).order_by(VirtualHost.domain).all()
+        return [list(row) for row in rows]
+
+    def vhosts_for(self, user) -> Optional[Dict[str, VhostRef]]:
+        """domain -> VhostRef for a regular user; None for admins, who reach every vhost"""
+        if is_admin_user(user):
+            return None
+        return self.user_vhosts(user.id, user.username)
+
+    def domains_for(self, user) -> Optional[List[str]]:
+        vhosts = self.vhosts_for(user)
+        return None if vhosts is None else list(vhosts)
+
+    def vhost_ids_for(self, user) -> Optional[List[int]]:
+        vhosts = self.vhosts_for(user)
+        return None if vhosts is None else [ref.id for ref in vhosts.values()]
+
+    def resolve(self, user, domain: str) -> Optional[VhostRef]:
+        """The vhost serving domain if the user may reach it, else None"""
+        if is_admin_user(user):
+            row = VirtualHost.query.with_entities(*_COLUMNS).filter_by(domain=domain).first()
+            return VhostRef(*row) if row else None
+        return self.user_vhosts(user.id, user.username).get(domain)
+
+    def can_access(self, user, domain: str) -> bool:
+        return self.resolve(user, domain) is not None
+
+    def invalidate(self) -> None:
+        """Forget every user's map (and the principals built from it) in every worker after vhost changes"""
+        get_generations().bump(ACCESS_KEY_PREFIX)
+        response_cache.invalidate(prefix=ACCESS_KEY_PREFIX)
+        invalidate_principal()
+        if has_request_context():
+            g.pop('_access_index', None)
+
+
+# Process-wide access index
+access_index = AccessIndex()
@@ -169,6 +169,7 @@ class AuthService:
         token_payload = {
             'user_id': user.id,
             'username': user.username,
+            'iat': datetime.utcnow(),
             'exp': datetime.utcnow() + timedelta(hours=24)
         }
         from flask import current_app
@@ -0,0 +1,159 @@
+import os
+import threading
+from time import time
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from models.base import db
+from models.dashboard_counter import DashboardCounter
+from models.database import Database
+from models.dns import DNSZone, DNSRecord
+from models.email import EmailDomain, EmailAccount
+from models.ssl_certificate import SSLCertificate
+from models.virtual_host import VirtualHost
+
+# Dashboard key -> model whose rows it counts
+COUNTED_MODELS = {
+    'virtualHosts': VirtualHost,
+    'databases': Database,
+    'emailAccounts': EmailAccount,
+    'dnsRecords': DNSRecord,
+    'sslCertificates': SSLCertificate,
+}
+_REBUILT_AT = '_rebuilt_at'
+
+
+def count_resources(user_id: Optional[int], username: Optional[str], is_admin: bool) -> Dict[str, int]:
+    """Every dashboard count in one SELECT of scalar subqueries, i.e. one round trip.
+
+    Admins get table totals. Regular users get counts scoped to the virtual
+    hosts they can reach (created by them or running as their Linux user, as
+    in services.access_index): email accounts of those vhosts' email domains,
+    DNS records of zones and SSL certificates for those domains, plus the
+    databases they own.
+    """
+    if is_admin:
+        columns = [select(func.count()).select_from(model).scalar_subquery().label(key)
+                   for key, model in COUNTED_MODELS.items()]
+    else:
+        user_vhosts = select(VirtualHost.id, VirtualHost.domain).where(
+            or_(VirtualHost.user_id == user_id, VirtualHost.linux_username == username)
+        ).cte('user_vhosts')
+        columns = [
+            select(func.count()).select_from(user_vhosts).scalar_subquery().label('virtualHosts'),
+            select(func.count()).select_from(Database).where(
+                Database.owner_id == user_id).scalar_subquery().label('databases'),
+            select(func.count()).select_from(EmailAccount).join(
+                EmailDomain, EmailAccount.domain_id == EmailDomain.id
+            ).where(EmailDomain.virtual_host_id.in_(select(user_vhosts.c.id))).scalar_subquery().label('emailAccounts'),
+            select(func.count()).select_from(DNSRecord).join(
+                DNSZone, DNSRecord.zone_id == DNSZone.id
+            ).where(DNSZone.domain_name.in_(select(user_vhosts.c.domain))).scalar_subquery().label('dnsRecords'),
+            select(func.count()).select_from(SSLCertificate).where(
+                SSLCertificate.domain.in_(select(user_vhosts.c.domain))).scalar_subquery().label('sslCertificates'),
+        ]
+    row = db.session.execute(select(*columns)).one()._mapping
+    return {key: int(row[key] or 0) for key in COUNTED_MODELS}
+
+
+class DashboardCounters:
+    """Materialised table totals for the admin dashboard.
+
+    One dashboard_counter row per counted model, adjusted in the same
+    transaction as the rows themselves: ORM inserts and deletes are seen in
+    after_flush (including cascades), legacy ``Query.delete()`` bulk deletes
+    in after_bulk_delete. Writes that bypass the ORM (raw SQL, DB-level
+    cascades) are corrected by a full rebuild every ``rebuild_interval``
+    seconds. Per-user counts are not materialised: they depend on the
+    vhost -> domain -> zone ownership chain, and the grouped query is cheap
+    because it only touches that user's rows.
+    """
+
+    def __init__(self, rebuild_interval: float = 3600.0):
+        self.rebuild_interval = rebuild_interval
+        self._names = {model: key for key, model in COUNTED_MODELS.items()}
+        self._installed = False
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        with self._lock:
+            if self._installed:
+                return
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_bulk_delete', self._after_bulk_delete)
+            self._installed = True
+
+    def _after_flush(self, session, flush_context) -> None:
+        deltas: Dict[str, int] = {}
+        for objects, sign in ((session.new, 1), (session.deleted, -1)):
+            for obj in objects:
+                name = self._names.get(type(obj))
+                if name:
+                    deltas[name] = deltas.get(name, 0) + sign
+        self._apply(session, deltas)
+
+    def _after_bulk_delete(self, delete_context) -> None:
+        name = self._names.get(delete_context.mapper.class_)
+        rowcount = delete_context.result.rowcount if delete_context.result is not None else 0
+        if name and rowcount and rowcount > 0:
+            self._apply(delete_context.session, {name: -rowcount})
+
+    @staticmethod
+    def _apply(session, deltas: Dict[str, int]) -> None:
+        connection = session.connection()
+        for name, delta in deltas.items():
+            if delta:
+                connection.execute(
+                    update(DashboardCounter.__table__)
+                    .where(DashboardCounter.__table__.c.name == name)
+                    .values(value=DashboardCounter.__table__.c.value + delta)
+                )
+
+    def rebuild(self) -> Dict[str, int]:
+        """Recount every table and overwrite the counters"""
+        totals = count_resources(None, None, True)
+        values = dict(totals, **{_REBUILT_AT: int(time())})
+        for name, value in values.items():
+            counter = db.session.get(DashboardCounter, name)
+            if counter is None:
+                db.session.add(DashboardCounter(name=name, value=value))
+            else:
+                counter.value = value
+        db.session.commit()
+        return totals
+
+    def totals(self) -> Dict[str, int]:
+        """Admin totals from the counters (one small SELECT), rebuilding them when missing or due"""
+        rows = {name: value for name, value in db.session.execute(
+            select(DashboardCounter.name, DashboardCounter.value))}
+        if any(name not in rows for name in COUNTED_MODELS) or \
+                time() - rows.get(_REBUILT_AT, 0) > self.rebuild_interval:
+            return self.rebuild()
+        return {name: max(0, rows[name]) for name in COUNTED_MODELS}
+
+
+_counters: Optional[DashboardCounters] = None
+
+
+def init_dashboard_counters(app) -> Optional[DashboardCounters]:
+    """Install materialised counters when DASHBOARD_MATERIALIZED_COUNTERS is set (DASHBOARD_COUNTERS_REBUILD)."""
+    global _counters
+    if os.environ.get('DASHBOARD_MATERIALIZED_COUNTERS', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    if _counters is None:
+        _counters = DashboardCounters(float(os.environ.get('DASHBOARD_COUNTERS_REBUILD', 3600)))
+        _counters.install()
+        with app.app_context():
+            _counters.rebuild()
+    return _counters
+
+
+def get_dashboard_counts(user_id: int, username: str, is_admin: bool) -> Dict:
+    """Resource counts shown on the dashboard for one user"""
+    if is_admin and _counters is not None:
+        counts = _counters.totals()
+    else:
+        counts = count_resources(user_id, username, is_admin)
+    return dict(counts, ftpAccounts=0, isAdmin=is_admin)  # FTP removed from system
@@ -0,0 +1,243 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+
+class DirectorySizeIndex:
+    """Persistent per-home directory size index.
+
+    Every directory under ``root`` gets one row holding the size and file count
+    of its direct files, the recursive totals and the directory mtime seen when
+    it was last scanned. A directory is only rescanned when its mtime changed
+    (an entry was added, removed or renamed); unchanged subtrees are reused.
+    Totals checked within ``ttl`` seconds are returned without touching disk.
+    Each thread uses its own SQLite connection, so sizes of different folders
+    can be computed concurrently; results are written in one short transaction.
+
+    In-place file rewrites do not bump the parent directory mtime, so callers
+    that modify files should call ``invalidate`` for the affected path.
+    """
+
+    _SCHEMA = """
+CREATE TABLE IF NOT EXISTS dir_sizes (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    own_bytes INTEGER NOT NULL,
+    own_files INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    total_files INTEGER NOT NULL,
+    checked_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_dir_sizes_parent ON dir_sizes (parent);
+"""
+
+    def __init__(self, root: str, db_path: str, ttl: float = 30.0):
+        self.root = os.path.normpath(root)
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn.executescript(self._SCHEMA)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def contains(self, path: str) -> bool:
+        """Return True if path lies inside this index's root."""
+        path = os.path.normpath(path)
+        return path == self.root or path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def get_size(self, path: str) -> Tuple[int, int]:
+        """Return (total_bytes, total_files) for a directory, rescanning only changed subtrees."""
+        path = os.path.normpath(path)
+        now = time()
+        row = self._get_row(path)
+        if row and now - row['checked_at'] < self.ttl:
+            return row['total_bytes'], row['total_files']
+        upserts, forgotten = [], []
+        totals = self._refresh(path, row, now, upserts, forgotten)
+        with self._conn as conn:
+            for gone in forgotten:
+                self._forget(conn, gone)
+            conn.executemany(
+                'INSERT OR REPLACE INTO dir_sizes '
+                '(path, parent, mtime_ns, own_bytes, own_files, total_bytes, total_files, checked_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                upserts
+            )
+        return totals
+
+    def get_cached_size(self, path: str) -> Optional[Tuple[int, int]]:
+        """Return the indexed totals for path if they are fresh, without touching disk."""
+        row = self._get_row(os.path.normpath(path))
+        if row and time() - row['checked_at'] < self.ttl:
+            return row['total_bytes'], row['total_files']
+        return None
+
+    def invalidate(self, path: str) -> None:
+        """Mark path's directory and all its ancestors up to the root as stale."""
+        path = os.path.normpath(path)
+        if not self.contains(path):
+            return
+        with self._conn as conn:
+            # Force a rescan of the directory itself (its own bytes changed)
+            conn.execute(
+                'UPDATE dir_sizes SET mtime_ns = -1, checked_at = 0 WHERE path IN (?, ?)',
+                (path, os.path.dirname(path))
+            )
+            # Ancestors only need their totals re-summed
+            current = os.path.dirname(path)
+            while self.contains(current):
+                conn.execute('UPDATE dir_sizes SET checked_at = 0 WHERE path = ?', (current,))
+                if current == self.root:
+                    break
+                current = os.path.dirname(current)
+
+    def _get_row(self, path: str) -> Optional[Dict]:
+        cur = self._conn.execute(
+            'SELECT mtime_ns, own_bytes, own_files, total_bytes, total_files, checked_at '
+            'FROM dir_sizes WHERE path = ?', (path,)
+        )
+        found = cur.fetchone()
+        if not found:
+            return None
+        keys = ('mtime_ns', 'own_bytes', 'own_files', 'total_bytes', 'total_files', 'checked_at')
+        return dict(zip(keys, found))
+
+    def _refresh(self, path: str, row: Optional[Dict], now: float,
+                 upserts: List[tuple], forgotten: List[str]) -> Tuple[int, int]:
+        """Revalidate a directory and its stale subdirectories.
+
+        Post-order walk with an explicit stack: a user can nest directories
+        deeper than Python's recursion limit in their own home.
+        """
+        frame = self._open(path, row, forgotten)
+        if frame is None:
+            return 0, 0
+        stack = [frame]
+        while True:
+            frame = stack[-1]
+            if frame['children']:
+                child = frame['children'].pop()
+                child_row = self._get_row(child)
+                if child_row and now - child_row['checked_at'] < self.ttl:
+                    frame['total_bytes'] += child_row['total_bytes']
+                    frame['total_files'] += child_row['total_files']
+                else:
+                    child_frame = self._open(child, child_row, forgotten)
+                    if child_frame is not None:
+                        stack.append(child_frame)
+                continue
+
+            # Every child is summed: record this directory and hand its totals to the parent
+            stack.pop()
+            upserts.append((frame['path'], os.path.dirname(frame['path']), frame['mtime_ns'], frame['own_bytes'],
+                            frame['own_files'], frame['total_bytes'], frame['total_files'], now))
+            if not stack:
+                return frame['total_bytes'], frame['total_files']
+            stack[-1]['total_bytes'] += frame['total_bytes']
+            stack[-1]['total_files'] += frame['total_files']
+
+    def _open(self, path: str, row: Optional[Dict], forgotten: List[str]) -> Optional[Dict]:
+        """Own sizes and subdirectories of one directory (rescanned only if its mtime changed); None if gone"""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            forgotten.append(path)
+            return None
+
+        if row and row['mtime_ns'] == mtime_ns:
+            # Direct entries unchanged: reuse own sizes, revalidate known children
+            own_bytes, own_files = row['own_bytes'], row['own_files']
+            children = [r[0] for r in self._conn.execute(
+                'SELECT path FROM dir_sizes WHERE parent = ?', (path,)
+            )]
+        else:
+            own_bytes, own_files, children = self._scan_directory(path)
+            known = {r[0] for r in self._conn.execute(
+                'SELECT path FROM dir_sizes WHERE parent = ?', (path,)
+            )}
+            forgotten.extend(known.difference(children))
+
+        return {
+            'path': path,
+            'mtime_ns': mtime_ns,
+            'own_bytes': own_bytes,
+            'own_files': own_files,
+            'total_bytes': own_bytes,
+            'total_files': own_files,
+            'children': children
+        }
+
+    def _scan_directory(self, path: str) -> Tuple[int, int, list]:
+        """Sum direct files of a directory and collect its real (non-symlink) subdirectories."""
+        own_bytes = 0
+        own_files = 0
+        children = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            # Same semantics as os.walk: symlinked dirs are neither followed nor counted
+                            if not entry.is_symlink():
+                                children.append(os.path.normpath(entry.path))
+                            continue
+                        own_bytes += entry.stat().st_size
+                        own_files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return own_bytes, own_files, children
+
+    @staticmethod
+    def _forget(conn: sqlite3.Connection, path: str) -> None:
+        """Drop a directory and everything below it from the index."""
+        prefix = path.rstrip(os.sep) + os.sep
+        conn.execute(
+            'DELETE FROM dir_sizes WHERE path = ? OR substr(path, 1, ?) = ?',
+            (path, len(prefix), prefix)
+        )
+
+
+_indexes: Dict[str, DirectorySizeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_size_index(root: str) -> DirectorySizeIndex:
+    """Return the shared size index for a home/document root, opening it on first use."""
+    root = os.path.normpath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index_dir = os.environ.get('DIR_SIZE_INDEX_DIR') or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'size_index'
+            )
+            db_name = hashlib.sha1(root.encode('utf-8')).hexdigest() + '.db'
+            ttl = float(os.environ.get('DIR_SIZE_INDEX_TTL', 30))
+            index = DirectorySizeIndex(root, os.path.join(index_dir, db_name), ttl=ttl)
+            _indexes[root] = index
+        return index
+
+
+def invalidate_size_index(path: str) -> None:
+    """Mark path stale in every open index that covers it (call after modifying files)."""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        try:
+            index.invalidate(path)
+        except Exception as e:
+            print(f"Warning: failed to invalidate size index for {path}: {e}")
@@ -3,6 +3,7 @@ import subprocess
 import hashlib
 import platform
 from datetime import datetime
+from services.maildir_size import get_maildir_size_engine
 
 class EmailService:
     def __init__(self):
@@ -212,14 +213,11 @@ class EmailService:
         """Get mailbox quota usage in MB"""
         try:
             user_dir = os.path.join(self.virtual_mailbox_base, domain, username)
-            if not os.path.exists(user_dir):
+            usage = get_maildir_size_engine().measure(user_dir)
+            if usage is None:
                 return 0
 
-            # Get directory size using du command
-            result = subprocess.run(['du', '-sm', user_dir], capture_output=True, text=True, check=True)
-            size = float(result.stdout.split()[0])
-            
-            return size
+            return round(usage['bytes'] / (1024 * 1024), 2)
 
         except Exception as e:
             raise Exception(f'Failed to get quota usage: {str(e)}')
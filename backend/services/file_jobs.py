@@ -0,0 +1,334 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+from typing import Callable, Dict, List, Optional
+
+JOB_TYPES = ('zip', 'unzip', 'copy', 'delete')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# How often a running job writes progress and checks for cancellation
+PROGRESS_FLUSH_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested"""
+
+
+class FileJobStore:
+    """SQLite (WAL) table of file jobs.
+
+    Kept outside the main database so every gunicorn worker can read the status
+    of, and cancel, a job that is executing in another worker without going
+    through the MySQL connection pool on each progress update.
+    """
+
+    _SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_jobs (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT,
+    phase TEXT,
+    files_done INTEGER NOT NULL DEFAULT 0,
+    files_total INTEGER,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    bytes_total INTEGER,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_file_jobs_user ON file_jobs (user_id, created_at);
+"""
+
+    _COLUMNS = ('id', 'user_id', 'type', 'status', 'params', 'phase', 'files_done', 'files_total',
+                'bytes_done', 'bytes_total', 'result', 'error', 'cancel_requested',
+                'created_at', 'started_at', 'finished_at', 'updated_at')
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn.executescript(self._SCHEMA)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_type: str, user_id: int, params: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time()
+        with self._conn as conn:
+            conn.execute(
+                'INSERT INTO file_jobs (id, user_id, type, status, params, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, user_id, job_type, 'queued', json.dumps(params), now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM file_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return dict(zip(self._COLUMNS, row)) if row else None
+
+    def list(self, user_id: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        query = f"SELECT {', '.join(self._COLUMNS)} FROM file_jobs"
+        args: tuple = ()
+        if user_id is not None:
+            query += ' WHERE user_id = ?'
+            args = (user_id,)
+        query += ' ORDER BY created_at DESC LIMIT ?'
+        rows = self._conn.execute(query, args + (limit,)).fetchall()
+        return [dict(zip(self._COLUMNS, row)) for row in rows]
+
+    def update(self, job_id: str, **fields) -> None:
+        fields['updated_at'] = time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._conn as conn:
+            conn.execute(f'UPDATE file_jobs SET {assignments} WHERE id = ?', tuple(fields.values()) + (job_id,))
+
+    def touch(self, job_ids: List[str]) -> None:
+        """Heartbeat: mark queued and running jobs as alive without changing their progress"""
+        with self._conn as conn:
+            conn.executemany(
+                "UPDATE file_jobs SET updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                [(time(), job_id) for job_id in job_ids]
+            )
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        now = time()
+        self.update(job_id, status=status, finished_at=now,
+                    result=json.dumps(result) if result is not None else None, error=error)
+
+    def request_cancel(self, job_id: str) -> None:
+        with self._conn as conn:
+            conn.execute('UPDATE file_jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?', (time(), job_id))
+            # Jobs still waiting in the queue are cancelled right away
+            conn.execute(
+                "UPDATE file_jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time(), job_id)
+            )
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        row = self._conn.execute('SELECT cancel_requested FROM file_jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def purge(self, older_than: float) -> None:
+        with self._conn as conn:
+            conn.execute(
+                f"DELETE FROM file_jobs WHERE status IN ({', '.join('?' * len(TERMINAL_STATUSES))}) "
+                "AND finished_at < ?",
+                TERMINAL_STATUSES + (older_than,)
+            )
+
+
+class JobProgress:
+    """Progress reporter handed to a running job.
+
+    File operations call ``advance`` per file; counters are flushed to the
+    store at most every PROGRESS_FLUSH_INTERVAL seconds, which is also when a
+    cancellation requested from another worker is noticed.
+    """
+
+    def __init__(self, store: FileJobStore, job_id: str, cancel_event: threading.Event):
+        self.store = store
+        self.job_id = job_id
+        self.cancel_event = cancel_event
+        self.phase = None
+        self.files_done = 0
+        self.bytes_done = 0
+        self.files_total = None
+        self.bytes_total = None
+        self._last_flush = 0.0
+
+    def start_phase(self, phase: str, files_total: Optional[int] = None, bytes_total: Optional[int] = None) -> None:
+        """Begin a new phase (e.g. 'copy' then 'chown'); counters restart from zero."""
+        self.phase = phase
+        self.files_done = 0
+        self.bytes_done = 0
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.flush(force=True)
+
+    def advance(self, files: int = 0, bytes: int = 0) -> None:
+        self.files_done += files
+        self.bytes_done += bytes
+        self.flush()
+
+    def check_cancelled(self) -> None:
+        self.flush()
+        if self.cancel_event.is_set():
+            raise JobCancelled("Job cancelled")
+
+    def flush(self, force: bool = False) -> None:
+        now = time()
+        if not force and now - self._last_flush < PROGRESS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        self.store.update(self.job_id, phase=self.phase, files_done=self.files_done, files_total=self.files_total,
+                          bytes_done=self.bytes_done, bytes_total=self.bytes_total)
+        if not self.cancel_event.is_set() and self.store.is_cancel_requested(self.job_id):
+            self.cancel_event.set()
+
+
+class FileJobManager:
+    """Runs long file operations (zip, unzip, copy, delete) on a bounded worker pool.
+
+    While a job is queued or running, a heartbeat thread in the owning process
+    refreshes its updated_at every few seconds, independent of progress, so
+    one huge file (or a long wait behind other jobs) does not look stalled. A
+    queued or running job whose heartbeat is older than ``stale_after``
+    belonged to a worker that went away and is marked failed.
+    """
+
+    def __init__(self, store: FileJobStore, workers: int = 2, retention: float = 86400.0,
+                 stale_after: float = 300.0):
+        self.store = store
+        self.retention = retention
+        self.stale_after = stale_after
+        self.heartbeat_interval = max(1.0, min(30.0, stale_after / 4))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-job')
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._heartbeat: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, job_type: str, user_id: int, params: Dict, fn: Callable[[JobProgress], Dict]) -> Dict:
+        """Queue fn(progress) to run inside app's context; returns the queued job."""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unsupported job type: {job_type}")
+        self.store.purge(time() - self.retention)
+        job_id = self.store.create(job_type, user_id, params)
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='file-job-heartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+        self._executor.submit(self._run, app, job_id, fn)
+        return self.get(job_id)
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            sleep(self.heartbeat_interval)
+            with self._lock:
+                owned = list(self._cancel_events)
+            if not owned:
+                continue
+            try:
+                self.store.touch(owned)
+            except Exception as e:
+                print(f"Error updating file job heartbeat: {e}")
+
+    def _run(self, app, job_id: str, fn: Callable[[JobProgress], Dict]) -> None:
+        with self._lock:
+            cancel_event = self._cancel_events.setdefault(job_id, threading.Event())
+        try:
+            job = self.store.get(job_id)
+            if not job or job['status'] != 'queued':
+                return
+            self.store.update(job_id, status='running', started_at=time())
+            progress = JobProgress(self.store, job_id, cancel_event)
+            try:
+                with app.app_context():
+                    progress.check_cancelled()
+                    result = fn(progress)
+                progress.flush(force=True)
+                self.store.finish(job_id, 'completed', result=result)
+            except JobCancelled:
+                progress.flush(force=True)
+                self.store.finish(job_id, 'cancelled', error='Cancelled by user')
+            except Exception as e:
+                progress.flush(force=True)
+                self.store.finish(job_id, 'failed', error=str(e))
+        except Exception as e:
+            print(f"Error running file job {job_id}: {e}")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        if not job:
+            return None
+        return self.to_dict(self._check_stale(job))
+
+    def list(self, user_id: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        return [self.to_dict(self._check_stale(job)) for job in self.store.list(user_id, limit)]
+
+    def _check_stale(self, job: Dict) -> Dict:
+        if job['status'] in ('queued', 'running') and time() - job['updated_at'] > self.stale_after:
+            # No heartbeat: the worker process that owned this job went away (restart, crash)
+            self.store.finish(job['id'], 'failed', error='Job worker stopped responding')
+            job = self.store.get(job['id'])
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Request cancellation; the job stops at its next progress checkpoint."""
+        if not self.store.get(job_id):
+            return None
+        self.store.request_cancel(job_id)
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event:
+            cancel_event.set()
+        return self.get(job_id)
+
+    @staticmethod
+    def to_dict(job: Dict) -> Dict:
+        return {
+            'id': job['id'],
+            'type': job['type'],
+            'status': job['status'],
+            'userId': job['user_id'],
+            'params': json.loads(job['params']) if job['params'] else {},
+            'phase': job['phase'],
+            'progress': {
+                'filesProcessed': job['files_done'],
+                'filesTotal': job['files_total'],
+                'bytesProcessed': job['bytes_done'],
+                'bytesTotal': job['bytes_total']
+            },
+            'cancelRequested': bool(job['cancel_requested']),
+            'result': json.loads(job['result']) if job['result'] else None,
+            'error': job['error'],
+            'createdAt': job['created_at'],
+            'startedAt': job['started_at'],
+            'finishedAt': job['finished_at'],
+            'updatedAt': job['updated_at']
+        }
+
+
+_manager: Optional[FileJobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_file_job_manager() -> FileJobManager:
+    """Return the process-wide job manager, creating the store and pool on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            db_path = os.environ.get('FILE_JOBS_DB') or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'file_jobs.db'
+            )
+            _manager = FileJobManager(
+                FileJobStore(db_path),
+                workers=int(os.environ.get('FILE_JOB_WORKERS', 2)),
+                retention=float(os.environ.get('FILE_JOB_RETENTION', 86400)),
+                stale_after=float(os.environ.get('FILE_JOB_STALE_SECONDS', 300))
+            )
+        return _manager
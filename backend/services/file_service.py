@@ -1,10 +1,22 @@
 import os
 import shutil
-from typing import List, Dict, Optional
+import json
+import base64
+import heapq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import total_ordering
+from typing import List, Dict, Optional, Iterator, Tuple, Union
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from utils.security import sanitize_path, sanitize_filename, is_safe_path
-from models.virtual_host import VirtualHost
+from services.access_index import access_index, VhostRef
+from utils.principal import Principal, get_principal
+from services.dir_size_index import get_size_index, invalidate_size_index
+from services.parallel_archive import get_archiver
+from services.file_jobs import JobCancelled
+from services.upload_sessions import get_upload_store, CHECKSUM_ALGORITHMS
+from services.zip_extractor import get_zip_extractor
+from utils.id_name_cache import id_name_cache
 import stat
 import zipfile
 
@@ -18,6 +30,80 @@ except ImportError:
     pwd = None
     grp = None
 
+# Shared, bounded pool for on-demand folder size computation
+_size_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_size_executor() -> ThreadPoolExecutor:
+    global _size_executor
+    if _size_executor is None:
+        _size_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('FILE_SIZE_WORKERS', 4)),
+            thread_name_prefix='dir-size'
+        )
+    return _size_executor
+
+LISTING_SORT_KEYS = ('name', 'size', 'mtime', 'type')
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Already-compressed formats gain nothing from deflate, so they are stored as-is
+ZIP_STORED_EXTENSIONS = frozenset((
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic',
+    '.gz', '.tgz', '.bz2', '.xz', '.zst', '.zip', '.7z', '.rar',
+    '.mp3', '.mp4', '.m4a', '.m4v', '.mkv', '.webm', '.mov', '.ogg', '.flac',
+    '.woff', '.woff2', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.jar', '.apk'
+))
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024
+# Archive formats for zip_items/zip_domain_items and the extension each one gets
+ARCHIVE_FORMATS = {'zip': '.zip', 'tar.gz': '.tar.gz', 'tar.zst': '.tar.zst'}
+
+class _ZipStreamBuffer:
+    """Write-only, non-seekable sink for zipfile that hands written bytes back in chunks"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class _HeapItem:
+    """Max-heap wrapper for (key, raw, entry) tuples: the worst candidate sits on top"""
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+    def __lt__(self, other):
+        return other.item[0] < self.item[0]
+
+@total_ordering
+class _Descending:
+    """Wraps a sort value so it compares in reverse order"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
 class FileService:
     def __init__(self):
         """Initialize FileService with proper root directory"""
@@ -44,34 +130,20 @@ class FileService:
         
         # Set proper ownership if running as root (Unix only)
         if UNIX_MODULES_AVAILABLE and pwd and os.geteuid() == 0 and current_user:
-            user_info = pwd.getpwnam(current_user)
+            user_info = id_name_cache.getpwnam(current_user)
             os.chown(self.root_dir, user_info.pw_uid, user_info.pw_gid)
 
+    def _resolve_domain(self, domain: str, user_id: int) -> Tuple[Principal, Optional[VhostRef]]:
+        """The user's principal and the vhost serving domain, or None if it doesn't exist or they can't reach it"""
+        current_user = get_principal(user_id)
+        if not current_user:
+            raise ValueError("User not found")
+        return current_user, access_index.resolve(current_user, domain)
+
     def get_domain_path(self, domain: str, user_id: int) -> str:
         """Get the document root path for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
             
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -87,28 +159,7 @@ class FileService:
     def get_domain_structure(self, domain: str, user_id: int) -> Dict:
         """Get the directory structure for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
             
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -161,31 +212,18 @@ class FileService:
         except Exception as e:
             raise Exception(f"Error getting domain structure: {str(e)}")
 
-    def list_domain_directory(self, domain: str, path: str, user_id: int) -> List[Dict]:
-        """List directory contents for a specific domain"""
+    def list_domain_directory(self, domain: str, path: str, user_id: int, lazy_sizes: bool = False,
+                              page_size: Optional[int] = None, cursor: Optional[str] = None,
+                              sort_by: str = 'name', order: str = 'asc',
+                              prefix: Optional[str] = None) -> Union[List[Dict], Dict]:
+        """List directory contents for a specific domain.
+
+        With lazy_sizes, folders whose size is not already indexed come back with
+        size None and sizePending True; fetch them via iter_directory_sizes.
+        With page_size, returns one page dict (see _list_directory_page) instead of a list.
+        """
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
             
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -208,12 +246,130 @@ class FileService:
                 if not real_full_path.startswith(real_home_dir):
                     raise ValueError("Access denied: Path outside domain directory")
             
-            return self._list_directory_contents(full_path, base_dir)
+            if page_size is not None:
+                return self._list_directory_page(full_path, base_dir, page_size, cursor=cursor, sort_by=sort_by,
+                                                 order=order, prefix=prefix, lazy_sizes=lazy_sizes)
+            return self._list_directory_contents(full_path, base_dir, lazy_sizes=lazy_sizes)
             
+        except ValueError:
+            # Bad sort/cursor/path or access denied: the route answers 400
+            raise
         except Exception as e:
             raise Exception(f"Error listing domain directory: {str(e)}")
 
-    def _list_directory_contents(self, full_path: str, base_dir: str) -> List[Dict]:
+    def _list_directory_page(self, full_path: str, base_dir: str, page_size: int, cursor: Optional[str] = None,
+                             sort_by: str = 'name', order: str = 'asc', prefix: Optional[str] = None,
+                             lazy_sizes: bool = False, skip_hidden: bool = False) -> Dict:
+        """Return one sorted page of a directory using keyset pagination.
+
+        Entries are streamed from scandir and only the page_size + 1 smallest
+        keys after the cursor are kept in a heap, so memory stays bounded by the
+        page size regardless of how many entries the directory holds. Folders
+        always come first; the cursor is an opaque token encoding the last key.
+        """
+        if sort_by not in LISTING_SORT_KEYS:
+            raise ValueError(f"Invalid sort key: {sort_by}. Use one of {', '.join(LISTING_SORT_KEYS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError("Invalid order: use asc or desc")
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        if not os.path.isdir(full_path):
+            raise FileNotFoundError(f"Directory not found: {full_path}")
+
+        after = self._decode_listing_cursor(cursor, sort_by, order, prefix) if cursor else None
+        after_key = self._listing_sort_key(after, order) if after is not None else None
+        prefix_lower = prefix.lower() if prefix else None
+        credentials = self._get_caller_credentials()
+
+        total = 0
+        candidates = []
+        with os.scandir(full_path) as entries:
+            for entry in entries:
+                name = entry.name
+                if skip_hidden and name.startswith('.'):
+                    continue
+                if prefix_lower and not name.lower().startswith(prefix_lower):
+                    continue
+                try:
+                    raw = self._listing_raw_key(entry, sort_by, base_dir)
+                except OSError as e:
+                    print(f"Error accessing {entry.path}: {e}")
+                    continue
+                total += 1
+                key = self._listing_sort_key(raw, order)
+                if after_key is not None and not after_key < key:
+                    continue
+                # Bounded heap: keep only the page_size + 1 best candidates seen so far
+                item = (key, raw, entry)
+                if len(candidates) <= page_size:
+                    heapq.heappush(candidates, _HeapItem(item))
+                elif key < candidates[0].item[0]:
+                    heapq.heapreplace(candidates, _HeapItem(item))
+
+        page = sorted((c.item for c in candidates), key=lambda item: item[0])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+
+        items = []
+        for key, raw, entry in page:
+            try:
+                items.append(self._build_entry_info(entry, base_dir, credentials, lazy_sizes))
+            except (OSError, PermissionError) as e:
+                print(f"Error accessing {entry.path}: {e}")
+
+        next_cursor = self._encode_listing_cursor(page[-1][1], sort_by, order, prefix) if has_more and page else None
+        return {
+            'items': items,
+            'nextCursor': next_cursor,
+            'hasMore': has_more,
+            'total': total,
+            'sort': sort_by,
+            'order': order,
+            'prefix': prefix or ''
+        }
+
+    def _listing_raw_key(self, entry: os.DirEntry, sort_by: str, base_dir: str) -> list:
+        """Plain, JSON-serialisable sort key: [folder_group, primary, name_lower, name].
+
+        Name and type sorts only need d_type, so regular entries are not stat'ed
+        until they make it into the page.
+        """
+        is_dir = entry.is_dir()
+        name = entry.name
+        if sort_by == 'name':
+            primary = name.lower()
+        elif sort_by == 'type':
+            primary = 'folder' if is_dir else self._get_file_type(name)
+        elif sort_by == 'mtime':
+            primary = entry.stat().st_mtime
+        elif is_dir:
+            # Folder sizes come from the index only; unknown sizes sort as 0
+            primary = self._get_cached_directory_size(entry.path, base_dir) or 0
+        else:
+            primary = entry.stat().st_size
+        return [0 if is_dir else 1, primary, name.lower(), name]
+
+    def _listing_sort_key(self, raw: list, order: str) -> tuple:
+        if order == 'desc':
+            return (raw[0],) + tuple(_Descending(v) for v in raw[1:])
+        return tuple(raw)
+
+    def _encode_listing_cursor(self, raw: list, sort_by: str, order: str, prefix: Optional[str]) -> str:
+        payload = json.dumps({'k': raw, 's': sort_by, 'o': order, 'p': prefix or ''}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def _decode_listing_cursor(self, cursor: str, sort_by: str, order: str, prefix: Optional[str]) -> list:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            raw = payload['k']
+            if not isinstance(raw, list) or len(raw) != 4:
+                raise ValueError
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if payload.get('s') != sort_by or payload.get('o') != order or payload.get('p', '') != (prefix or ''):
+            raise ValueError("Cursor does not match the requested sort, order or prefix")
+        return raw
+
+    def _list_directory_contents(self, full_path: str, base_dir: str, lazy_sizes: bool = False) -> List[Dict]:
         """Internal method to list directory contents"""
         if not os.path.exists(full_path):
             raise FileNotFoundError(f"Directory not found: {full_path}")
@@ -222,63 +378,13 @@ class FileService:
             raise ValueError(f"Not a directory: {full_path}")
 
         items = []
+        credentials = self._get_caller_credentials()
         try:
             dir_entries = os.scandir(full_path)
             
             for entry in dir_entries:
                 try:
-                    # Get basic file info
-                    name = entry.name
-                    item_path = entry.path
-                    is_dir = entry.is_dir()
-                    is_file = entry.is_file()
-                    
-                    try:
-                        stat_info = entry.stat()
-                    except (OSError, PermissionError):
-                        stat_info = os.stat(item_path)
-                    
-                    # Calculate relative path from base directory
-                    rel_path = os.path.relpath(item_path, base_dir)
-                    rel_path = rel_path.replace(os.sep, '/')
-                    
-                    # Get file type
-                    file_type = self._get_file_type(name) if is_file else 'folder'
-                    
-                    # Get owner and group names (Unix only)
-                    if UNIX_MODULES_AVAILABLE and pwd and grp:
-                        try:
-                            owner_name = pwd.getpwuid(stat_info.st_uid).pw_name
-                        except KeyError:
-                            owner_name = str(stat_info.st_uid)
-                        
-                        try:
-                            group_name = grp.getgrgid(stat_info.st_gid).gr_name
-                        except KeyError:
-                            group_name = str(stat_info.st_gid)
-                    else:
-                        # Windows fallback
-                        owner_name = 'N/A'
-                        group_name = 'N/A'
-                    
-                    item_info = {
-                        'name': name,
-                        'type': file_type,
-                        'size': stat_info.st_size if is_file else self._get_directory_size(item_path) if is_dir else None,
-                        'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
-                        'path': rel_path,
-                        'permissions': self._get_file_permissions(item_path),
-                        'owner': owner_name,
-                        'group': group_name,
-                        'isHidden': name.startswith('.'),
-                        'isSymlink': entry.is_symlink(),
-                        'isReadable': os.access(item_path, os.R_OK),
-                        'isWritable': os.access(item_path, os.W_OK),
-                        'isExecutable': os.access(item_path, os.X_OK)
-                    }
-                    
-                    items.append(item_info)
-                    
+                    items.append(self._build_entry_info(entry, base_dir, credentials, lazy_sizes))
                 except (OSError, PermissionError) as e:
                     print(f"Error accessing {entry.path}: {e}")
                     continue
@@ -296,8 +402,176 @@ class FileService:
         sorted_items = sorted(items, key=lambda x: (x['type'] != 'folder', x['name'].lower()))
         return sorted_items
 
-    def _get_directory_size(self, path: str) -> int:
-        """Get total size of directory"""
+    def _build_entry_info(self, entry: os.DirEntry, base_dir: str, credentials: Tuple[int, frozenset],
+                          lazy_sizes: bool = False) -> Dict:
+        """Build the listing dict for one scandir entry.
+
+        Type, permissions and access flags are all derived from the single
+        (cached) entry.stat() result, so a plain file costs one stat syscall.
+        """
+        name = entry.name
+        item_path = entry.path
+        stat_info = entry.stat()
+        mode = stat_info.st_mode
+        is_dir = stat.S_ISDIR(mode)
+        is_file = stat.S_ISREG(mode)
+        is_readable, is_writable, is_executable = self._access_from_stat(stat_info, credentials)
+
+        # Calculate relative path from base directory
+        rel_path = os.path.relpath(item_path, base_dir)
+        rel_path = rel_path.replace(os.sep, '/')
+
+        # Get owner and group names (Unix only)
+        if UNIX_MODULES_AVAILABLE and pwd and grp:
+            owner_name = id_name_cache.uid_to_name(stat_info.st_uid)
+            group_name = id_name_cache.gid_to_name(stat_info.st_gid)
+        else:
+            # Windows fallback
+            owner_name = 'N/A'
+            group_name = 'N/A'
+
+        # Folder sizes: indexed (may rescan changed subtrees) or, in lazy mode, cached-only
+        size_pending = False
+        if is_file:
+            size = stat_info.st_size
+        elif is_dir and lazy_sizes:
+            size = self._get_cached_directory_size(item_path, base_dir)
+            size_pending = size is None
+        elif is_dir:
+            size = self._get_directory_size(item_path, base_dir)
+        else:
+            size = None
+
+        return {
+            'name': name,
+            'type': self._get_file_type(name) if is_file else 'folder',
+            'size': size,
+            'sizePending': size_pending,
+            'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
+            'path': rel_path,
+            'permissions': self._permissions_from_mode(mode),
+            'owner': owner_name,
+            'group': group_name,
+            'isHidden': name.startswith('.'),
+            'isSymlink': entry.is_symlink(),
+            'isReadable': is_readable,
+            'isWritable': is_writable,
+            'isExecutable': is_executable
+        }
+
+    def _get_caller_credentials(self) -> Tuple[int, frozenset]:
+        """Real uid and group ids of this process, as used by os.access"""
+        if not hasattr(os, 'getuid'):
+            return -1, frozenset()
+        return os.getuid(), frozenset(os.getgroups()) | {os.getgid()}
+
+    def _access_from_stat(self, stat_info: os.stat_result, credentials: Tuple[int, frozenset]) -> Tuple[bool, bool, bool]:
+        """Derive (readable, writable, executable) from mode bits like os.access would.
+
+        ACLs and read-only mounts are not consulted; the actual operation still
+        enforces them.
+        """
+        uid, gids = credentials
+        mode = stat_info.st_mode
+        if uid == -1:
+            # No POSIX credentials (Windows): mirror what os.access reports there
+            return True, bool(mode & stat.S_IWRITE), True
+        if uid == 0:
+            # Root bypasses rwx checks, except execute needs at least one x bit on files
+            executable = stat.S_ISDIR(mode) or bool(mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
+            return True, True, executable
+        if stat_info.st_uid == uid:
+            bits = (mode >> 6) & 0o7
+        elif stat_info.st_gid in gids:
+            bits = (mode >> 3) & 0o7
+        else:
+            bits = mode & 0o7
+        return bool(bits & 0o4), bool(bits & 0o2), bool(bits & 0o1)
+
+    def _get_directory_size(self, path: str, base_dir: Optional[str] = None) -> int:
+        """Get total size of directory from the persistent size index"""
+        try:
+            index = get_size_index(self._size_index_root(path, base_dir))
+            if index.contains(path):
+                return index.get_size(path)[0]
+        except Exception as e:
+            print(f"Size index unavailable for {path}, falling back to walk: {e}")
+        return self._walk_directory_size(path)
+
+    def _get_cached_directory_size(self, path: str, base_dir: Optional[str] = None) -> Optional[int]:
+        """Get directory size only if the size index already has a fresh value"""
+        try:
+            index = get_size_index(self._size_index_root(path, base_dir))
+            if index.contains(path):
+                cached = index.get_cached_size(path)
+                return cached[0] if cached else None
+        except Exception as e:
+            print(f"Size index unavailable for {path}: {e}")
+        return None
+
+    def resolve_domain_size_targets(self, domain: str, paths: List[str], user_id: int) -> List[Tuple[str, str, str]]:
+        """Validate folder paths of a domain for size computation.
+
+        Returns (requested_path, full_path, base_dir) tuples; raises on access violations.
+        """
+        current_user, virtual_host = self._resolve_domain(domain, user_id)
+        is_admin = current_user.admin
+
+        if not virtual_host:
+            raise ValueError("Domain not found or access denied")
+
+        base_dir = virtual_host.document_root or f"/home/{virtual_host.linux_username}"
+        real_base = os.path.realpath(base_dir)
+        targets = []
+        for path in paths:
+            full_path = base_dir if not path or path == '/' else os.path.join(base_dir, sanitize_path(path))
+            if not is_admin and not os.path.realpath(full_path).startswith(real_base):
+                raise ValueError("Access denied: Path outside domain directory")
+            targets.append((path, full_path, base_dir))
+        return targets
+
+    def resolve_size_targets(self, paths: List[str]) -> List[Tuple[str, str, str]]:
+        """Validate folder paths under the system root for size computation"""
+        targets = []
+        for path in paths:
+            rel = '' if not path or path == '/' else sanitize_path(path)
+            if not is_safe_path(self.root_dir, rel):
+                raise ValueError(f"Invalid path: {path}")
+            targets.append((path, os.path.join(self.root_dir, rel), self.root_dir))
+        return targets
+
+    def iter_directory_sizes(self, targets: List[Tuple[str, str, str]]) -> Iterator[Dict]:
+        """Compute folder sizes on the shared pool, yielding each result as soon as it finishes"""
+        executor = _get_size_executor()
+        futures = {}
+        for path, full_path, base_dir in targets:
+            if os.path.isdir(full_path):
+                futures[executor.submit(self._get_directory_size, full_path, base_dir)] = path
+            else:
+                yield {'path': path, 'size': None, 'sizePending': False, 'error': 'Not a directory'}
+        try:
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    yield {'path': path, 'size': future.result(), 'sizePending': False}
+                except Exception as e:
+                    yield {'path': path, 'size': None, 'sizePending': False, 'error': str(e)}
+        finally:
+            # Client went away: don't keep computing sizes nobody will read
+            for future in futures:
+                future.cancel()
+
+    def _size_index_root(self, path: str, base_dir: Optional[str] = None) -> str:
+        """Pick the root an index is kept for: the listing base, the user's home, or the path itself"""
+        if base_dir:
+            return base_dir
+        parts = os.path.normpath(path).split(os.sep)
+        if len(parts) >= 3 and parts[1] == 'home' and parts[2]:
+            return os.sep.join(parts[:3])
+        return path
+
+    def _walk_directory_size(self, path: str) -> int:
+        """Get total size of directory by walking the whole tree"""
         try:
             total_size = 0
             for dirpath, dirnames, filenames in os.walk(path):
@@ -314,28 +588,7 @@ class FileService:
     def read_domain_file(self, domain: str, path: str, user_id: int) -> Dict:
         """Read file content for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -360,28 +613,7 @@ class FileService:
     def write_domain_file(self, domain: str, path: str, content: str, user_id: int) -> Dict:
         """Write file content for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -403,7 +635,7 @@ class FileService:
             # Ensure the file ownership is set to the domain user when running as root
             try:
                 if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
+                    user_info = id_name_cache.getpwnam(virtual_host.linux_username)
                     os.chown(full_path, user_info.pw_uid, user_info.pw_gid)
             except Exception as e:
                 print(f"Warning: failed to chown written file {full_path}: {e}")
@@ -416,28 +648,7 @@ class FileService:
     def upload_domain_file(self, domain: str, path: str, file, user_id: int) -> Dict:
         """Upload file for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -448,31 +659,116 @@ class FileService:
         except Exception as e:
             raise Exception(f"Error uploading domain file: {str(e)}")
 
+    def init_domain_upload(self, domain: str, path: str, filename: str, size: int, user_id: int) -> Dict:
+        """Start a resumable upload into a domain directory"""
+        if size is None or size < 0:
+            raise ValueError("size must be a non-negative integer")
+        try:
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
+
+            if not virtual_host:
+                raise ValueError("Domain not found or access denied")
+
+            base_dir = virtual_host.document_root or f"/home/{virtual_host.linux_username}"
+            return self._init_upload(base_dir, path, filename, size, user_id, domain=domain,
+                                     owner_username=virtual_host.linux_username)
+        except ValueError:
+            # Bad filename/size or access denied: the route answers 400
+            raise
+        except Exception as e:
+            raise Exception(f"Error starting domain upload: {str(e)}")
+
+    def init_upload(self, path: str, filename: str, size: int, user_id: int) -> Dict:
+        """Start a resumable upload under the system root"""
+        path = sanitize_path(path) if path else ''
+        if not is_safe_path(self.root_dir, path):
+            raise ValueError("Invalid path")
+        return self._init_upload(self.root_dir, path, filename, size, user_id)
+
+    def _init_upload(self, base_dir: str, path: str, filename: str, size: int, user_id: int,
+                     domain: Optional[str] = None, owner_username: Optional[str] = None) -> Dict:
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise ValueError("Invalid filename")
+        if size is None or size < 0:
+            raise ValueError("size must be a non-negative integer")
+
+        path = sanitize_path(path) if path else ''
+        upload_dir = os.path.join(base_dir, path) if path else base_dir
+        os.makedirs(upload_dir, exist_ok=True)
+
+        owner_uid = owner_gid = None
+        try:
+            if owner_username and UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
+                user_info = id_name_cache.getpwnam(owner_username)
+                owner_uid, owner_gid = user_info.pw_uid, user_info.pw_gid
+        except Exception as e:
+            print(f"Warning: failed to resolve upload owner {owner_username}: {e}")
+
+        store = get_upload_store()
+        session = store.create(user_id, domain, os.path.join(upload_dir, filename), size,
+                               owner_uid=owner_uid, owner_gid=owner_gid, owner_username=owner_username)
+        invalidate_size_index(session['part_path'])
+        return store.to_dict(session)
+
+    def _get_upload_session(self, upload_id: str, user_id: int) -> Dict:
+        session = get_upload_store().get(upload_id)
+        if not session or session['user_id'] != user_id:
+            raise FileNotFoundError("Upload not found")
+        return session
+
+    def get_upload_status(self, upload_id: str, user_id: int) -> Dict:
+        """Return the received byte ranges so a client knows where to resume"""
+        return get_upload_store().to_dict(self._get_upload_session(upload_id, user_id))
+
+    def write_upload_chunk(self, upload_id: str, offset: int, stream, length: int, user_id: int) -> Dict:
+        """Write one chunk at offset straight into the upload's part file"""
+        store = get_upload_store()
+        session = self._get_upload_session(upload_id, user_id)
+        return store.to_dict(store.write_chunk(session, offset, stream, length))
+
+    def complete_upload(self, upload_id: str, user_id: int, checksum: Optional[str] = None,
+                        algorithm: str = 'sha256') -> Dict:
+        """Verify the checksum, then atomically move the part file to its final name"""
+        store = get_upload_store()
+        session = self._get_upload_session(upload_id, user_id)
+        if not store.is_complete(session):
+            raise ValueError(f"Upload incomplete: received {session['received']} of {session['size']} bytes")
+
+        algorithm = (algorithm or 'sha256').lower()
+        if algorithm not in CHECKSUM_ALGORITHMS:
+            raise ValueError(f"Unsupported checksum algorithm: {algorithm}")
+        actual = store.file_checksum(session['part_path'], algorithm)
+        if checksum and actual.lower() != checksum.lower():
+            # Keep the session so the client can re-send chunks and try again
+            raise ValueError(f"Checksum mismatch: expected {checksum}, got {actual}")
+
+        final_path = session['final_path']
+        os.replace(session['part_path'], final_path)
+        store.delete(upload_id, remove_part=False)
+        invalidate_size_index(final_path)
+
+        stat_info = os.stat(final_path)
+        return {
+            'name': session['filename'],
+            'size': stat_info.st_size,
+            'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
+            'permissions': self._get_file_permissions(final_path),
+            'checksum': actual,
+            'checksumAlgorithm': algorithm
+        }
+
+    def abort_upload(self, upload_id: str, user_id: int) -> bool:
+        """Cancel an upload and remove its part file"""
+        session = self._get_upload_session(upload_id, user_id)
+        get_upload_store().delete(upload_id)
+        invalidate_size_index(session['part_path'])
+        return True
+
     def get_domain_file_info(self, domain: str, path: str, user_id: int) -> Dict:
         """Get detailed file information for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -494,71 +790,248 @@ class FileService:
         except Exception as e:
             raise Exception(f"Error getting domain file info: {str(e)}")
 
-    def zip_domain_items(self, domain: str, base_path: str, item_names: List[str], zip_name: Optional[str], user_id: int) -> Dict:
-        """Create a zip archive from one or more items in a domain directory"""
-        try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
+    def _resolve_domain_zip_base(self, domain: str, base_path: str, user_id: int) -> Tuple[VhostRef, str, str]:
+        """Resolve the virtual host, home directory and base directory for zip operations"""
+        current_user, virtual_host = self._resolve_domain(domain, user_id)
+
+        if not virtual_host:
+            raise ValueError("Domain not found or access denied")
+
+        home_dir = f"/home/{virtual_host.linux_username}"
+        base_path = sanitize_path(base_path) if base_path else ''
+        base_full_path = os.path.join(home_dir, base_path)
+
+        # Security check
+        if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
+            real_home = os.path.realpath(home_dir)
+            if not os.path.realpath(base_full_path).startswith(real_home):
+                raise ValueError("Access denied: Path outside domain directory")
 
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
+        if not os.path.isdir(base_full_path):
+            raise ValueError("Base path must be a directory")
+
+        return virtual_host, home_dir, base_full_path
 
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
+    @staticmethod
+    def _zip_compress_type(arcname: str, store_compressed: bool) -> int:
+        """Pick ZIP_STORED for already-compressed files when requested, ZIP_DEFLATED otherwise"""
+        if store_compressed and os.path.splitext(arcname)[1].lower() in ZIP_STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    @staticmethod
+    def _resolve_zip_items(base_dir: str, item_names: List[str]) -> List[str]:
+        """Validate item names against base_dir and return their full paths"""
+        if not item_names:
+            raise ValueError("No items specified to zip")
+        items = []
+        for name in item_names:
+            item_full = os.path.join(base_dir, sanitize_path(name))
+            if not os.path.exists(item_full):
+                raise FileNotFoundError(f"Item not found: {name}")
+            items.append(item_full)
+        return items
+
+    @staticmethod
+    def _iter_zip_members(base_dir: str, items: List[str]) -> Iterator[Tuple[str, str]]:
+        """Yield (full_path, arcname) for every file under the given items"""
+        for item_full in items:
+            if os.path.isdir(item_full):
+                # Add directory recursively
+                for dirpath, dirnames, filenames in os.walk(item_full):
+                    for filename in filenames:
+                        filepath = os.path.join(dirpath, filename)
+                        yield filepath, os.path.relpath(filepath, base_dir)
             else:
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+                yield item_full, os.path.relpath(item_full, base_dir)
 
-            if not virtual_host:
-                raise ValueError("Domain not found or access denied")
+    @staticmethod
+    def _archive_download_name(zip_name: Optional[str]) -> str:
+        archive_name = secure_filename(zip_name or '') or 'archive.zip'
+        if not archive_name.lower().endswith('.zip'):
+            archive_name += '.zip'
+        return archive_name
+
+    def _write_archive(self, base_dir: str, items: List[str], archive_name: Optional[str],
+                       archive_format: str, store_compressed: bool, progress=None) -> str:
+        """Write items to an archive in base_dir, compressing on the archiver's threads, and return its path"""
+        extension = ARCHIVE_FORMATS.get(archive_format)
+        if not extension:
+            raise ValueError(f"Unsupported archive format: {archive_format}")
+        archive_name = archive_name or 'archive' + extension
+        if not archive_name.lower().endswith(extension):
+            archive_name += extension
+        archive_path = os.path.join(base_dir, archive_name)
 
-            home_dir = f"/home/{virtual_host.linux_username}"
-            base_path = sanitize_path(base_path) if base_path else ''
-            base_full_path = os.path.join(home_dir, base_path)
+        if progress:
+            progress.start_phase('zip', *self._measure_items(items, base_dir))
+
+        archiver = get_archiver()
+        if archive_format != 'zip':
+            archiver.write_tar(archive_path, base_dir, items, compression=archive_format.split('.')[-1],
+                               progress=progress)
+        elif archiver.workers > 1:
+            archiver.write_zip(archive_path, (
+                (filepath, arcname, self._zip_compress_type(arcname, store_compressed))
+                for filepath, arcname in self._iter_zip_members(base_dir, items)
+            ), progress=progress)
+        else:
+            try:
+                with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                    for filepath, arcname in self._iter_zip_members(base_dir, items):
+                        if progress:
+                            progress.check_cancelled()
+                        zf.write(filepath, arcname, compress_type=self._zip_compress_type(arcname, store_compressed))
+                        if progress:
+                            progress.advance(1, zf.getinfo(arcname).file_size)
+            except JobCancelled:
+                os.remove(archive_path)
+                raise
+        return archive_path
 
-            # Security check
-            if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
-                real_home = os.path.realpath(home_dir)
-                if not os.path.realpath(base_full_path).startswith(real_home):
-                    raise ValueError("Access denied: Path outside domain directory")
+    def _measure_items(self, paths: List[str], base_dir: Optional[str] = None) -> Tuple[int, int]:
+        """Return (files, bytes) under paths, using the size index for directories"""
+        files = 0
+        total = 0
+        for path in paths:
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    dir_bytes, dir_files = get_size_index(self._size_index_root(path, base_dir)).get_size(path)
+                    files += dir_files
+                    total += dir_bytes
+                else:
+                    total += os.lstat(path).st_size
+                    files += 1
+            except OSError:
+                continue
+        return files, total
+
+    @staticmethod
+    def _copy_tree(source: str, destination: str, progress=None) -> None:
+        """copytree/copy2 that reports per-file progress and stops when the job is cancelled"""
+        def copy_file(src, dst, *, follow_symlinks=True):
+            if progress:
+                progress.check_cancelled()
+            result = shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+            if progress:
+                progress.advance(1, os.path.getsize(dst))
+            return result
 
-            if not os.path.isdir(base_full_path):
-                raise ValueError("Base path must be a directory")
-
-            if not item_names:
-                raise ValueError("No items specified to zip")
-
-            archive_name = zip_name or 'archive.zip'
-            if not archive_name.lower().endswith('.zip'):
-                archive_name += '.zip'
-            archive_path = os.path.join(base_full_path, archive_name)
-
-            with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for name in item_names:
-                    item_rel = sanitize_path(name)
-                    item_full = os.path.join(base_full_path, item_rel)
-                    if not os.path.exists(item_full):
-                        raise FileNotFoundError(f"Item not found: {name}")
-                    if os.path.isdir(item_full):
-                        # Add directory recursively
-                        for dirpath, dirnames, filenames in os.walk(item_full):
-                            for filename in filenames:
-                                filepath = os.path.join(dirpath, filename)
-                                arcname = os.path.relpath(filepath, base_full_path)
-                                zf.write(filepath, arcname)
-                    else:
-                        arcname = os.path.relpath(item_full, base_full_path)
-                        zf.write(item_full, arcname)
+        if os.path.isdir(source):
+            try:
+                shutil.copytree(source, destination, copy_function=copy_file)
+            except JobCancelled:
+                # Don't leave a half-copied tree behind
+                shutil.rmtree(destination, ignore_errors=True)
+                raise
+        else:
+            copy_file(source, destination)
+
+    @staticmethod
+    def _remove_tree(path: str, progress=None) -> None:
+        """Delete a file or directory tree, reporting progress per removed file"""
+        if not os.path.isdir(path) or os.path.islink(path):
+            os.remove(path)
+            return
+        if not progress:
+            shutil.rmtree(path)
+            return
+        for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+            for name in filenames:
+                progress.check_cancelled()
+                filepath = os.path.join(dirpath, name)
+                size = os.lstat(filepath).st_size
+                os.remove(filepath)
+                progress.advance(1, size)
+            for name in dirnames:
+                subdir = os.path.join(dirpath, name)
+                # os.walk lists symlinks to directories without descending into them
+                if os.path.islink(subdir):
+                    os.remove(subdir)
+                else:
+                    os.rmdir(subdir)
+        os.rmdir(path)
+
+    @staticmethod
+    def _chown_tree(path: str, uid: int, gid: int, progress=None) -> None:
+        """Recursively chown path (file or directory tree) to uid:gid"""
+        if not os.path.isdir(path):
+            os.chown(path, uid, gid)
+            return
+        if progress:
+            progress.start_phase('chown')
+        for dirpath, dirnames, filenames in os.walk(path):
+            os.chown(dirpath, uid, gid)
+            for name in filenames:
+                os.chown(os.path.join(dirpath, name), uid, gid)
+            if progress:
+                progress.advance(len(filenames))
+                progress.check_cancelled()
+
+    def _stream_zip(self, base_dir: str, items: List[str], store_compressed: bool) -> Iterator[bytes]:
+        """Generate a zip archive chunk by chunk without a temporary file.
+
+        The sink is not seekable, so zipfile writes a data descriptor after each
+        member instead of patching local headers; memory use stays at about one
+        read chunk plus the central directory entries.
+        """
+        buffer = _ZipStreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for filepath, arcname in self._iter_zip_members(base_dir, items):
+                try:
+                    zinfo = zipfile.ZipInfo.from_file(filepath, arcname)
+                    src = open(filepath, 'rb')
+                except OSError as e:
+                    # Files can disappear or be unreadable mid-stream; the response is already under way
+                    print(f"Warning: skipping {filepath} in zip stream: {e}")
+                    continue
+                zinfo.compress_type = self._zip_compress_type(arcname, store_compressed)
+                with src, zf.open(zinfo, 'w', force_zip64=zinfo.file_size > zipfile.ZIP64_LIMIT) as dst:
+                    while True:
+                        chunk = src.read(ZIP_STREAM_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                data = buffer.drain()
+                if data:
+                    yield data
+        # Closing the archive writes the central directory
+        data = buffer.drain()
+        if data:
+            yield data
+
+    def stream_domain_zip(self, domain: str, base_path: str, item_names: List[str], zip_name: Optional[str],
+                          user_id: int, store_compressed: bool = True) -> Tuple[str, Iterator[bytes]]:
+        """Validate items in a domain directory and return (archive name, zip byte stream)"""
+        try:
+            virtual_host, home_dir, base_full_path = self._resolve_domain_zip_base(domain, base_path, user_id)
+            items = self._resolve_zip_items(base_full_path, item_names)
+        except (ValueError, FileNotFoundError):
+            # Bad items or access denied: the route answers 400
+            raise
+        except Exception as e:
+            raise Exception(f"Error creating zip: {str(e)}")
+        return self._archive_download_name(zip_name), self._stream_zip(base_full_path, items, store_compressed)
+
+    def zip_domain_items(self, domain: str, base_path: str, item_names: List[str], zip_name: Optional[str], user_id: int,
+                         store_compressed: bool = True, archive_format: str = 'zip', progress=None) -> Dict:
+        """Create a zip archive from one or more items in a domain directory"""
+        try:
+            virtual_host, home_dir, base_full_path = self._resolve_domain_zip_base(domain, base_path, user_id)
+
+            items = self._resolve_zip_items(base_full_path, item_names)
+
+            archive_path = self._write_archive(base_full_path, items, zip_name, archive_format, store_compressed,
+                                               progress=progress)
+            invalidate_size_index(archive_path)
 
             # Ensure ownership of the created archive
             try:
                 if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
+                    user_info = id_name_cache.getpwnam(virtual_host.linux_username)
                     os.chown(archive_path, user_info.pw_uid, user_info.pw_gid)
             except Exception as e:
                 print(f"Warning: failed to chown archive {archive_path}: {e}")
@@ -570,28 +1043,16 @@ class FileService:
                 'size': stat_info.st_size,
                 'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error creating zip: {str(e)}")
 
-    def unzip_domain_item(self, domain: str, archive_path: str, destination: Optional[str], user_id: int) -> Dict:
+    def unzip_domain_item(self, domain: str, archive_path: str, destination: Optional[str], user_id: int,
+                          progress=None) -> Dict:
         """Extract a zip archive within a domain directory"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
 
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -617,31 +1078,26 @@ class FileService:
             if not archive_full.lower().endswith('.zip'):
                 raise ValueError("Only .zip archives are supported")
 
-            os.makedirs(dest_full, exist_ok=True)
-            with zipfile.ZipFile(archive_full, 'r') as zf:
-                # Prevent Zip Slip by validating paths
-                for member in zf.infolist():
-                    member_path = os.path.normpath(os.path.join(dest_full, member.filename))
-                    if not member_path.startswith(os.path.realpath(dest_full)):
-                        raise Exception("Unsafe path detected in archive")
-                zf.extractall(dest_full)
+            # New files and directories are created with the domain user's ownership directly
+            uid = gid = None
+            if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
+                user_info = id_name_cache.getpwnam(virtual_host.linux_username)
+                uid, gid = user_info.pw_uid, user_info.pw_gid
 
-            # Ensure ownership of extracted files
+            # Validates paths (Zip Slip) and zip bomb limits before anything is written
             try:
-                if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
-                    for dirpath, dirnames, filenames in os.walk(dest_full):
-                        os.chown(dirpath, user_info.pw_uid, user_info.pw_gid)
-                        for name in filenames:
-                            os.chown(os.path.join(dirpath, name), user_info.pw_uid, user_info.pw_gid)
-            except Exception as e:
-                print(f"Warning: failed to chown extracted files in {dest_full}: {e}")
+                extracted = get_zip_extractor().extract(archive_full, dest_full, uid=uid, gid=gid, progress=progress)
+            finally:
+                invalidate_size_index(dest_full)
 
             stat_info = os.stat(dest_full)
             return {
                 'destination': dest_full,
+                'filesExtracted': extracted['files'],
                 'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error extracting zip: {str(e)}")
 
@@ -665,15 +1121,8 @@ class FileService:
         
         # Get owner and group names (Unix only)
         if UNIX_MODULES_AVAILABLE and pwd and grp:
-            try:
-                owner_name = pwd.getpwuid(stat_info.st_uid).pw_name
-            except KeyError:
-                owner_name = str(stat_info.st_uid)
-            
-            try:
-                group_name = grp.getgrgid(stat_info.st_gid).gr_name
-            except KeyError:
-                group_name = str(stat_info.st_gid)
+            owner_name = id_name_cache.uid_to_name(stat_info.st_uid)
+            group_name = id_name_cache.gid_to_name(stat_info.st_gid)
         else:
             # Windows fallback
             owner_name = 'N/A'
@@ -735,6 +1184,7 @@ class FileService:
         
         with open(full_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        invalidate_size_index(full_path)
         
         stat_info = os.stat(full_path)
         return {
@@ -758,11 +1208,12 @@ class FileService:
         
         file_path = os.path.join(upload_dir, filename)
         file.save(file_path)
+        invalidate_size_index(file_path)
 
         # Adjust ownership to target user if specified and running as root
         try:
             if owner_username and UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                user_info = pwd.getpwnam(owner_username)
+                user_info = id_name_cache.getpwnam(owner_username)
                 os.chown(file_path, user_info.pw_uid, user_info.pw_gid)
         except Exception as e:
             # Non-fatal: log and continue
@@ -778,9 +1229,10 @@ class FileService:
 
     def _get_file_permissions(self, path: str) -> str:
         """Get file permissions in octal format (e.g., 755, 644)"""
-        st = os.stat(path)
-        mode = st.st_mode
-        
+        return self._permissions_from_mode(os.stat(path).st_mode)
+
+    def _permissions_from_mode(self, mode: int) -> str:
+        """Format st_mode permission bits in octal format (e.g., 755, 644)"""
         # Extract the permission bits (last 3 octal digits)
         # Use format to convert to octal and take last 3 digits
         octal_perms = format(stat.S_IMODE(mode), 'o')
@@ -788,6 +1240,16 @@ class FileService:
         # Ensure it's always 3 digits by padding with zeros if needed
         return octal_perms.zfill(3)
 
+    def list_directory_page(self, path: str, page_size: int, cursor: Optional[str] = None,
+                            sort_by: str = 'name', order: str = 'asc', prefix: Optional[str] = None) -> Dict:
+        """Paginated, sorted listing of a directory under the system root (hidden entries skipped)"""
+        path = '' if not path or path == '/' else sanitize_path(path)
+        if not is_safe_path(self.root_dir, path):
+            raise ValueError(f"Invalid path: {path}")
+        real_full_path = os.path.realpath(os.path.join(self.root_dir, path))
+        return self._list_directory_page(real_full_path, self.root_dir, page_size, cursor=cursor, sort_by=sort_by,
+                                         order=order, prefix=prefix, skip_hidden=True)
+
     def list_directory(self, path: str) -> List[Dict]:
         """List contents of a directory with improved file access"""
         try:
@@ -820,18 +1282,11 @@ class FileService:
                         if entry.name.startswith('.'):
                             continue
                         
-                        # Get basic file info using entry object (more efficient)
+                        # Get basic file info from the single cached entry.stat() call
                         name = entry.name
                         item_path = entry.path
-                        is_dir = entry.is_dir()
-                        is_file = entry.is_file()
-                        
-                        try:
-                            stat_info = entry.stat()
-                        except (OSError, PermissionError) as e:
-                            print(f"Error getting stat for {item_path}: {e}")
-                            # Fallback to os.stat if entry.stat() fails
-                            stat_info = os.stat(item_path)
+                        stat_info = entry.stat()
+                        is_file = stat.S_ISREG(stat_info.st_mode)
                         
                         # Calculate relative path from root directory
                         rel_path = os.path.relpath(item_path, self.root_dir)
@@ -843,15 +1298,8 @@ class FileService:
                         
                         # Get owner and group names for list_directory method
                         if UNIX_MODULES_AVAILABLE and pwd and grp:
-                            try:
-                                owner_name = pwd.getpwuid(stat_info.st_uid).pw_name
-                            except KeyError:
-                                owner_name = str(stat_info.st_uid)
-                            
-                            try:
-                                group_name = grp.getgrgid(stat_info.st_gid).gr_name
-                            except KeyError:
-                                group_name = str(stat_info.st_gid)
+                            owner_name = id_name_cache.uid_to_name(stat_info.st_uid)
+                            group_name = id_name_cache.gid_to_name(stat_info.st_gid)
                         else:
                             # Windows fallback
                             owner_name = 'N/A'
@@ -863,7 +1311,7 @@ class FileService:
                             'size': stat_info.st_size if is_file else None,
                             'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
                             'path': rel_path,
-                            'permissions': self._get_file_permissions(item_path),
+                            'permissions': self._permissions_from_mode(stat_info.st_mode),
                             'isHidden': name.startswith('.'),
                             'owner': owner_name,
                             'group': group_name,
@@ -950,6 +1398,7 @@ class FileService:
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
         with open(full_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        invalidate_size_index(full_path)
 
         stat_info = os.stat(full_path)
         return {
@@ -968,6 +1417,7 @@ class FileService:
             raise ValueError("Invalid path")
 
         os.makedirs(full_path, exist_ok=True)
+        invalidate_size_index(full_path)
         stat_info = os.stat(full_path)
         return {
             'name': os.path.basename(path),
@@ -976,7 +1426,7 @@ class FileService:
             'permissions': self._get_file_permissions(full_path)
         }
 
-    def delete_item(self, path: str) -> bool:
+    def delete_item(self, path: str, progress=None) -> bool:
         """Delete a file or directory"""
         path = sanitize_path(path)
         full_path = os.path.join(self.root_dir, path)
@@ -987,12 +1437,43 @@ class FileService:
         if not os.path.exists(full_path):
             raise FileNotFoundError(f"Path {path} not found")
 
-        if os.path.isdir(full_path):
-            shutil.rmtree(full_path)
-        else:
-            os.remove(full_path)
+        if progress:
+            progress.start_phase('delete', *self._measure_items([full_path]))
+        try:
+            self._remove_tree(full_path, progress)
+        finally:
+            invalidate_size_index(full_path)
         return True
 
+    def copy_item(self, source_path: str, dest_path: str, progress=None) -> Dict:
+        """Copy a file or directory under the system root"""
+        source_path = sanitize_path(source_path)
+        dest_path = sanitize_path(dest_path)
+        source_full_path = os.path.join(self.root_dir, source_path)
+        dest_full_path = os.path.join(self.root_dir, dest_path)
+
+        if not is_safe_path(self.root_dir, source_path) or not is_safe_path(self.root_dir, dest_path):
+            raise ValueError("Invalid path")
+        if not os.path.exists(source_full_path):
+            raise FileNotFoundError(f"Source not found: {source_path}")
+        if os.path.exists(dest_full_path):
+            raise ValueError(f"Destination already exists: {dest_path}")
+
+        os.makedirs(os.path.dirname(dest_full_path), exist_ok=True)
+        if progress:
+            progress.start_phase('copy', *self._measure_items([source_full_path]))
+        try:
+            self._copy_tree(source_full_path, dest_full_path, progress)
+        finally:
+            invalidate_size_index(dest_full_path)
+
+        stat_info = os.stat(dest_full_path)
+        return {
+            'name': os.path.basename(dest_full_path),
+            'size': stat_info.st_size if not os.path.isdir(dest_full_path) else None,
+            'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
+        }
+
     def rename_item(self, old_path: str, new_path: str) -> Dict:
         """Rename/move a file or directory"""
         old_path = sanitize_path(old_path)
@@ -1008,6 +1489,8 @@ class FileService:
 
         os.makedirs(os.path.dirname(full_new_path), exist_ok=True)
         shutil.move(full_old_path, full_new_path)
+        invalidate_size_index(full_old_path)
+        invalidate_size_index(full_new_path)
 
         stat_info = os.stat(full_new_path)
         return {
@@ -1018,8 +1501,7 @@ class FileService:
             'permissions': self._get_file_permissions(full_new_path)
         }
 
-    def zip_items(self, path: str, item_names: List[str], zip_name: Optional[str] = None) -> Dict:
-        """Create a zip archive from one or more items under the system root"""
+    def _resolve_zip_base(self, path: str) -> str:
         path = sanitize_path(path) if path else ''
         base_dir = os.path.join(self.root_dir, path)
 
@@ -1027,29 +1509,24 @@ class FileService:
             raise ValueError("Invalid path")
         if not os.path.isdir(base_dir):
             raise ValueError("Base path must be a directory")
-        if not item_names:
-            raise ValueError("No items specified to zip")
+        return base_dir
 
-        archive_name = zip_name or 'archive.zip'
-        if not archive_name.lower().endswith('.zip'):
-            archive_name += '.zip'
-        archive_path = os.path.join(base_dir, archive_name)
+    def stream_zip(self, path: str, item_names: List[str], zip_name: Optional[str] = None,
+                   store_compressed: bool = True) -> Tuple[str, Iterator[bytes]]:
+        """Validate items under the system root and return (archive name, zip byte stream)"""
+        base_dir = self._resolve_zip_base(path)
+        items = self._resolve_zip_items(base_dir, item_names)
+        return self._archive_download_name(zip_name), self._stream_zip(base_dir, items, store_compressed)
 
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for name in item_names:
-                item_rel = sanitize_path(name)
-                item_full = os.path.join(base_dir, item_rel)
-                if not os.path.exists(item_full):
-                    raise FileNotFoundError(f"Item not found: {name}")
-                if os.path.isdir(item_full):
-                    for dirpath, dirnames, filenames in os.walk(item_full):
-                        for filename in filenames:
-                            filepath = os.path.join(dirpath, filename)
-                            arcname = os.path.relpath(filepath, base_dir)
-                            zf.write(filepath, arcname)
-                else:
-                    arcname = os.path.relpath(item_full, base_dir)
-                    zf.write(item_full, arcname)
+    def zip_items(self, path: str, item_names: List[str], zip_name: Optional[str] = None,
+                  store_compressed: bool = True, archive_format: str = 'zip', progress=None) -> Dict:
+        """Create a zip archive from one or more items under the system root"""
+        base_dir = self._resolve_zip_base(path)
+        items = self._resolve_zip_items(base_dir, item_names)
+
+        archive_path = self._write_archive(base_dir, items, zip_name, archive_format, store_compressed,
+                                           progress=progress)
+        invalidate_size_index(archive_path)
 
         stat_info = os.stat(archive_path)
         return {
@@ -1059,7 +1536,7 @@ class FileService:
             'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
         }
 
-    def unzip_item(self, archive_path: str, destination: Optional[str] = None) -> Dict:
+    def unzip_item(self, archive_path: str, destination: Optional[str] = None, progress=None) -> Dict:
         """Extract a zip archive under the system root"""
         archive_path = sanitize_path(archive_path)
         archive_full = os.path.join(self.root_dir, archive_path)
@@ -1079,17 +1556,15 @@ class FileService:
         else:
             dest_full = os.path.dirname(archive_full)
 
-        os.makedirs(dest_full, exist_ok=True)
-        with zipfile.ZipFile(archive_full, 'r') as zf:
-            for member in zf.infolist():
-                member_path = os.path.normpath(os.path.join(dest_full, member.filename))
-                if not member_path.startswith(os.path.realpath(dest_full)):
-                    raise Exception("Unsafe path detected in archive")
-            zf.extractall(dest_full)
+        try:
+            extracted = get_zip_extractor().extract(archive_full, dest_full, progress=progress)
+        finally:
+            invalidate_size_index(dest_full)
 
         stat_info = os.stat(dest_full)
         return {
             'destination': os.path.relpath(dest_full, self.root_dir).replace(os.sep, '/'),
+            'filesExtracted': extracted['files'],
             'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
         }
 
@@ -1104,6 +1579,7 @@ class FileService:
         # Create an empty file
         with open(full_path, 'w') as f:
             pass
+        invalidate_size_index(full_path)
             
         stat_info = os.stat(full_path)
         return {
@@ -1128,28 +1604,7 @@ class FileService:
     def create_domain_file(self, domain: str, path: str, user_id: int) -> Dict:
         """Create a new empty file for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -1171,7 +1626,7 @@ class FileService:
             # Ensure the file ownership is set to the domain user when running as root
             try:
                 if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
+                    user_info = id_name_cache.getpwnam(virtual_host.linux_username)
                     os.chown(full_path, user_info.pw_uid, user_info.pw_gid)
             except Exception as e:
                 print(f"Warning: failed to chown created file {full_path}: {e}")
@@ -1184,28 +1639,7 @@ class FileService:
     def create_domain_directory(self, domain: str, path: str, user_id: int) -> Dict:
         """Create directory for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -1226,10 +1660,11 @@ class FileService:
                 raise ValueError(f"Directory already exists: {path}")
             
             os.makedirs(full_path, exist_ok=True)
+            invalidate_size_index(full_path)
             # Set ownership to the domain's linux user if running as root
             try:
                 if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
+                    user_info = id_name_cache.getpwnam(virtual_host.linux_username)
                     os.chown(full_path, user_info.pw_uid, user_info.pw_gid)
             except Exception as e:
                 print(f"Warning: failed to chown created directory {full_path}: {e}")
@@ -1245,31 +1680,10 @@ class FileService:
         except Exception as e:
             raise Exception(f"Error creating domain directory: {str(e)}")
 
-    def delete_domain_item(self, domain: str, path: str, user_id: int) -> bool:
+    def delete_domain_item(self, domain: str, path: str, user_id: int, progress=None) -> bool:
         """Delete file or directory for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -1289,36 +1703,24 @@ class FileService:
             if not os.path.exists(full_path):
                 raise FileNotFoundError(f"Item not found: {path}")
             
-            if os.path.isdir(full_path):
-                shutil.rmtree(full_path)
-            else:
-                os.remove(full_path)
+            if progress:
+                progress.start_phase('delete', *self._measure_items([full_path], home_dir))
+            try:
+                self._remove_tree(full_path, progress)
+            finally:
+                invalidate_size_index(full_path)
             
             return True
             
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error deleting domain item: {str(e)}")
 
-    def copy_domain_item(self, domain: str, source_path: str, dest_path: str, user_id: int) -> Dict:
+    def copy_domain_item(self, domain: str, source_path: str, dest_path: str, user_id: int, progress=None) -> Dict:
         """Copy a file or directory within a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
 
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -1343,22 +1745,20 @@ class FileService:
 
             os.makedirs(os.path.dirname(dest_full_path), exist_ok=True)
 
-            if os.path.isdir(source_full_path):
-                shutil.copytree(source_full_path, dest_full_path)
-            else:
-                shutil.copy2(source_full_path, dest_full_path)
+            if progress:
+                progress.start_phase('copy', *self._measure_items([source_full_path], home_dir))
+            try:
+                self._copy_tree(source_full_path, dest_full_path, progress)
+            finally:
+                invalidate_size_index(dest_full_path)
 
             # Ensure ownership to domain user when running as root
             try:
                 if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
-                    if os.path.isdir(dest_full_path):
-                        for dirpath, dirnames, filenames in os.walk(dest_full_path):
-                            os.chown(dirpath, user_info.pw_uid, user_info.pw_gid)
-                            for name in filenames:
-                                os.chown(os.path.join(dirpath, name), user_info.pw_uid, user_info.pw_gid)
-                    else:
-                        os.chown(dest_full_path, user_info.pw_uid, user_info.pw_gid)
+                    user_info = id_name_cache.getpwnam(virtual_host.linux_username)
+                    self._chown_tree(dest_full_path, user_info.pw_uid, user_info.pw_gid, progress)
+            except JobCancelled:
+                raise
             except Exception as e:
                 print(f"Warning: failed to chown copied item {dest_full_path}: {e}")
 
@@ -1368,34 +1768,15 @@ class FileService:
                 'size': stat_info.st_size if not os.path.isdir(dest_full_path) else None,
                 'modifiedAt': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error copying domain item: {str(e)}")
 
     def rename_domain_item(self, domain: str, old_path: str, new_path: str, user_id: int) -> Dict:
         """Rename file or directory for a specific domain"""
         try:
-            # Import here to avoid circular import
-            from models.user import User
-            from utils.permissions import can_access_virtual_host
-            
-            current_user = User.query.get(user_id)
-            if not current_user:
-                raise ValueError("User not found")
-            
-            # Admin/root users can access any domain
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
-                virtual_host = VirtualHost.query.filter_by(domain=domain).first()
-            else:
-                # First try to find virtual host owned by user
-                virtual_host = VirtualHost.query.filter_by(domain=domain, user_id=user_id).first()
-                
-                # If not found, try to find virtual host with matching linux_username
-                if not virtual_host:
-                    virtual_host = VirtualHost.query.filter_by(domain=domain, linux_username=current_user.username).first()
-                    
-                    # Check if user can access this virtual host
-                    if virtual_host and not can_access_virtual_host(current_user, virtual_host):
-                        virtual_host = None
+            current_user, virtual_host = self._resolve_domain(domain, user_id)
                         
             if not virtual_host:
                 raise ValueError("Domain not found or access denied")
@@ -1423,11 +1804,13 @@ class FileService:
                 raise ValueError(f"Destination already exists: {new_path}")
             
             os.rename(old_full_path, new_full_path)
+            invalidate_size_index(old_full_path)
+            invalidate_size_index(new_full_path)
             
             # Ensure ownership for moved target remains with domain user (best effort)
             try:
                 if UNIX_MODULES_AVAILABLE and pwd and grp and os.geteuid() == 0:
-                    user_info = pwd.getpwnam(virtual_host.linux_username)
+                    user_info = id_name_cache.getpwnam(virtual_host.linux_username)
                     if os.path.isdir(new_full_path):
                         for dirpath, dirnames, filenames in os.walk(new_full_path):
                             os.chown(dirpath, user_info.pw_uid, user_info.pw_gid)
@@ -4,15 +4,15 @@ import secrets
 import string
 from typing import Optional, Tuple
 import platform
+from utils.id_name_cache import id_name_cache
 
 # Unix/Linux specific imports
 try:
     import pwd
-    import grp
     UNIX_MODULES_AVAILABLE = True
 except ImportError:
     UNIX_MODULES_AVAILABLE = False
-    print("Warning: Unix modules (pwd, grp) not available. Running in Windows mode.")
+    print("Warning: Unix modules (pwd) not available. Running in Windows mode.")
 
 class LinuxUserService:
     def __init__(self):
@@ -35,6 +35,13 @@ class LinuxUserService:
             password: รหัสผ่าน (ถ้าไม่ระบุจะสร้างอัตโนมัติ)
         Returns: (success, message, password)
         """
+        try:
+            return self._create_user(username, domain, password)
+        finally:
+            # passwd/group database changed (or may have): drop cached NSS lookups
+            id_name_cache.invalidate()
+
+    def _create_user(self, username: str, domain: str, password: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
         # ตรวจสอบว่าอยู่บน Unix/Linux system หรือไม่
         if not UNIX_MODULES_AVAILABLE:
             # Development mode - simulate user creation
@@ -106,6 +113,12 @@ class LinuxUserService:
         ลบ Linux user
         Returns: (success, message)
         """
+        try:
+            return self._delete_user(username)
+        finally:
+            id_name_cache.invalidate()
+
+    def _delete_user(self, username: str) -> Tuple[bool, str]:
         # ตรวจสอบว่าอยู่บน Unix/Linux system หรือไม่
         if not UNIX_MODULES_AVAILABLE:
             print(f"Development Mode: Simulating user deletion for {username}")
@@ -146,7 +159,7 @@ class LinuxUserService:
             return None
         
         try:
-            user_info = pwd.getpwnam(username)
+            user_info = id_name_cache.getpwnam(username)
             return user_info.pw_dir
         except KeyError:
             return None
@@ -159,8 +172,8 @@ class LinuxUserService:
         
         try:
             # ดึง UID และ GID
-            user_info = pwd.getpwnam(username)
-            www_data_info = grp.getgrnam(self.web_group)
+            user_info = id_name_cache.getpwnam(username)
+            www_data_info = id_name_cache.getgrnam(self.web_group)
             
             uid = user_info.pw_uid
             gid = user_info.pw_gid
@@ -293,8 +306,8 @@ php_flag log_errors On
             
             # ตั้งสิทธิ์ไฟล์
             if UNIX_MODULES_AVAILABLE:
-                user_info = pwd.getpwnam(username)
-                www_data_info = grp.getgrnam(self.web_group)
+                user_info = id_name_cache.getpwnam(username)
+                www_data_info = id_name_cache.getgrnam(self.web_group)
                 
                 for filename in ['index.html', '.htaccess']:
                     filepath = os.path.join(public_html_dir, filename)
@@ -0,0 +1,149 @@
+import os
+import re
+import threading
+from time import time
+from typing import Dict, Optional, Tuple
+
+# Maildir++ / Dovecot put the message size in the file name: 1700000000.M1P2.host,S=4213,W=4300:2,S
+_SIZE_SUFFIX_RE = re.compile(r',S=(\d+)')
+MESSAGE_DIRS = ('cur', 'new')
+# Directory mtimes this recent may still change within the same timestamp tick; don't cache them yet
+RACY_MTIME_SECONDS = 2.0
+
+
+class MaildirSizeEngine:
+    """Mailbox usage from Maildir metadata, without du.
+
+    If the maildir has a Dovecot/Maildir++ ``maildirsize`` file, its running
+    totals are used as-is. Otherwise cur/ and new/ of the inbox and every
+    .Folder are scanned with scandir, taking each message size from the
+    ``,S=<size>`` file name suffix and stat()ing only files without one.
+    Scan results are cached per directory and reused while the directory's
+    mtime is unchanged (delivery, expunge and flag changes all rename or add
+    entries, which bumps it), so a repeat measurement costs one stat per
+    folder.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._dirs: Dict[str, Tuple[int, int, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve_maildir(path: str) -> str:
+        """Return the maildir root for a mailbox path (the path itself, or its Maildir/ subdirectory)"""
+        if not os.path.isdir(os.path.join(path, 'cur')) and os.path.isdir(os.path.join(path, 'Maildir')):
+            return os.path.join(path, 'Maildir')
+        return path
+
+    def measure(self, path: str) -> Optional[Dict]:
+        """Return {'bytes', 'messages', 'source'} for the maildir at path, or None if it does not exist"""
+        maildir = self.resolve_maildir(path)
+        if not os.path.isdir(maildir):
+            return None
+
+        usage = self._read_maildirsize(maildir)
+        if usage is not None:
+            return {'bytes': usage[0], 'messages': usage[1], 'source': 'maildirsize'}
+
+        total_bytes = total_messages = 0
+        for folder in self._folders(maildir):
+            for sub in MESSAGE_DIRS:
+                size, count = self._dir_usage(os.path.join(folder, sub))
+                total_bytes += size
+                total_messages += count
+        return {'bytes': total_bytes, 'messages': total_messages, 'source': 'scan'}
+
+    @staticmethod
+    def _read_maildirsize(maildir: str) -> Optional[Tuple[int, int]]:
+        """Sum a maildirsize file: a quota definition line, then '<bytes> <messages>' deltas"""
+        try:
+            with open(os.path.join(maildir, 'maildirsize'), 'r') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        total_bytes = total_messages = 0
+        for line in lines[1:]:
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            try:
+                total_bytes += int(parts[0])
+                total_messages += int(parts[1])
+            except ValueError:
+                return None
+        # A negative total means the file is being rewritten or is corrupt; scan instead
+        if total_bytes < 0 or total_messages < 0:
+            return None
+        return total_bytes, total_messages
+
+    @staticmethod
+    def _folders(maildir: str):
+        yield maildir
+        try:
+            with os.scandir(maildir) as entries:
+                for entry in entries:
+                    # Maildir++ subfolders: .Sent, .Trash, .Archive.2024, ...
+                    if entry.name.startswith('.') and entry.name not in ('.', '..') and entry.is_dir(follow_symlinks=False):
+                        yield entry.path
+        except OSError:
+            return
+
+    def _dir_usage(self, directory: str) -> Tuple[int, int]:
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return 0, 0
+        with self._lock:
+            cached = self._dirs.get(directory)
+        if cached and cached[0] == mtime_ns:
+            return cached[1], cached[2]
+
+        size = count = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    match = _SIZE_SUFFIX_RE.search(entry.name)
+                    if match:
+                        size += int(match.group(1))
+                        count += 1
+                        continue
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            size += entry.stat(follow_symlinks=False).st_size
+                            count += 1
+                    except OSError:
+                        # Expunged between readdir and stat
+                        continue
+        except OSError:
+            return 0, 0
+
+        if time() - mtime_ns / 1e9 > RACY_MTIME_SECONDS:
+            with self._lock:
+                if len(self._dirs) >= self.max_entries:
+                    self._dirs.clear()
+                self._dirs[directory] = (mtime_ns, size, count)
+        return size, count
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Forget cached scans under path (or everything)"""
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                return
+            prefix = path.rstrip(os.sep) + os.sep
+            for directory in [d for d in self._dirs if d.startswith(prefix)]:
+                del self._dirs[directory]
+
+
+_engine: Optional[MaildirSizeEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_maildir_size_engine() -> MaildirSizeEngine:
+    """Return the process-wide maildir size engine."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MaildirSizeEngine()
+        return _engine
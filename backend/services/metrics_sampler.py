@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import deque
+from time import time
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+
+class MetricsSampler:
+    """Background thread sampling CPU, memory, disk, network and load.
+
+    Endpoints read the latest sample (or the rolling window) instead of
+    calling psutil themselves, so no request ever blocks on
+    ``cpu_percent(interval=1)``: CPU usage is measured between consecutive
+    samples. The window holds ``window_seconds / interval`` samples.
+    """
+
+    def __init__(self, interval: float = 2.0, window_seconds: float = 600.0, disk_path: str = '/'):
+        self.interval = max(0.5, interval)
+        self.disk_path = disk_path
+        self._samples = deque(maxlen=max(1, int(window_seconds / self.interval)))
+        self._ready = threading.Event()
+        # Notified on every new sample; streaming clients wait on it instead of polling
+        self._new_sample = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self) -> None:
+        """Start the sampling thread in this process (again after a fork, where threads don't survive)"""
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._samples.clear()
+            self._ready.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        previous = None
+        # Prime cpu_percent so the first sample covers a short real interval
+        psutil.cpu_percent(interval=None)
+        wait = 0.2
+        while not self._stop.wait(wait):
+            try:
+                sample = self._sample(previous)
+                with self._new_sample:
+                    self._samples.append(sample)
+                    self._new_sample.notify_all()
+                previous = sample
+                self._ready.set()
+            except Exception as e:
+                print(f"Error sampling system metrics: {e}")
+            wait = self.interval
+
+    def _sample(self, previous: Optional[Dict]) -> Dict:
+        now = time()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        try:
+            net = psutil.net_io_counters()
+            network = {
+                'bytes_sent': net.bytes_sent,
+                'bytes_recv': net.bytes_recv,
+                'packets_sent': net.packets_sent,
+                'packets_recv': net.packets_recv,
+                'send_rate': None,
+                'recv_rate': None
+            }
+            if previous and previous['network']:
+                elapsed = now - previous['timestamp']
+                if elapsed > 0:
+                    network['send_rate'] = round(max(0, net.bytes_sent - previous['network']['bytes_sent']) / elapsed, 1)
+                    network['recv_rate'] = round(max(0, net.bytes_recv - previous['network']['bytes_recv']) / elapsed, 1)
+        except Exception:
+            network = None
+        try:
+            load_average = list(os.getloadavg())
+        except (AttributeError, OSError):
+            load_average = None
+
+        return {
+            'timestamp': now,
+            'cpu': {
+                'percent': psutil.cpu_percent(interval=None),
+                'count': psutil.cpu_count()
+            },
+            'memory': {
+                'total': memory.total,
+                'available': memory.available,
+                'used': memory.used,
+                'free': memory.free,
+                'percent': memory.percent
+            },
+            'disk': {
+                'total': disk.total,
+                'used': disk.used,
+                'free': disk.free,
+                'percent': disk.percent
+            },
+            'network': network,
+            'load_average': load_average,
+            'process_count': len(psutil.pids()),
+            'boot_time': psutil.boot_time()
+        }
+
+    def latest(self, timeout: float = 2.0) -> Optional[Dict]:
+        """Most recent sample; waits up to timeout for the first one after startup"""
+        self.ensure_running()
+        if not self._samples:
+            self._ready.wait(timeout)
+        try:
+            return self._samples[-1]
+        except IndexError:
+            return None
+
+    def wait_for_sample(self, after: float, timeout: float) -> Optional[Dict]:
+        """Block until there is a sample newer than the `after` timestamp; None on timeout"""
+        self.ensure_running()
+        with self._new_sample:
+            self._new_sample.wait_for(lambda: self._samples and self._samples[-1]['timestamp'] > after, timeout)
+            if self._samples and self._samples[-1]['timestamp'] > after:
+                return self._samples[-1]
+        return None
+
+    def history(self, seconds: Optional[float] = None) -> List[Dict]:
+        """Samples in the rolling window, oldest first, optionally only the last `seconds`"""
+        self.ensure_running()
+        samples = list(self._samples)
+        if seconds is not None:
+            cutoff = time() - seconds
+            samples = [sample for sample in samples if sample['timestamp'] >= cutoff]
+        return samples
+
+
+_sampler: Optional[MetricsSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_metrics_sampler() -> Optional[MetricsSampler]:
+    """Return the process-wide sampler (METRICS_SAMPLE_INTERVAL, METRICS_WINDOW_SECONDS), or None without psutil."""
+    global _sampler
+    if not PSUTIL_AVAILABLE:
+        return None
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = MetricsSampler(
+                interval=float(os.environ.get('METRICS_SAMPLE_INTERVAL', 2)),
+                window_seconds=float(os.environ.get('METRICS_WINDOW_SECONDS', 600))
+            )
+    _sampler.ensure_running()
+    return _sampler
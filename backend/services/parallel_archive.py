@@ -0,0 +1,288 @@
+import os
+import io
+import gzip
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+# zstd is optional; tar.zst archives need the zstandard package
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+READ_CHUNK_SIZE = 1024 * 1024
+# Small files are grouped so each task is worth the scheduling overhead
+BATCH_BYTES = 4 * 1024 * 1024
+BATCH_FILES = 256
+# Compressed members larger than this go to a spool file instead of being held in memory
+SPILL_BYTES = 8 * 1024 * 1024
+# tar streams are cut into independent gzip members of this size
+TAR_BLOCK_SIZE = 4 * 1024 * 1024
+
+TAR_COMPRESSIONS = ('gz', 'zst')
+
+
+def _compress_member(path: str, arcname: str, compress_type: int, level: int, spool_dir: str) -> Tuple:
+    """Deflate (or just checksum) one file. Runs on the archiver's thread pool.
+
+    Returns (zinfo, data, spool_path): data holds the member bytes when they are
+    small enough, spool_path names a temp file holding them otherwise, and both
+    are None for large stored members, which the archiver copies from the source.
+    """
+    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+    zinfo.compress_type = compress_type
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress_type == zipfile.ZIP_DEFLATED else None
+    keep_stored = compressor is None and zinfo.file_size <= SPILL_BYTES
+
+    crc = 0
+    file_size = 0
+    out = io.BytesIO()
+    spool = None
+    try:
+        with open(path, 'rb') as src:
+            while True:
+                chunk = src.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                if compressor:
+                    out.write(compressor.compress(chunk))
+                elif keep_stored:
+                    out.write(chunk)
+                if compressor and spool is None and out.tell() > SPILL_BYTES:
+                    spool = tempfile.NamedTemporaryFile(dir=spool_dir, delete=False)
+                    spool.write(out.getvalue())
+                    out = spool
+        if compressor:
+            out.write(compressor.flush())
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    if spool is not None:
+        zinfo.compress_size = spool.tell()
+        spool.close()
+        return zinfo, None, spool.name
+    if compressor is None and not keep_stored:
+        zinfo.compress_size = file_size
+        return zinfo, None, None
+    data = out.getvalue()
+    zinfo.compress_size = len(data)
+    return zinfo, data, None
+
+
+def _compress_batch(members: List[Tuple[str, str, int]], level: int, spool_dir: str) -> List[Tuple]:
+    return [_compress_member(path, arcname, compress_type, level, spool_dir)
+            for path, arcname, compress_type in members]
+
+
+def _gzip_block(data: bytes, level: int) -> bytes:
+    # Concatenated gzip members form a valid gzip stream (same idea as pigz)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _ParallelGzipWriter:
+    """Write-only file object that gzips fixed-size blocks on the thread pool, in order."""
+
+    def __init__(self, fileobj, executor: Executor, level: int, max_pending: int):
+        self.fileobj = fileobj
+        self.executor = executor
+        self.level = level
+        self.max_pending = max_pending
+        self._buffer = bytearray()
+        self._pending = deque()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= TAR_BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:TAR_BLOCK_SIZE]))
+            del self._buffer[:TAR_BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self.executor.submit(_gzip_block, block, self.level))
+        while len(self._pending) > self.max_pending:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def abort(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+
+class ParallelArchiver:
+    """Builds zip and tar.gz/tar.zst archives on a pool of compression threads.
+
+    Zip members are compressed independently on a thread pool and appended to
+    the archive in input order as they finish; zipfile then writes the central
+    directory from the collected headers. Output is a regular deflate/stored
+    zip, identical in layout to what ZipFile.write produces. zlib releases the
+    GIL while it deflates, so the threads compress on separate cores.
+    """
+
+    def __init__(self, workers: Optional[int] = None, level: int = 6):
+        self.workers = max(1, workers or default_archive_workers())
+        self.level = level
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='archive')
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _iter_batches(self, members: Iterable[Tuple[str, str, int]]):
+        batch, batch_bytes = [], 0
+        for member in members:
+            try:
+                batch_bytes += os.path.getsize(member[0])
+            except OSError:
+                pass
+            batch.append(member)
+            if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+                yield batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+
+    def write_zip(self, archive_path: str, members: Iterable[Tuple[str, str, int]], progress=None) -> int:
+        """Write (path, arcname, compress_type) members to archive_path; returns the member count.
+
+        progress, if given, gets ``advance(files, bytes)`` per member and
+        ``check_cancelled()`` per batch (see services.file_jobs.JobProgress).
+        """
+        spool_dir = tempfile.mkdtemp(prefix='.zip-parts-', dir=os.path.dirname(archive_path) or '.')
+        pending = deque()
+        count = 0
+        try:
+            with zipfile.ZipFile(archive_path, 'w', allowZip64=True) as zf:
+                for batch in self._iter_batches(members):
+                    pending.append((batch, self.executor.submit(_compress_batch, batch, self.level, spool_dir)))
+                    # Keep a bounded number of batches in flight to cap memory
+                    while len(pending) > self.workers * 2:
+                        count += self._append_batch(zf, *pending.popleft(), progress)
+                while pending:
+                    count += self._append_batch(zf, *pending.popleft(), progress)
+        except BaseException:
+            for _, future in pending:
+                future.cancel()
+            if os.path.exists(archive_path):
+                os.unlink(archive_path)
+            raise
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        return count
+
+    @staticmethod
+    def _append_batch(zf: zipfile.ZipFile, batch: List[Tuple[str, str, int]], future, progress=None) -> int:
+        results = future.result()
+        if progress:
+            progress.check_cancelled()
+        for (path, _, _), (zinfo, data, spool_path) in zip(batch, results):
+            zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+            zinfo.header_offset = zf.fp.tell()
+            zf.fp.write(zinfo.FileHeader(zip64))
+            if data is not None:
+                zf.fp.write(data)
+            else:
+                source = spool_path or path
+                with open(source, 'rb') as src:
+                    copied = ParallelArchiver._copy_exact(src, zf.fp, zinfo.compress_size)
+                if spool_path:
+                    os.unlink(spool_path)
+                if copied != zinfo.compress_size:
+                    raise IOError(f"File changed while archiving: {path}")
+            # Register the member the same way ZipFile.write does, so close() writes the central directory
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+            zf.start_dir = zf.fp.tell()
+            if progress:
+                progress.advance(1, zinfo.file_size)
+        return len(batch)
+
+    @staticmethod
+    def _copy_exact(src, dst, size: int) -> int:
+        copied = 0
+        while copied < size:
+            chunk = src.read(min(READ_CHUNK_SIZE, size - copied))
+            if not chunk:
+                break
+            dst.write(chunk)
+            copied += len(chunk)
+        return copied
+
+    def write_tar(self, archive_path: str, base_dir: str, items: List[str], compression: str = 'gz',
+                  progress=None) -> None:
+        """Write items (paths under base_dir) to a tar.gz or tar.zst archive."""
+        if compression not in TAR_COMPRESSIONS:
+            raise ValueError(f"Unsupported tar compression: {compression}")
+        if compression == 'zst' and not ZSTD_AVAILABLE:
+            raise ValueError("tar.zst archives require the zstandard package")
+
+        def track(tarinfo):
+            progress.check_cancelled()
+            if tarinfo.isfile():
+                progress.advance(1, tarinfo.size)
+            return tarinfo
+
+        writer = None
+        try:
+            with open(archive_path, 'wb') as fh:
+                if compression == 'zst':
+                    # zstd does its own multi-threaded framing
+                    writer = zstandard.ZstdCompressor(level=3, threads=self.workers).stream_writer(fh, closefd=False)
+                else:
+                    writer = _ParallelGzipWriter(fh, self.executor, self.level, self.workers * 2)
+                with tarfile.open(fileobj=writer, mode='w|') as tar:
+                    for item in items:
+                        tar.add(item, arcname=os.path.relpath(item, base_dir), filter=track if progress else None)
+                writer.close()
+        except BaseException:
+            if isinstance(writer, _ParallelGzipWriter):
+                writer.abort()
+            if os.path.exists(archive_path):
+                os.unlink(archive_path)
+            raise
+
+
+_archiver: Optional[ParallelArchiver] = None
+
+
+def default_archive_workers() -> int:
+    """Compression threads per web worker: the cores shared out over WEB_CONCURRENCY web workers, at most 4"""
+    web_workers = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+    return max(1, min(4, (os.cpu_count() or 1) // web_workers))
+
+
+def get_archiver() -> ParallelArchiver:
+    """Return the shared archiver (ARCHIVE_WORKERS threads, default: default_archive_workers())."""
+    global _archiver
+    if _archiver is None:
+        workers = int(os.getenv('ARCHIVE_WORKERS', 0)) or default_archive_workers()
+        _archiver = ParallelArchiver(workers=workers, level=int(os.getenv('ARCHIVE_COMPRESS_LEVEL', 6)))
+    return _archiver
@@ -2,10 +2,17 @@ import os
 import platform
 import subprocess
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from time import monotonic
 from typing import Dict, Optional, Tuple
 from datetime import datetime
-from time import time
 import re
+from utils.id_name_cache import id_name_cache
+from services.quota_snapshots import get_quota_snapshot_store
+from services.quota_report import QuotaReport, run_repquota
+from services.maildir_size import get_maildir_size_engine
+from services.quota_trends import HISTORY_RESOLUTIONS, TREND_METHODS, days_until_full, fit_points, linear_rate
 
 
 class QuotaMonitoringService:
@@ -15,8 +22,11 @@ class QuotaMonitoringService:
         self.is_linux = platform.system() == 'Linux'
         self.quota_path = self._find_executable('quota')
         self.setquota_path = self._find_executable('setquota')
-        self._all_users_cache: Optional[Dict[str, Dict]] = None
-        self._cache_timestamp: float = 0.0
+        self.repquota_path = self._find_executable('repquota')
+        self.email_measure_workers = int(os.getenv('EMAIL_QUOTA_WORKERS', 8))
+        self.email_measure_timeout = float(os.getenv('EMAIL_QUOTA_TIMEOUT', 5))
+        self._email_measure_executor: Optional[ThreadPoolExecutor] = None
+        self._email_measure_lock = threading.Lock()
 
     def _find_executable(self, name: str) -> Optional[str]:
         """Find an executable, checking common paths if not in PATH."""
@@ -30,15 +40,103 @@ class QuotaMonitoringService:
                 return p
         return None
 
-    def get_all_users_quota_usage(self, force_refresh: bool = False, cache_duration_seconds: int = 300) -> Dict[str, Dict]:
-        """Get quota usage for all system users, with in-memory caching."""
-        now = time()
-        if force_refresh or not self._all_users_cache or (now - self._cache_timestamp > cache_duration_seconds):
-            self._all_users_cache = self._fetch_all_users_quota_usage()
-            self._cache_timestamp = now
-        
-        # Return a copy to prevent mutation of the cache
-        return self._all_users_cache.copy() if self._all_users_cache else {}
+    def get_all_users_quota_usage(self, force_refresh: bool = False) -> Dict[str, Dict]:
+        """Get quota usage for all system users from the shared snapshot.
+
+        Never runs quota/du itself; force_refresh only queues a full refresh
+        for the background refresher (services.quota_snapshots).
+        """
+        store = get_quota_snapshot_store()
+        if force_refresh:
+            store.request_refresh()
+        return store.all_storage()
+
+    def get_snapshot_user_storage_usage(self, username: str) -> Optional[Dict]:
+        """Get a user's storage usage from the snapshot, queueing a refresh if it has none yet."""
+        store = get_quota_snapshot_store()
+        usage = store.get_storage(username)
+        if usage is None:
+            store.request_refresh(username)
+        return usage
+
+    def get_snapshot_email_quota_usage(self, email_account_ids) -> Dict[int, Dict]:
+        """Get email quota usage for the given account ids from the snapshot."""
+        return get_quota_snapshot_store().get_email(email_account_ids)
+
+    def request_refresh(self, username: Optional[str] = None) -> None:
+        """Queue a snapshot refresh for one user (or all users when username is None)."""
+        get_quota_snapshot_store().request_refresh(username)
+
+    def get_usage_history(self, username: str, period: str = 'day', method: str = 'linear') -> Optional[Dict]:
+        """Get recorded usage points for a user and a days-until-full projection.
+
+        period is 'day' (5-minute points) or 'month' (hourly points). 'linear'
+        fits a least-squares line through the period's points; 'ewma' uses the
+        exponentially weighted growth rate kept at each refresh.
+        """
+        if period not in HISTORY_RESOLUTIONS:
+            raise ValueError(f"Unsupported period: {period}")
+        if method not in TREND_METHODS:
+            raise ValueError(f"Unsupported method: {method}")
+
+        store = get_quota_snapshot_store()
+        rows = store.get_history(username, period)
+        trend = store.get_trends(username).get(username)
+        if not rows and not trend:
+            return None
+
+        latest = (trend['sampled_at'], trend['used_kb'], trend['limit_kb']) if trend else rows[-1]
+        if method == 'linear':
+            rate = linear_rate(fit_points(rows))
+        else:
+            rate = trend['rate_kb_per_s'] if trend else None
+        sampled_at, used_kb, limit_kb = latest
+
+        return {
+            'username': username,
+            'period': period,
+            'interval_seconds': HISTORY_RESOLUTIONS[period][0],
+            'points': [
+                {
+                    'timestamp': datetime.utcfromtimestamp(bucket).isoformat(),
+                    'usage_mb': round(used / 1024, 2),
+                    'limit_mb': round(limit / 1024, 2) if limit else None
+                } for bucket, used, limit in rows
+            ],
+            'projection': self._build_projection(method, used_kb, limit_kb, rate, sampled_at)
+        }
+
+    def get_usage_projections(self, horizon_days: Optional[float] = None) -> list:
+        """Get EWMA days-until-full projections for all users, soonest first.
+
+        With horizon_days, only users projected to reach their limit within
+        that many days are returned.
+        """
+        projections = []
+        for username, trend in get_quota_snapshot_store().get_trends().items():
+            projection = self._build_projection('ewma', trend['used_kb'], trend['limit_kb'],
+                                                trend['rate_kb_per_s'], trend['sampled_at'])
+            if horizon_days is not None and (projection['days_until_full'] is None
+                                             or projection['days_until_full'] > horizon_days):
+                continue
+            projection['username'] = username
+            projections.append(projection)
+        projections.sort(key=lambda p: (p['days_until_full'] is None, p['days_until_full'] or 0))
+        return projections
+
+    @staticmethod
+    def _build_projection(method: str, used_kb: int, limit_kb: Optional[int], rate_kb_per_s: Optional[float],
+                          sampled_at: float) -> Dict:
+        days = days_until_full(used_kb, limit_kb, rate_kb_per_s)
+        return {
+            'method': method,
+            'usage_mb': round(used_kb / 1024, 2),
+            'limit_mb': round(limit_kb / 1024, 2) if limit_kb else None,
+            'rate_mb_per_day': round(rate_kb_per_s * 86400 / 1024, 2) if rate_kb_per_s is not None else None,
+            'days_until_full': days,
+            'projected_full_at': datetime.utcfromtimestamp(sampled_at + days * 86400).isoformat()
+            if days is not None else None
+        }
 
     def get_user_storage_usage(self, username: str) -> Optional[Dict]:
         """Get real-time storage usage for a Linux user."""
@@ -47,8 +145,7 @@ class QuotaMonitoringService:
             
         try:
             # Get user's home directory
-            import pwd
-            user_info = pwd.getpwnam(username)
+            user_info = id_name_cache.getpwnam(username)
             home_dir = user_info.pw_dir
             
             if not os.path.exists(home_dir):
@@ -77,23 +174,46 @@ class QuotaMonitoringService:
                 hard_mb = limits.get('hard_mb')
                 grace_text = None
 
-            return {
-                'username': username,
-                'home_directory': home_dir,
-                'usage_mb': usage_mb,
-                'usage_kb': usage_kb,
-                'quota_soft_mb': soft_mb,
-                'quota_hard_mb': hard_mb,
-                'quota_usage_percent': self._calculate_usage_percent(usage_mb, soft_mb),
-                'quota_grace': grace_text,
-                'is_exceeded_soft': True if (soft_mb is not None and soft_mb > 0 and usage_mb > soft_mb) else False,
-                'is_exceeded_hard': True if (hard_mb is not None and hard_mb > 0 and usage_mb > hard_mb) else False,
-                'last_updated': datetime.utcnow().isoformat()
-            }
+            return self._build_storage_usage(username, home_dir, usage_kb, usage_mb, soft_mb, hard_mb, grace_text)
             
         except Exception as e:
             print(f"Error getting storage usage for {username}: {e}")
             return None
+
+    def _build_storage_usage(self, username: str, home_dir: str, usage_kb: int, usage_mb: float,
+                             soft_mb: Optional[float], hard_mb: Optional[float], grace_text: Optional[str]) -> Dict:
+        return {
+            'username': username,
+            'home_directory': home_dir,
+            'usage_mb': usage_mb,
+            'usage_kb': usage_kb,
+            'quota_soft_mb': soft_mb,
+            'quota_hard_mb': hard_mb,
+            'quota_usage_percent': self._calculate_usage_percent(usage_mb, soft_mb),
+            'quota_grace': grace_text,
+            'is_exceeded_soft': True if (soft_mb is not None and soft_mb > 0 and usage_mb > soft_mb) else False,
+            'is_exceeded_hard': True if (hard_mb is not None and hard_mb > 0 and usage_mb > hard_mb) else False,
+            'last_updated': datetime.utcnow().isoformat()
+        }
+
+    def _storage_usage_from_report(self, username: str, report: QuotaReport) -> Optional[Dict]:
+        """Build a user's storage usage from a repquota report; None if the user is not in it."""
+        try:
+            user_info = id_name_cache.getpwnam(username)
+        except KeyError:
+            return None
+        home_dir = user_info.pw_dir
+        if not os.path.exists(home_dir):
+            return None
+        entry = report.entry_for(username, home_dir, user_info.pw_uid)
+        if entry is None:
+            return None
+        # Same conventions as the quota -u parser: 0 means no limit, grace only when it is text
+        soft_mb = round(entry['soft_kb'] / 1024, 2) if entry['soft_kb'] else None
+        hard_mb = round(entry['hard_kb'] / 1024, 2) if entry['hard_kb'] else None
+        grace = entry['grace'] if entry['grace'] and not re.fullmatch(r'\d+', entry['grace']) else None
+        return self._build_storage_usage(username, home_dir, entry['used_kb'], round(entry['used_kb'] / 1024, 2),
+                                         soft_mb, hard_mb, grace)
     
     def _get_user_quota_limits(self, username: str) -> Dict:
         """Get quota limits for a user from the filesystem."""
@@ -256,8 +376,7 @@ class QuotaMonitoringService:
             
         try:
             # First, find the filesystem for the user's home directory
-            import pwd
-            user_info = pwd.getpwnam(username)
+            user_info = id_name_cache.getpwnam(username)
             home_dir = user_info.pw_dir
             
             # Find the mount point for the user's home directory
@@ -287,9 +406,8 @@ class QuotaMonitoringService:
                 check=True
             )
             
-            # Invalidate the cache since we've changed the quota
-            self._all_users_cache = None
-            self._cache_timestamp = 0.0
+            # Pick up the new limits in the snapshot
+            self.request_refresh(username)
 
             return {
                 'success': True,
@@ -314,46 +432,127 @@ class QuotaMonitoringService:
         try:
             # Get email account info from database
             from models.email import EmailAccount
-            from models.database import db
-            
+
             account = EmailAccount.query.get(email_account_id)
             if not account:
                 return None
-            
-            # Get maildir path
-            maildir_path = os.path.join(
+            return self.measure_email_account(account, email_service)
+
+        except Exception as e:
+            print(f"Error getting email quota usage for account {email_account_id}: {e}")
+            return None
+
+    def measure_email_account(self, account, email_service) -> Optional[Dict]:
+        """Measure the maildir of an already loaded EmailAccount."""
+        try:
+            target = self._email_account_target(account, email_service)
+            return self._measure_email_target(target)
+        except Exception as e:
+            print(f"Error getting email quota usage for account {account.id}: {e}")
+            return None
+
+    def get_email_quota_usage_batch(self, accounts, email_service, timeout: Optional[float] = None) -> Dict:
+        """Get email quota usage for many accounts at once.
+
+        accounts may be EmailAccount ids or objects; they are (re)loaded with
+        their domains in a single query. Maildirs are measured on a bounded
+        thread pool (EMAIL_QUOTA_WORKERS) and each one gets ``timeout`` seconds
+        (EMAIL_QUOTA_TIMEOUT) once it starts. Whatever finished is returned:
+        ``usage`` maps account id to its usage dict, and ``timed_out``,
+        ``unavailable`` (no maildir / measure failed) and ``not_found`` list the
+        remaining ids.
+        """
+        from models.email import EmailAccount
+        from sqlalchemy.orm import joinedload
+
+        timeout = self.email_measure_timeout if timeout is None else timeout
+        account_ids = list(dict.fromkeys(a if isinstance(a, int) else a.id for a in accounts))
+        result = {'usage': {}, 'timed_out': [], 'unavailable': [], 'not_found': []}
+        if not account_ids:
+            return result
+
+        loaded = EmailAccount.query.options(joinedload(EmailAccount.email_domain)).filter(
+            EmailAccount.id.in_(account_ids)
+        ).all()
+        # Resolve everything that touches the ORM here; worker threads only read the filesystem
+        targets = {account.id: self._email_account_target(account, email_service) for account in loaded}
+        result['not_found'] = [account_id for account_id in account_ids if account_id not in targets]
+
+        started: Dict[int, float] = {}
+
+        def measure(target):
+            started[target['email_account_id']] = monotonic()
+            return self._measure_email_target(target)
+
+        pending = {self.email_measure_executor.submit(measure, target): account_id
+                   for account_id, target in targets.items()}
+        # Items still queued behind stuck ones give up once every batch of workers could have timed out
+        queue_deadline = monotonic() + timeout * (len(pending) // self.email_measure_workers + 1)
+        while pending:
+            done, _ = wait(pending, timeout=min(timeout, 0.5), return_when=FIRST_COMPLETED)
+            for future in done:
+                account_id = pending.pop(future)
+                try:
+                    usage = future.result()
+                except Exception as e:
+                    print(f"Error getting email quota usage for account {account_id}: {e}")
+                    usage = None
+                if usage:
+                    result['usage'][account_id] = usage
+                else:
+                    result['unavailable'].append(account_id)
+            now = monotonic()
+            for future, account_id in list(pending.items()):
+                began = started.get(account_id)
+                if (began is not None and now - began > timeout) or (began is None and now > queue_deadline):
+                    # The thread can't be interrupted; its result is simply dropped
+                    future.cancel()
+                    del pending[future]
+                    result['timed_out'].append(account_id)
+        return result
+
+    @property
+    def email_measure_executor(self) -> ThreadPoolExecutor:
+        with self._email_measure_lock:
+            if self._email_measure_executor is None:
+                self._email_measure_executor = ThreadPoolExecutor(
+                    max_workers=self.email_measure_workers, thread_name_prefix='email-quota'
+                )
+            return self._email_measure_executor
+
+    @staticmethod
+    def _email_account_target(account, email_service) -> Dict:
+        return {
+            'email_account_id': account.id,
+            'email': account.get_email(),
+            'quota_mb': account.quota,
+            'maildir_path': os.path.join(
                 email_service.virtual_mailbox_base,
                 account.email_domain.domain,
                 account.username
             )
-            
-            if not os.path.exists(maildir_path):
-                return None
-            
-            # Calculate maildir size
-            result = subprocess.run(
-                ['du', '-s', '--block-size=1K', maildir_path], 
-                capture_output=True, 
-                text=True, 
-                check=True
-            )
-            
-            usage_kb = int(result.stdout.split('\t')[0])
-            usage_mb = round(usage_kb / 1024, 2)
-            
-            return {
-                'email_account_id': email_account_id,
-                'email': account.get_email(),
-                'quota_mb': account.quota,
-                'usage_mb': usage_mb,
-                'usage_percent': round((usage_mb / account.quota) * 100, 2) if account.quota > 0 else None,
-                'maildir_path': maildir_path,
-                'last_updated': datetime.utcnow().isoformat()
-            }
-            
-        except Exception as e:
-            print(f"Error getting email quota usage for account {email_account_id}: {e}")
+        }
+
+    @staticmethod
+    def _measure_email_target(target: Dict) -> Optional[Dict]:
+        # Message sizes from maildirsize / file names, cached by directory mtime
+        usage = get_maildir_size_engine().measure(target['maildir_path'])
+        if usage is None:
             return None
+        
+        usage_mb = round(usage['bytes'] / (1024 * 1024), 2)
+        quota_mb = target['quota_mb']
+        
+        return {
+            'email_account_id': target['email_account_id'],
+            'email': target['email'],
+            'quota_mb': quota_mb,
+            'usage_mb': usage_mb,
+            'message_count': usage['messages'],
+            'usage_percent': round((usage_mb / quota_mb) * 100, 2) if quota_mb and quota_mb > 0 else None,
+            'maildir_path': target['maildir_path'],
+            'last_updated': datetime.utcnow().isoformat()
+        }
     
     def _fetch_all_users_quota_usage(self) -> Dict[str, Dict]:
         """Get quota usage for all system users."""
@@ -376,10 +575,19 @@ class QuotaMonitoringService:
                         continue
                     usernames.append(username)
 
+            # One repquota run covers every user on every quota-enabled filesystem;
+            # users missing from it fall back to quota -u / du one at a time
+            report = run_repquota(self.repquota_path) if self.repquota_path else None
+            fallback = 0
             for username in usernames:
-                usage = self.get_user_storage_usage(username)
+                usage = self._storage_usage_from_report(username, report) if report else None
+                if usage is None:
+                    fallback += 1
+                    usage = self.get_user_storage_usage(username)
                 if usage:
                     users_usage[username] = usage
+            if report and fallback:
+                print(f"Quota refresh: {fallback} of {len(usernames)} users not in repquota output, measured individually")
             
             return users_usage
             
@@ -0,0 +1,127 @@
+import os
+import re
+import shutil
+import subprocess
+from typing import Dict, List, Optional
+
+_DEVICE_RE = re.compile(r'^\*\*\*\s+Report for user quotas on device\s+(\S+)')
+# <name> <block flag><inode flag> <used> <soft> <hard> [grace] <files> <soft> <hard> [grace]
+_ENTRY_RE = re.compile(r'^(\S+)\s+([-+])([-+])\s+(\d+)\s+(\d+)\s+(\d+)(?:\s+(.*))?$')
+
+
+def parse_repquota(output: str) -> Dict[str, Dict[str, Dict]]:
+    """Parse ``repquota -a -u`` output into {device: {name: entry}}.
+
+    Block counts are 1K blocks. A grace column is only printed for a limit
+    that is exceeded (its flag is '+'), so it is consumed only then. Users
+    without a passwd entry appear as ``#<uid>`` and are keyed that way.
+    Headers, separators and the ``-v`` statistics trailer are skipped.
+    """
+    report: Dict[str, Dict[str, Dict]] = {}
+    device = None
+    for line in output.splitlines():
+        header = _DEVICE_RE.match(line)
+        if header:
+            device = header.group(1)
+            report.setdefault(device, {})
+            continue
+        if device is None:
+            continue
+        match = _ENTRY_RE.match(line.strip())
+        if not match:
+            continue
+        name, block_flag, file_flag, used, soft, hard, rest = match.groups()
+        tokens = (rest or '').split()
+
+        block_grace = tokens.pop(0) if block_flag == '+' and tokens else None
+        files = [int(t) for t in tokens[:3] if t.isdigit()]
+        file_grace = tokens[3] if file_flag == '+' and len(tokens) > 3 else None
+
+        report[device][name] = {
+            'used_kb': int(used),
+            'soft_kb': int(soft),
+            'hard_kb': int(hard),
+            'grace': block_grace,
+            'files_used': files[0] if len(files) > 0 else None,
+            'files_soft': files[1] if len(files) > 1 else None,
+            'files_hard': files[2] if len(files) > 2 else None,
+            'files_grace': file_grace,
+        }
+    return report
+
+
+def read_mounts(path: str = '/proc/mounts') -> Dict[str, List[str]]:
+    """Return {device: [mount points]} with device paths resolved (e.g. /dev/mapper/x -> /dev/dm-0)."""
+    mounts: Dict[str, List[str]] = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    device = os.path.realpath(parts[0]) if parts[0].startswith('/') else parts[0]
+                    # /proc/mounts escapes spaces as \040
+                    mounts.setdefault(device, []).append(parts[1].replace('\\040', ' '))
+    except OSError:
+        pass
+    return mounts
+
+
+class QuotaReport:
+    """One ``repquota -a`` run, with lookup of a user's entry on the filesystem holding their home"""
+
+    def __init__(self, report: Dict[str, Dict[str, Dict]], mounts: Optional[Dict[str, List[str]]] = None):
+        self.report = report
+        self.mounts = mounts if mounts is not None else read_mounts()
+        self._mount_points = sorted(
+            ((mount, device) for device in report
+             for mount in self.mounts.get(os.path.realpath(device) if device.startswith('/') else device, [])),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.report.values())
+
+    def device_for_path(self, path: str) -> Optional[str]:
+        """Return the reported device whose mount point is the longest prefix of path"""
+        real = os.path.realpath(path)
+        for mount, device in self._mount_points:
+            if real == mount or real.startswith(mount.rstrip('/') + '/'):
+                return device
+        return None
+
+    def entry_for(self, username: str, home_dir: Optional[str] = None, uid: Optional[int] = None) -> Optional[Dict]:
+        """Return the repquota entry for username, preferring the filesystem holding home_dir"""
+        keys = [username] + ([f'#{uid}'] if uid is not None else [])
+        device = self.device_for_path(home_dir) if home_dir else None
+        devices = [device] if device else list(self.report)
+        for dev in devices:
+            entries = self.report.get(dev, {})
+            for key in keys:
+                if key in entries:
+                    return entries[key]
+        return None
+
+
+def run_repquota(repquota_path: Optional[str] = None, timeout: int = 60) -> Optional[QuotaReport]:
+    """Run ``repquota -a -u -v`` once for all filesystems; None if it is unavailable or fails."""
+    repquota_path = repquota_path or shutil.which('repquota') or next(
+        (p for p in ('/usr/sbin/repquota', '/sbin/repquota') if os.access(p, os.X_OK)), None
+    )
+    if not repquota_path:
+        return None
+    command = [repquota_path, '-a', '-u', '-v']
+    if hasattr(os, 'geteuid') and os.geteuid() != 0:
+        # Reading other users' quota records needs root, as setquota does
+        command = ['sudo', '-n'] + command
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=False, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Warning: repquota failed: {e}")
+        return None
+    report = parse_repquota(result.stdout)
+    if not report:
+        if result.returncode != 0:
+            print(f"Warning: repquota failed: {result.stderr.strip()}")
+        return None
+    return QuotaReport(report)
@@ -0,0 +1,409 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from time import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.quota_trends import HISTORY_RESOLUTIONS, MIN_RATE_INTERVAL, ewma_rate
+
+# Marker in the request queue meaning "refresh every user"
+REFRESH_ALL = '*'
+
+
+class QuotaSnapshotStore:
+    """Last known storage and email quota usage, in a shared SQLite (WAL) file.
+
+    The refresher thread is the only writer; every gunicorn worker reads from
+    here, so /api/quota/* never runs quota or du on the request path and all
+    workers see the same numbers. Refresh requests from the API are queued in
+    the same file and picked up by whichever worker currently holds the
+    refresh lease.
+    """
+
+    _SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_storage_snapshots (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_email_snapshots (
+    account_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_refresh_requests (
+    username TEXT PRIMARY KEY,
+    requested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_refresh_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS quota_usage_history (
+    username TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    used_kb INTEGER NOT NULL,
+    limit_kb INTEGER,
+    PRIMARY KEY (username, resolution, slot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS quota_usage_trends (
+    username TEXT PRIMARY KEY,
+    sampled_at REAL NOT NULL,
+    used_kb INTEGER NOT NULL,
+    limit_kb INTEGER,
+    rate_kb_per_s REAL
+);
+"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn.executescript(self._SCHEMA)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # Storage snapshots
+
+    def get_storage(self, username: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            'SELECT data FROM quota_storage_snapshots WHERE username = ?', (username,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all_storage(self) -> Dict[str, Dict]:
+        rows = self._conn.execute('SELECT username, data FROM quota_storage_snapshots ORDER BY username').fetchall()
+        return {username: json.loads(data) for username, data in rows}
+
+    def put_storage(self, username: str, data: Dict) -> None:
+        with self._conn as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO quota_storage_snapshots (username, data, refreshed_at) VALUES (?, ?, ?)',
+                (username, json.dumps(data), time())
+            )
+
+    def replace_storage(self, usage: Dict[str, Dict]) -> None:
+        """Swap in a complete snapshot; users missing from usage are dropped."""
+        now = time()
+        with self._conn as conn:
+            conn.execute('DELETE FROM quota_storage_snapshots')
+            conn.executemany(
+                'INSERT INTO quota_storage_snapshots (username, data, refreshed_at) VALUES (?, ?, ?)',
+                [(username, json.dumps(data), now) for username, data in usage.items()]
+            )
+
+    # Email snapshots
+
+    def get_email(self, account_ids: Iterable[int]) -> Dict[int, Dict]:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        rows = self._conn.execute(
+            f"SELECT account_id, data FROM quota_email_snapshots "
+            f"WHERE account_id IN ({', '.join('?' * len(account_ids))})",
+            account_ids
+        ).fetchall()
+        return {account_id: json.loads(data) for account_id, data in rows}
+
+    def put_email(self, account_id: int, data: Dict) -> None:
+        with self._conn as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO quota_email_snapshots (account_id, data, refreshed_at) VALUES (?, ?, ?)',
+                (account_id, json.dumps(data), time())
+            )
+
+    def replace_email(self, usage: Dict[int, Dict]) -> None:
+        now = time()
+        with self._conn as conn:
+            conn.execute('DELETE FROM quota_email_snapshots')
+            conn.executemany(
+                'INSERT INTO quota_email_snapshots (account_id, data, refreshed_at) VALUES (?, ?, ?)',
+                [(account_id, json.dumps(data), now) for account_id, data in usage.items()]
+            )
+
+    # Usage history
+    #
+    # Each resolution is a fixed ring of slots per user: a sample overwrites the
+    # slot of its bucket, so the day ring keeps the latest 5-minute point and the
+    # month ring the latest point of each hour, and neither grows over time.
+    # quota_usage_trends holds the last sample and an EWMA growth rate per user,
+    # so projections for every user cost one row each.
+
+    def record_usage(self, samples: Dict[str, Tuple[int, Optional[int]]], ts: Optional[float] = None) -> None:
+        """Record {username: (used_kb, limit_kb)} measured at ts into the history rings and trends"""
+        if not samples:
+            return
+        ts = ts or time()
+        history_rows = []
+        for resolution, slots in HISTORY_RESOLUTIONS.values():
+            bucket = int(ts // resolution) * resolution
+            slot = (bucket // resolution) % slots
+            history_rows.extend((username, resolution, slot, bucket, used_kb, limit_kb)
+                                for username, (used_kb, limit_kb) in samples.items())
+
+        with self._conn as conn:
+            previous = {}
+            names = list(samples)
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                previous.update((row[0], row[1:]) for row in conn.execute(
+                    f"SELECT username, sampled_at, used_kb, rate_kb_per_s FROM quota_usage_trends "
+                    f"WHERE username IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+            trend_rows = []
+            for username, (used_kb, limit_kb) in samples.items():
+                if username in previous:
+                    prev_ts, prev_used, prev_rate = previous[username]
+                    if ts - prev_ts < MIN_RATE_INTERVAL:
+                        continue
+                    rate = ewma_rate(prev_rate, prev_ts, prev_used, ts, used_kb)
+                else:
+                    rate = None
+                trend_rows.append((username, ts, used_kb, limit_kb, rate))
+            conn.executemany(
+                'INSERT OR REPLACE INTO quota_usage_history (username, resolution, slot, bucket, used_kb, limit_kb) '
+                'VALUES (?, ?, ?, ?, ?, ?)', history_rows
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO quota_usage_trends (username, sampled_at, used_kb, limit_kb, rate_kb_per_s) '
+                'VALUES (?, ?, ?, ?, ?)', trend_rows
+            )
+
+    def get_history(self, username: str, period: str = 'day') -> List[Tuple[int, int, Optional[int]]]:
+        """Return [(bucket_ts, used_kb, limit_kb)] for the period ('day' or 'month'), oldest first"""
+        resolution, slots = HISTORY_RESOLUTIONS[period]
+        return self._conn.execute(
+            'SELECT bucket, used_kb, limit_kb FROM quota_usage_history '
+            'WHERE username = ? AND resolution = ? AND bucket > ? ORDER BY bucket',
+            (username, resolution, time() - resolution * slots)
+        ).fetchall()
+
+    def get_trends(self, username: Optional[str] = None) -> Dict[str, Dict]:
+        """Return {username: {sampled_at, used_kb, limit_kb, rate_kb_per_s}} for one or all users"""
+        query = 'SELECT username, sampled_at, used_kb, limit_kb, rate_kb_per_s FROM quota_usage_trends'
+        args: tuple = ()
+        if username is not None:
+            query += ' WHERE username = ?'
+            args = (username,)
+        return {
+            row[0]: {'sampled_at': row[1], 'used_kb': row[2], 'limit_kb': row[3], 'rate_kb_per_s': row[4]}
+            for row in self._conn.execute(query, args).fetchall()
+        }
+
+    def purge_history(self) -> None:
+        """Drop history and trends of users that have not been sampled for longer than the longest ring"""
+        cutoff = time() - max(resolution * slots for resolution, slots in HISTORY_RESOLUTIONS.values())
+        with self._conn as conn:
+            conn.execute('DELETE FROM quota_usage_history WHERE bucket < ?', (cutoff,))
+            conn.execute('DELETE FROM quota_usage_trends WHERE sampled_at < ?', (cutoff,))
+
+    # Refresh queue and lease
+
+    def request_refresh(self, username: Optional[str] = None) -> None:
+        """Queue a refresh of one user, or of everyone when username is None"""
+        with self._conn as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO quota_refresh_requests (username, requested_at) VALUES (?, ?)',
+                (username or REFRESH_ALL, time())
+            )
+
+    def take_refresh_requests(self) -> List[str]:
+        with self._conn as conn:
+            rows = conn.execute('SELECT username FROM quota_refresh_requests ORDER BY requested_at').fetchall()
+            conn.execute('DELETE FROM quota_refresh_requests')
+        return [row[0] for row in rows]
+
+    def get_state(self, name: str) -> Optional[str]:
+        row = self._conn.execute('SELECT value FROM quota_refresh_state WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, name: str, value: Optional[str]) -> None:
+        with self._conn as conn:
+            conn.execute('INSERT OR REPLACE INTO quota_refresh_state (name, value) VALUES (?, ?)', (name, value))
+
+    def acquire_lease(self, owner: str, ttl: float) -> bool:
+        """Take or renew the refresh lease; only one process refreshes at a time"""
+        conn = self._conn
+        now = time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = dict(conn.execute(
+                "SELECT name, value FROM quota_refresh_state WHERE name IN ('lease_owner', 'lease_until')"
+            ).fetchall())
+            holder = rows.get('lease_owner')
+            if holder and holder != owner and float(rows.get('lease_until') or 0) > now:
+                conn.execute('ROLLBACK')
+                return False
+            conn.executemany(
+                'INSERT OR REPLACE INTO quota_refresh_state (name, value) VALUES (?, ?)',
+                [('lease_owner', owner), ('lease_until', str(now + ttl))]
+            )
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def release_lease(self, owner: str) -> None:
+        with self._conn as conn:
+            conn.execute(
+                "UPDATE quota_refresh_state SET value = '0' WHERE name = 'lease_until' AND "
+                "(SELECT value FROM quota_refresh_state WHERE name = 'lease_owner') = ?",
+                (owner,)
+            )
+
+    def last_full_refresh(self) -> Optional[float]:
+        value = self.get_state('last_full_refresh')
+        return float(value) if value else None
+
+
+class QuotaRefresher:
+    """Background thread that keeps the quota snapshot up to date.
+
+    Runs in every worker, but only the holder of the store's lease does any
+    work: a full refresh every ``interval`` seconds, plus queued single-user
+    refreshes (checked every ``poll_interval`` seconds).
+    """
+
+    def __init__(self, app, store: QuotaSnapshotStore, quota_service, email_service,
+                 interval: float = 300.0, poll_interval: float = 5.0):
+        self.app = app
+        self.store = store
+        self.quota_service = quota_service
+        self.email_service = email_service
+        self.interval = interval
+        self.poll_interval = poll_interval
+        # A full refresh runs without renewing the lease, so it must outlast one
+        self.lease_ttl = max(2 * interval, 60.0)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='quota-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.store.release_lease(self.owner)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error refreshing quota snapshot: {e}")
+            if self._stop.wait(self.poll_interval):
+                return
+
+    def run_once(self) -> bool:
+        """Do whatever refresh work is due; returns False when another process holds the lease."""
+        if not self.store.acquire_lease(self.owner, self.lease_ttl):
+            return False
+        requested = self.store.take_refresh_requests()
+        last = self.store.last_full_refresh()
+        with self.app.app_context():
+            if REFRESH_ALL in requested or last is None or time() - last >= self.interval:
+                self.refresh_all()
+            else:
+                for username in requested:
+                    self.refresh_user(username)
+        return True
+
+    def refresh_all(self) -> None:
+        started = time()
+        usage = self.quota_service._fetch_all_users_quota_usage()
+        self.store.replace_storage(usage)
+        self.store.record_usage(self._usage_samples(usage), started)
+        self.store.purge_history()
+        self.store.replace_email(self._measure_email_accounts())
+        self.store.set_state('last_full_refresh', str(started))
+        self.store.set_state('last_full_refresh_seconds', f"{time() - started:.3f}")
+
+    def refresh_user(self, username: str) -> None:
+        usage = self.quota_service.get_user_storage_usage(username)
+        if usage:
+            self.store.put_storage(username, usage)
+            self.store.record_usage(self._usage_samples({username: usage}))
+        for account_id, data in self._measure_email_accounts(username).items():
+            self.store.put_email(account_id, data)
+
+    @staticmethod
+    def _usage_samples(usage: Dict[str, Dict]) -> Dict[str, Tuple[int, Optional[int]]]:
+        """Storage usage dicts -> {username: (used_kb, limit_kb)}; the hard limit wins over the soft one"""
+        samples = {}
+        for username, data in usage.items():
+            limit_mb = data.get('quota_hard_mb') or data.get('quota_soft_mb')
+            samples[username] = (int(data['usage_kb']), int(limit_mb * 1024) if limit_mb else None)
+        return samples
+
+    def _measure_email_accounts(self, username: Optional[str] = None) -> Dict[int, Dict]:
+        from models.email import EmailAccount
+
+        query = EmailAccount.query.with_entities(EmailAccount.id)
+        if username is not None:
+            query = query.filter_by(username=username)
+        batch = self.quota_service.get_email_quota_usage_batch([row[0] for row in query.all()], self.email_service)
+        if batch['timed_out']:
+            print(f"Quota refresh: {len(batch['timed_out'])} maildirs timed out, keeping their previous snapshot")
+            # Keep the last known numbers rather than dropping these accounts from a full replace
+            batch['usage'].update(self.store.get_email(batch['timed_out']))
+        return batch['usage']
+
+
+_store: Optional[QuotaSnapshotStore] = None
+_store_lock = threading.Lock()
+_refresher: Optional[QuotaRefresher] = None
+
+
+def get_quota_snapshot_store() -> QuotaSnapshotStore:
+    """Return the shared snapshot store (QUOTA_SNAPSHOT_DB)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            db_path = os.environ.get('QUOTA_SNAPSHOT_DB') or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'quota_snapshots.db'
+            )
+            _store = QuotaSnapshotStore(db_path)
+        return _store
+
+
+def start_quota_refresher(app) -> Optional[QuotaRefresher]:
+    """Start this process's refresher (QUOTA_REFRESH_INTERVAL, QUOTA_REFRESH_POLL, QUOTA_REFRESHER_ENABLED)."""
+    global _refresher
+    if os.environ.get('QUOTA_REFRESHER_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    from services.quota_monitoring_service import QuotaMonitoringService
+    from services.email_service import EmailService
+
+    store = get_quota_snapshot_store()
+    with _store_lock:
+        if _refresher is None:
+            _refresher = QuotaRefresher(
+                app,
+                store,
+                QuotaMonitoringService(),
+                EmailService(),
+                interval=float(os.environ.get('QUOTA_REFRESH_INTERVAL', 300)),
+                poll_interval=float(os.environ.get('QUOTA_REFRESH_POLL', 5))
+            )
+    _refresher.start()
+    return _refresher
@@ -0,0 +1,57 @@
+import math
+from typing import List, Optional, Sequence, Tuple
+
+# name -> (bucket seconds, slots): 5-minute points for a day, hourly points for a month
+HISTORY_RESOLUTIONS = {
+    'day': (300, 288),
+    'month': (3600, 720),
+}
+TREND_METHODS = ('linear', 'ewma')
+
+# Time constant of the EWMA growth rate; recent hours dominate, a day ago barely counts
+EWMA_TAU_SECONDS = 6 * 3600
+# Samples closer together than this (e.g. a manual refresh right after a full one) don't update the rate
+MIN_RATE_INTERVAL = 60
+
+
+def linear_rate(points: Sequence[Tuple[float, float]]) -> Optional[float]:
+    """Least-squares slope (units per second) through (timestamp, value) points"""
+    if len(points) < 2:
+        return None
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t <= 0:
+        return None
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t
+
+
+def ewma_rate(prev_rate: Optional[float], prev_ts: float, prev_value: float, ts: float, value: float,
+              tau: float = EWMA_TAU_SECONDS) -> Optional[float]:
+    """Fold the growth since the previous sample into an exponentially weighted rate (units per second)"""
+    dt = ts - prev_ts
+    if dt < MIN_RATE_INTERVAL:
+        return prev_rate
+    rate = (value - prev_value) / dt
+    if prev_rate is None:
+        return rate
+    # Time-aware smoothing so irregular refresh intervals weigh samples correctly
+    alpha = 1 - math.exp(-dt / tau)
+    return prev_rate + alpha * (rate - prev_rate)
+
+
+def days_until_full(used: float, limit: Optional[float], rate_per_second: Optional[float]) -> Optional[float]:
+    """Days until used reaches limit at the given rate; None without a limit or when usage isn't growing"""
+    if not limit or limit <= 0:
+        return None
+    if used >= limit:
+        return 0.0
+    if rate_per_second is None or rate_per_second <= 0:
+        return None
+    return round((limit - used) / rate_per_second / 86400, 2)
+
+
+def fit_points(rows: List[Tuple[int, int, Optional[int]]]) -> List[Tuple[float, float]]:
+    """(bucket, used_kb, limit_kb) history rows -> (timestamp, used_kb) points for linear_rate"""
+    return [(float(bucket), float(used_kb)) for bucket, used_kb, _ in rows]
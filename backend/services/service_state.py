@@ -0,0 +1,160 @@
+import os
+import platform
+import subprocess
+import threading
+from datetime import datetime
+from time import monotonic, time
+from typing import Dict, Iterable, List, Optional
+
+SHOW_PROPERTIES = ('Id', 'LoadState', 'ActiveState', 'SubState', 'UnitFileState',
+                   'ActiveEnterTimestamp', 'MemoryCurrent', 'MainPID')
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    """systemd timestamp ('Tue 2024-01-02 03:04:05 UTC' in local time, or '@<unix>') -> epoch seconds"""
+    if not value or value == 'n/a':
+        return None
+    if value.startswith('@'):
+        try:
+            return float(value[1:])
+        except ValueError:
+            return None
+    parts = value.split()
+    # Drop the weekday and timezone name; systemctl prints local time
+    if len(parts) >= 3:
+        parts = parts[1:3]
+    try:
+        return datetime.strptime(' '.join(parts[:2]), '%Y-%m-%d %H:%M:%S').timestamp()
+    except ValueError:
+        return None
+
+
+def _parse_int(value: str) -> Optional[int]:
+    # MemoryCurrent is [not set] / 18446744073709551615 (UINT64_MAX) when accounting is off
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number >= 2 ** 64 - 1 else number
+
+
+def parse_systemctl_show(output: str, units: List[str]) -> Dict[str, Dict]:
+    """Split `systemctl show -p ... u1 u2 ...` output (one blank-line separated block per unit, in order)"""
+    blocks: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    for line in output.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = {}
+            continue
+        key, sep, value = line.partition('=')
+        if sep:
+            current[key] = value
+    if current:
+        blocks.append(current)
+
+    states = {}
+    for unit, props in zip(units, blocks):
+        active_state = props.get('ActiveState') or 'unknown'
+        if props.get('LoadState') == 'not-found':
+            active_state = 'not-found'
+        states[unit] = {
+            'unit': props.get('Id') or unit,
+            'active_state': active_state,
+            'sub_state': props.get('SubState'),
+            'unit_file_state': props.get('UnitFileState') or None,
+            'active_since': _parse_timestamp(props.get('ActiveEnterTimestamp', '')),
+            'memory_current': _parse_int(props.get('MemoryCurrent')),
+            'main_pid': _parse_int(props.get('MainPID')) or None
+        }
+    return states
+
+
+class ServiceStateProvider:
+    """systemd unit states for many services from a single `systemctl show` call.
+
+    Results are cached per unit for ``ttl`` seconds and shared by the
+    dashboard, the health check and the sync check; a call only queries the
+    units that are missing or stale, all in one subprocess. Concurrent
+    callers wait for the in-flight query instead of spawning their own.
+    """
+
+    def __init__(self, ttl: float = 5.0, timeout: float = 10.0):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.is_windows = platform.system() == 'Windows' or os.name == 'nt'
+        self._states: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get_states(self, units: Iterable[str]) -> Dict[str, Dict]:
+        """Return {unit: state} for each unit (see parse_systemctl_show for the fields)"""
+        units = list(dict.fromkeys(units))
+        with self._lock:
+            now = monotonic()
+            stale = [u for u in units if u not in self._states or self._states[u][0] <= now]
+            if stale:
+                fetched = self._query(stale)
+                expires = monotonic() + self.ttl
+                for unit in stale:
+                    self._states[unit] = (expires, fetched.get(unit) or self._placeholder(unit, 'unknown'))
+            return {unit: self._states[unit][1] for unit in units}
+
+    def get_state(self, unit: str) -> Dict:
+        return self.get_states([unit])[unit]
+
+    def invalidate(self, unit: Optional[str] = None) -> None:
+        """Forget cached state (e.g. right after a restart) for one unit or all of them"""
+        with self._lock:
+            if unit is None:
+                self._states.clear()
+            else:
+                self._states.pop(unit, None)
+
+    @staticmethod
+    def _placeholder(unit: str, active_state: str) -> Dict:
+        return {
+            'unit': unit,
+            'active_state': active_state,
+            'sub_state': None,
+            'unit_file_state': None,
+            'active_since': None,
+            'memory_current': None,
+            'main_pid': None
+        }
+
+    def _query(self, units: List[str]) -> Dict[str, Dict]:
+        if self.is_windows:
+            # Windows development mode - simulate running services
+            return {unit: dict(self._placeholder(unit, 'active'), unit_file_state='enabled', active_since=time())
+                    for unit in units}
+        try:
+            result = subprocess.run(
+                ['systemctl', 'show', '-p', ','.join(SHOW_PROPERTIES), '--'] + units,
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            return {unit: self._placeholder(unit, 'timeout') for unit in units}
+        except Exception as e:
+            print(f"Error querying service states: {e}")
+            return {unit: self._placeholder(unit, 'error') for unit in units}
+        if result.returncode != 0 and not result.stdout.strip():
+            print(f"Error querying service states: {result.stderr.strip()}")
+            return {unit: self._placeholder(unit, 'error') for unit in units}
+        return parse_systemctl_show(result.stdout, units)
+
+
+_provider: Optional[ServiceStateProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_service_state_provider() -> ServiceStateProvider:
+    """Return the process-wide provider (SERVICE_STATE_TTL, SERVICE_STATE_TIMEOUT)."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = ServiceStateProvider(
+                ttl=float(os.environ.get('SERVICE_STATE_TTL', 5)),
+                timeout=float(os.environ.get('SERVICE_STATE_TIMEOUT', 10))
+            )
+        return _provider
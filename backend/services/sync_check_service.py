@@ -11,6 +11,7 @@ from models.ssl_certificate import SSLCertificate
 
 from models.database import Database, DatabaseUser
 from models.base import db
+from services.service_state import get_service_state_provider
 
 class SyncCheckService:
     """Service สำหรับตรวจสอบความ consistent ระหว่าง database และไฟล์ระบบ"""
@@ -478,8 +479,11 @@ class SyncCheckService:
         items_checked = []
         
         services_to_check = ['nginx', 'mysql', 'postfix', 'dovecot', 'bind9']
+        # สถานะของทุก service จาก systemctl show ครั้งเดียว (cache ร่วมกับ dashboard)
+        states = get_service_state_provider().get_states(services_to_check)
         
         for service in services_to_check:
+            state = states[service]
             item = {
                 'service': service,
                 'status': 'unknown',
@@ -489,17 +493,10 @@ class SyncCheckService:
             }
             
             if not self.is_windows:
+                item['status'] = state['active_state']
+                item['enabled'] = state['unit_file_state'] == 'enabled'
+                item['memory_usage'] = state['memory_current']
                 try:
-                    # ตรวจสอบสถานะ service
-                    result = subprocess.run(['systemctl', 'is-active', service], 
-                                          capture_output=True, text=True, timeout=5)
-                    item['status'] = result.stdout.strip()
-                    
-                    # ตรวจสอบว่า enable หรือไม่
-                    result = subprocess.run(['systemctl', 'is-enabled', service], 
-                                          capture_output=True, text=True, timeout=5)
-                    item['enabled'] = result.stdout.strip() == 'enabled'
-                    
                     # ตรวจสอบ syntax สำหรับบาง services
                     if service == 'nginx':
                         result = subprocess.run(['nginx', '-t'], capture_output=True, text=True, timeout=10)
@@ -508,10 +505,9 @@ class SyncCheckService:
                         result = subprocess.run(['named-checkconf'], capture_output=True, text=True, timeout=10)
                         item['config_syntax_ok'] = result.returncode == 0
                     
-                except subprocess.TimeoutExpired:
-                    item['status'] = 'timeout'
-                except Exception as e:
-                    item['status'] = f'error: {str(e)}'
+                except (subprocess.TimeoutExpired, OSError):
+                    # ตรวจ syntax ไม่ได้ (timeout หรือไม่มีคำสั่ง) ไม่ได้แปลว่า service ล่ม
+                    item['config_syntax_ok'] = None
             else:
                 # Windows simulation
                 item['status'] = 'active'
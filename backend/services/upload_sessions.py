@@ -0,0 +1,242 @@
+import os
+import json
+import uuid
+import hashlib
+import shutil
+import sqlite3
+import threading
+from time import time
+from typing import Dict, List, Optional
+
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+# Keep chunks well under Config.MAX_CONTENT_LENGTH (16 MB)
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+STREAM_BUFFER_SIZE = 1024 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 10 * 1024 ** 3
+
+
+def merge_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add the half-open byte range [start, end) to a sorted list of disjoint ranges"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+class UploadSessionStore:
+    """Resumable upload sessions in a shared SQLite (WAL) file.
+
+    Each session owns a preallocated part file next to the destination; chunks
+    are written into it at their offset with pwrite, so memory use does not
+    depend on file size and chunks may arrive out of order, in parallel or
+    through different gunicorn workers. The received byte ranges are recorded
+    so a client can ask where to resume after a reconnect.
+    """
+
+    _SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    domain TEXT,
+    filename TEXT NOT NULL,
+    final_path TEXT NOT NULL,
+    part_path TEXT NOT NULL,
+    owner_username TEXT,
+    size INTEGER NOT NULL,
+    received TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+    _COLUMNS = ('id', 'user_id', 'domain', 'filename', 'final_path', 'part_path', 'owner_username',
+                'size', 'received', 'created_at', 'updated_at')
+
+    def __init__(self, db_path: str, ttl: float = 86400.0, max_size: int = DEFAULT_MAX_UPLOAD_SIZE):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn.executescript(self._SCHEMA)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self, user_id: int, domain: Optional[str], final_path: str, size: int,
+               owner_uid: Optional[int] = None, owner_gid: Optional[int] = None,
+               owner_username: Optional[str] = None) -> Dict:
+        """Create a session and its preallocated part file in the destination directory"""
+        # size is declared by the client: bound it before any blocks are reserved
+        if size < 0:
+            raise ValueError("size must be a non-negative integer")
+        if size > self.max_size:
+            raise ValueError(f"Upload of {size} bytes exceeds the limit of {self.max_size} bytes")
+        self.purge_expired()
+        upload_dir = os.path.dirname(final_path)
+        free = shutil.disk_usage(upload_dir).free
+        if size > free:
+            raise ValueError(f"Not enough disk space: need {size} bytes, {free} free")
+
+        upload_id = uuid.uuid4().hex
+        filename = os.path.basename(final_path)
+        part_path = os.path.join(upload_dir, f".{filename}.{upload_id[:12]}.part")
+
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            # Hand the file to its owner first so the reserved blocks are charged to them, not root
+            if owner_uid is not None:
+                os.fchown(fd, owner_uid, owner_gid)
+            if size:
+                try:
+                    # Reserve the blocks up front so a full disk fails now, not at 90%
+                    os.posix_fallocate(fd, 0, size)
+                except (AttributeError, OSError):
+                    os.ftruncate(fd, size)
+        except Exception:
+            os.close(fd)
+            os.remove(part_path)
+            raise
+        os.close(fd)
+
+        now = time()
+        self._conn.execute(
+            f"INSERT INTO upload_sessions ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+            (upload_id, user_id, domain, filename, final_path, part_path, owner_username, size, '[]', now, now)
+        )
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM upload_sessions WHERE id = ?", (upload_id,)
+        ).fetchone()
+        if not row:
+            return None
+        session = dict(zip(self._COLUMNS, row))
+        session['received'] = json.loads(session['received'])
+        return session
+
+    def write_chunk(self, session: Dict, offset: int, stream, length: int) -> Dict:
+        """Copy length bytes from stream into the part file at offset and record the range"""
+        if offset < 0 or length < 0 or offset + length > session['size']:
+            raise ValueError(f"Chunk {offset}-{offset + length} is outside the declared size {session['size']}")
+
+        fd = os.open(session['part_path'], os.O_WRONLY)
+        written = 0
+        try:
+            while written < length:
+                data = stream.read(min(STREAM_BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                view = memoryview(data)
+                while view:
+                    count = os.pwrite(fd, view, offset + written)
+                    written += count
+                    view = view[count:]
+        finally:
+            os.close(fd)
+
+        # Record whatever arrived, even a short (interrupted) chunk, so the client can resume from there
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT received FROM upload_sessions WHERE id = ?', (session['id'],)).fetchone()
+            if not row:
+                raise ValueError("Upload session not found")
+            received = json.loads(row[0])
+            if written:
+                received = merge_ranges(received, offset, offset + written)
+            conn.execute('UPDATE upload_sessions SET received = ?, updated_at = ? WHERE id = ?',
+                         (json.dumps(received), time(), session['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if written < length:
+            raise ValueError(f"Incomplete chunk: received {written} of {length} bytes")
+        session['received'] = received
+        return session
+
+    @staticmethod
+    def is_complete(session: Dict) -> bool:
+        return session['size'] == 0 or session['received'] == [[0, session['size']]]
+
+    @staticmethod
+    def file_checksum(path: str, algorithm: str) -> str:
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(STREAM_BUFFER_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+        return digest.hexdigest()
+
+    def delete(self, upload_id: str, remove_part: bool = True) -> None:
+        session = self.get(upload_id)
+        if not session:
+            return
+        if remove_part:
+            try:
+                os.remove(session['part_path'])
+            except FileNotFoundError:
+                pass
+        self._conn.execute('DELETE FROM upload_sessions WHERE id = ?', (upload_id,))
+
+    def purge_expired(self) -> None:
+        """Drop sessions idle for longer than ttl along with their part files"""
+        cutoff = time() - self.ttl
+        for (upload_id,) in self._conn.execute(
+            'SELECT id FROM upload_sessions WHERE updated_at < ?', (cutoff,)
+        ).fetchall():
+            try:
+                self.delete(upload_id)
+            except OSError as e:
+                print(f"Warning: failed to remove expired upload {upload_id}: {e}")
+
+    @staticmethod
+    def to_dict(session: Dict) -> Dict:
+        received_bytes = sum(end - start for start, end in session['received'])
+        return {
+            'uploadId': session['id'],
+            'filename': session['filename'],
+            'domain': session['domain'],
+            'size': session['size'],
+            'received': session['received'],
+            'bytesReceived': received_bytes,
+            'complete': UploadSessionStore.is_complete(session),
+            'chunkSize': DEFAULT_CHUNK_SIZE,
+            'createdAt': session['created_at'],
+            'updatedAt': session['updated_at']
+        }
+
+
+_store: Optional[UploadSessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadSessionStore:
+    """Return the shared upload session store (UPLOAD_SESSIONS_DB, UPLOAD_SESSION_TTL, UPLOAD_MAX_SIZE)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            db_path = os.environ.get('UPLOAD_SESSIONS_DB') or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'upload_sessions.db'
+            )
+            _store = UploadSessionStore(
+                db_path,
+                ttl=float(os.environ.get('UPLOAD_SESSION_TTL', 86400)),
+                max_size=int(os.environ.get('UPLOAD_MAX_SIZE', DEFAULT_MAX_UPLOAD_SIZE))
+            )
+        return _store
@@ -6,6 +6,7 @@ import subprocess
 import os
 import platform
 from utils.logger import setup_logger
+from utils.principal import invalidate_principal
 
 logger = setup_logger(__name__)
 
@@ -131,6 +132,7 @@ class UserService:
 
             user.updated_at = datetime.utcnow()
             db.session.commit()
+            invalidate_principal(user_id)
             return user
             
         except Exception as e:
@@ -203,6 +205,7 @@ class UserService:
             # Delete from database first
             db.session.delete(user)
             db.session.commit()
+            invalidate_principal(user_id)
 
             # 4. Delete Linux user if they are a system user
             if is_system_user and username != 'root':
@@ -292,6 +295,7 @@ class UserService:
             try:
                 db.session.delete(user)
                 db.session.commit()
+                invalidate_principal(user_id)
                 log.append("User record deleted successfully.")
             except Exception as e:
                 db.session.rollback()
@@ -366,6 +370,7 @@ class UserService:
 
             db.session.add(domain_perm)
             db.session.commit()
+            invalidate_principal(user_id)
             return domain_perm
             
         except Exception as e:
@@ -381,6 +386,7 @@ class UserService:
         try:
             db.session.delete(domain_perm)
             db.session.commit()
+            invalidate_principal(user_id)
             return True
         except Exception as e:
             db.session.rollback()
@@ -7,6 +7,7 @@ from models.email import EmailDomain
 from models.base import db
 from .mail_db_sync_service import MailDBSyncService
 from .nginx_service import NginxService
+from .access_index import access_index
 
 class VirtualHostService(BaseService):
     def __init__(self):
@@ -66,6 +67,8 @@ class VirtualHostService(BaseService):
                     # Non-fatal: email domain creation should not block vhost creation
                     pass
 
+            # Owner's (and any same-named linux user's) domain set changed
+            access_index.invalidate()
             return virtual_host
         except Exception as e:
             # Cleanup if something goes wrong
@@ -76,6 +79,8 @@ class VirtualHostService(BaseService):
     def update_virtual_host(self, id: int, data: Dict) -> Optional[VirtualHost]:
         virtual_host = super().update(id, data)
         if virtual_host:
+            # Cached VhostRefs carry the old domain and document root
+            access_index.invalidate()
             self._create_nginx_config(virtual_host)
             self._reload_nginx()
         return virtual_host
@@ -117,6 +122,7 @@ class VirtualHostService(BaseService):
 
             # Delete the virtual host record
             result = super().delete(id)
+            access_index.invalidate()
 
             # Reload Nginx
             self._reload_nginx()
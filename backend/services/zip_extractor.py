@@ -0,0 +1,265 @@
+import os
+import shutil
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Tuple
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ZipLimitError(ValueError):
+    """Archive rejected before extraction (zip bomb limits or unsafe member paths)"""
+
+
+class SafeZipExtractor:
+    """Streaming zip extractor with zip-bomb limits and in-place ownership.
+
+    Everything is validated from the central directory before the first byte is
+    written: member count, total declared size, compression ratio, free disk
+    space and member paths. Directories are created first; file members are
+    then decompressed on a thread pool, each into a temp file that already has
+    the final uid/gid and mode, and renamed into place. Only paths created by
+    this extraction are chowned, and they are removed again if it fails.
+    ZipExtFile stops at the declared size and verifies the CRC, so a member
+    cannot expand beyond what was checked up front.
+    """
+
+    def __init__(self, max_total_bytes: int, max_files: int, max_ratio: float, workers: int = 4):
+        self.max_total_bytes = max_total_bytes
+        self.max_files = max_files
+        self.max_ratio = max_ratio
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='unzip')
+            return self._executor
+
+    def plan(self, archive_path: str, destination: str) -> Tuple[List[Tuple[str, int]], List[Tuple[zipfile.ZipInfo, str]], int]:
+        """Validate the archive and return ([(directory, mode)], [(member, target)], total_bytes) without writing"""
+        dest_real = os.path.realpath(destination)
+        with zipfile.ZipFile(archive_path, 'r') as zf:
+            members = zf.infolist()
+
+        if len(members) > self.max_files:
+            raise ZipLimitError(f"Archive has {len(members)} entries (limit {self.max_files})")
+        total_bytes = sum(m.file_size for m in members)
+        if total_bytes > self.max_total_bytes:
+            raise ZipLimitError(f"Archive expands to {total_bytes} bytes (limit {self.max_total_bytes})")
+        compressed = sum(m.compress_size for m in members) or 1
+        if total_bytes > 1024 * 1024 and total_bytes / compressed > self.max_ratio:
+            raise ZipLimitError(f"Compression ratio {total_bytes / compressed:.0f}:1 exceeds limit {self.max_ratio:.0f}:1")
+        try:
+            free = shutil.disk_usage(dest_real if os.path.isdir(dest_real) else os.path.dirname(dest_real)).free
+            if total_bytes > free:
+                raise ZipLimitError(f"Not enough disk space: need {total_bytes} bytes, {free} free")
+        except OSError:
+            pass
+
+        directories: Dict[str, int] = {}
+        files: Dict[str, zipfile.ZipInfo] = {}
+        for member in members:
+            target = self._member_target(dest_real, member.filename)
+            if member.is_dir():
+                directories[target] = self._member_mode(member, 0o755)
+            else:
+                # Later duplicates win, as with extractall
+                files[target] = member
+            parent = os.path.dirname(target)
+            while parent != dest_real and parent not in directories:
+                directories[parent] = 0o755
+                parent = os.path.dirname(parent)
+        directories.pop(dest_real, None)
+        clashes = set(directories).intersection(files)
+        clashes.update(target for target in files if os.path.isdir(target) and not os.path.islink(target))
+        if clashes:
+            raise ZipLimitError(f"Archive file {sorted(clashes)[0]} conflicts with a directory")
+
+        ordered_dirs = sorted(directories.items(), key=lambda item: (item[0].count(os.sep), item[0]))
+        return ordered_dirs, [(member, target) for target, member in files.items()], total_bytes
+
+    @staticmethod
+    def _member_target(dest_real: str, name: str) -> str:
+        parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+        if not parts or name.startswith('/') or '..' in parts or ':' in parts[0]:
+            raise ZipLimitError(f"Unsafe path detected in archive: {name}")
+        target = os.path.join(dest_real, *parts)
+        if os.path.commonpath([dest_real, target]) != dest_real:
+            raise ZipLimitError(f"Unsafe path detected in archive: {name}")
+        return target
+
+    @staticmethod
+    def _member_mode(member: zipfile.ZipInfo, default: int) -> int:
+        mode = (member.external_attr >> 16) & 0o777 if member.create_system == 3 else 0
+        # Never extract setuid/setgid/sticky bits; make sure the owner can still use the path
+        return (mode or default) | (0o700 if member.is_dir() else 0o600)
+
+    def extract(self, archive_path: str, destination: str, uid: Optional[int] = None, gid: Optional[int] = None,
+                progress=None) -> Dict:
+        """Extract archive_path into destination; returns counts of created files/directories and bytes"""
+        directories, files, total_bytes = self.plan(archive_path, destination)
+        dest_real = os.path.realpath(destination)
+
+        if progress:
+            progress.start_phase('extract', len(files), total_bytes)
+
+        created_dirs: List[str] = []
+        created_files: List[str] = []
+        handles: List[zipfile.ZipFile] = []
+        local = threading.local()
+        stop = threading.Event()
+        pending = set()
+
+        def extract_file(member: zipfile.ZipInfo, target: str) -> Tuple[str, int, bool]:
+            zf = getattr(local, 'zf', None)
+            if zf is None:
+                # One handle per worker thread so reads don't serialise on a shared file position
+                zf = local.zf = zipfile.ZipFile(archive_path, 'r')
+                handles.append(zf)
+            existed = os.path.lexists(target)
+            written = self._extract_file(zf, member, target, dest_real, uid, gid, stop)
+            return target, written, existed
+
+        def collect(future) -> int:
+            target, written, existed = future.result()
+            if not existed:
+                created_files.append(target)
+            return written
+
+        # Missing components of the destination itself, outermost first
+        missing: List[str] = []
+        parent = dest_real
+        while not os.path.lexists(parent):
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+        directories = [(directory, 0o755) for directory in reversed(missing)] + directories
+
+        try:
+            for directory, mode in directories:
+                if os.path.lexists(directory):
+                    # Existing directories are left exactly as they are
+                    if not os.path.isdir(directory) or os.path.islink(directory):
+                        raise ZipLimitError(f"Cannot extract into {directory}: not a directory")
+                    continue
+                os.mkdir(directory, mode)
+                created_dirs.append(directory)
+                os.chmod(directory, mode)
+                if uid is not None:
+                    os.chown(directory, uid, gid)
+
+            queue = iter(files)
+            while True:
+                # Bounded submission keeps memory flat for archives with many members
+                while len(pending) < self.workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    pending.add(self.executor.submit(extract_file, *item))
+                if not pending:
+                    break
+                finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                error = None
+                for future in finished:
+                    # Collect every finished member before raising so rollback sees all created files
+                    try:
+                        written = collect(future)
+                    except BaseException as e:
+                        error = error or e
+                        continue
+                    if progress:
+                        progress.advance(1, written)
+                if error:
+                    raise error
+                if progress:
+                    progress.check_cancelled()
+        except BaseException:
+            stop.set()
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                try:
+                    collect(future)
+                except BaseException:
+                    pass
+            self._remove_created(created_files, created_dirs)
+            raise
+        finally:
+            for zf in handles:
+                zf.close()
+
+        return {'files': len(files), 'directories': len(created_dirs), 'bytes': total_bytes}
+
+    @staticmethod
+    def _extract_file(zf: zipfile.ZipFile, member: zipfile.ZipInfo, target: str, dest_real: str,
+                      uid: Optional[int], gid: Optional[int], stop: threading.Event) -> int:
+        parent = os.path.dirname(target)
+        # A symlinked directory inside the destination must not redirect writes outside it
+        if os.path.commonpath([dest_real, os.path.realpath(parent)]) != dest_real:
+            raise ZipLimitError(f"Unsafe path detected in archive: {member.filename}")
+        if os.path.isdir(target) and not os.path.islink(target):
+            raise ZipLimitError(f"Cannot extract {member.filename}: a directory with that name exists")
+
+        mode = SafeZipExtractor._member_mode(member, 0o644)
+        temp_path = os.path.join(parent, f".{os.path.basename(target)}.{threading.get_ident():x}.unzip")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        written = 0
+        try:
+            # Ownership and mode are set before any data lands, so nothing needs a chown pass afterwards
+            if uid is not None:
+                os.fchown(fd, uid, gid)
+            os.fchmod(fd, mode)
+            with zf.open(member) as src, os.fdopen(fd, 'wb', closefd=False) as dst:
+                while True:
+                    if stop.is_set():
+                        raise InterruptedError("Extraction stopped")
+                    chunk = src.read(COPY_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    written += len(chunk)
+            os.close(fd)
+            fd = None
+            os.replace(temp_path, target)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return written
+
+    @staticmethod
+    def _remove_created(created_files: List[str], created_dirs: List[str]) -> None:
+        for path in created_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        for path in reversed(created_dirs):
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+
+_extractor: Optional[SafeZipExtractor] = None
+
+
+def get_zip_extractor() -> SafeZipExtractor:
+    """Return the shared extractor configured from UNZIP_* environment variables."""
+    global _extractor
+    if _extractor is None:
+        _extractor = SafeZipExtractor(
+            max_total_bytes=int(os.getenv('UNZIP_MAX_TOTAL_BYTES', 20 * 1024 ** 3)),
+            max_files=int(os.getenv('UNZIP_MAX_FILES', 200000)),
+            max_ratio=float(os.getenv('UNZIP_MAX_RATIO', 200)),
+            workers=int(os.getenv('UNZIP_WORKERS', 4))
+        )
+    return _extractor
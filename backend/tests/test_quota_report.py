@@ -0,0 +1,24 @@
+import glob
+import json
+import os
+
+import pytest
+
+from services.quota_report import parse_repquota
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'benchmarks', 'data', 'repquota')
+CASES = sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt')))
+
+
+def test_corpus_is_present():
+    assert CASES
+
+
+@pytest.mark.parametrize('report_path', CASES, ids=[os.path.basename(path)[:-4] for path in CASES])
+def test_parse_repquota_matches_expected(report_path):
+    with open(report_path) as f:
+        parsed = parse_repquota(f.read())
+    with open(report_path[:-4] + '.json') as f:
+        expected = json.load(f)
+    assert parsed == expected
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from utils.rate_limit_store import SQLiteWindowStore
+
+WORKERS = 8
+HITS = 200
+LIMIT = 50
+WINDOW = 3600
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+
+
+def fork_hits(store, key_for_worker) -> list:
+    """Fork WORKERS processes that each send HITS hits; return how many each got admitted"""
+    children = []
+    for worker in range(WORKERS):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                admitted = sum(store.hit(key_for_worker(worker), LIMIT, WINDOW)[0] for _ in range(HITS))
+                os.write(write_fd, str(admitted).encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    admitted = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as pipe:
+            admitted.append(int(pipe.read() or -1))
+        os.waitpid(pid, 0)
+    return admitted
+
+
+def test_shared_key_admits_exactly_limit_across_workers(tmp_path):
+    store = SQLiteWindowStore(str(tmp_path / 'rate_limit.db'))
+    admitted = fork_hits(store, lambda worker: 'rate_limit:sw:general_api:user_1')
+    assert -1 not in admitted
+    assert sum(admitted) == LIMIT
+
+
+def test_each_worker_key_gets_its_own_limit(tmp_path):
+    store = SQLiteWindowStore(str(tmp_path / 'rate_limit.db'))
+    admitted = fork_hits(store, lambda worker: f'rate_limit:sw:general_api:user_{worker}')
+    assert admitted == [LIMIT] * WORKERS
@@ -4,6 +4,7 @@ import platform
 from functools import wraps
 from flask import current_app, request, jsonify
 from .error_handlers import AuthenticationError
+from .principal import get_principal
 
 # Import Unix/Linux specific modules
 try:
@@ -168,9 +169,8 @@ def token_required(f):
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
             current_user_id = data['user_id']
             
-            # Get user from database
-            from models.user import User
-            current_user = User.query.get(current_user_id)
+            # Cached, immutable principal (no DB round trip on a cache hit)
+            current_user = get_principal(current_user_id, data.get('iat'))
             if not current_user:
                 return jsonify({'success': False, 'error': 'User not found'}), 401
                 
@@ -196,8 +196,8 @@ def admin_required(f):
             
         current_user = args[0]  # First argument should be current_user from token_required
         
-        # Check if user is admin
-        if not (current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root'):
+        # Check if user is admin (precomputed on the principal)
+        if not current_user.admin:
             return jsonify({
                 'success': False, 
                 'error': 'Admin privileges required'
@@ -213,6 +213,9 @@ def permission_required(resource_type, action):
         @wraps(f)
         @token_required
         def decorated(current_user, *args, **kwargs):
+            if current_user.admin:
+                return f(current_user, *args, **kwargs)
+
             from services.user_service import UserService
 
             user_service = UserService()
@@ -0,0 +1,377 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import wraps
+from time import monotonic, sleep, time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """Thread-safe in-process cache with a size bound (LRU) and per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[Any, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached value or _MISSING"""
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                del self._entries[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheTier:
+    """Second tier shared by all workers and hosts; values are stored as JSON"""
+
+    def __init__(self, client, prefix: str = 'cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(self.prefix + key, json.dumps(value, default=str), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = list(self.client.scan_iter(match=self.prefix + prefix + '*', count=500))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        """Cross-worker single-flight lock for computing key"""
+        return bool(self.client.set(f"{self.prefix}lock:{key}", '1', nx=True, px=max(1, int(ttl * 1000))))
+
+    def release(self, key: str) -> None:
+        self.client.delete(f"{self.prefix}lock:{key}")
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = _MISSING
+        self.error = None
+
+
+class SharedCache:
+    """Two-tier response cache: in-process LRU+TTL in front of optional Redis.
+
+    ``get_or_compute`` is single-flight: concurrent misses for one key in a
+    process wait for the first caller's result instead of all recomputing it,
+    and with Redis a short lock key does the same across workers. With Redis
+    enabled, local entries live at most ``local_ttl`` seconds so invalidations
+    made by another worker are seen quickly.
+    """
+
+    def __init__(self, max_entries: int = 1024, redis_tier: Optional[RedisCacheTier] = None,
+                 local_ttl: float = 5.0, compute_timeout: float = 30.0):
+        self.local = LRUTTLCache(max_entries)
+        self.redis = redis_tier
+        self.local_ttl = local_ttl
+        self.compute_timeout = compute_timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'redis_hits': 0, 'misses': 0, 'computes': 0, 'waits': 0,
+                       'errors': 0, 'redis_errors': 0}
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, key: str) -> Any:
+        """Return the cached value for key, or None"""
+        value = self._lookup(key)
+        return None if value is _MISSING else value
+
+    def _lookup(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self._count('hits')
+            return value
+        if self.redis is not None:
+            try:
+                value = self.redis.get(key)
+            except Exception as e:
+                self._count('redis_errors')
+                print(f"Warning: cache redis get failed: {e}")
+                value = _MISSING
+            if value is not _MISSING:
+                self._count('redis_hits')
+                self.local.set(key, value, self.local_ttl)
+                return value
+        return _MISSING
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.local.set(key, value, min(ttl, self.local_ttl) if self.redis is not None else ttl)
+        if self.redis is not None:
+            try:
+                self.redis.set(key, value, ttl)
+            except Exception as e:
+                self._count('redis_errors')
+                print(f"Warning: cache redis set failed: {e}")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: float) -> Any:
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        self._count('misses')
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self._count('waits')
+            if flight.event.wait(self.compute_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            # The leader is stuck; don't queue behind it forever
+            return compute()
+
+        try:
+            value = self._compute_shared(key, compute, ttl)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            self._count('errors')
+            raise
+        finally:
+            flight.event.set()
+            with self._flights_lock:
+                self._flights.pop(key, None)
+
+    def _compute_shared(self, key: str, compute: Callable[[], Any], ttl: float) -> Any:
+        locked = False
+        if self.redis is not None:
+            try:
+                locked = self.redis.acquire(key, self.compute_timeout)
+                if not locked:
+                    # Another worker is computing it; wait briefly for its result
+                    deadline = monotonic() + min(self.compute_timeout, 5.0)
+                    while monotonic() < deadline:
+                        sleep(0.05)
+                        value = self.redis.get(key)
+                        if value is not _MISSING:
+                            self._count('redis_hits')
+                            self.local.set(key, value, min(ttl, self.local_ttl))
+                            return value
+            except Exception as e:
+                self._count('redis_errors')
+                print(f"Warning: cache redis lock failed: {e}")
+        try:
+            self._count('computes')
+            value = compute()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            if locked:
+                try:
+                    self.redis.release(key)
+                except Exception:
+                    pass
+
+    def invalidate(self, key: Optional[str] = None, prefix: Optional[str] = None) -> int:
+        """Drop one key, every key starting with prefix, or everything"""
+        removed = 0
+        if key is not None:
+            self.local.delete(key)
+            removed = 1
+        elif prefix is not None:
+            removed = self.local.delete_prefix(prefix)
+        else:
+            removed = len(self.local)
+            self.local.clear()
+        if self.redis is not None:
+            try:
+                if key is not None:
+                    self.redis.delete(key)
+                else:
+                    removed = max(removed, self.redis.delete_prefix(prefix or ''))
+            except Exception as e:
+                self._count('redis_errors')
+                print(f"Warning: cache redis invalidate failed: {e}")
+        return removed
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['redis_hits'] + stats['misses']
+        stats.update({
+            'entries': len(self.local),
+            'max_entries': self.local.max_entries,
+            'evictions': self.local.evictions,
+            'expirations': self.local.expirations,
+            'hit_rate': round((stats['hits'] + stats['redis_hits']) / lookups, 4) if lookups else None,
+            'in_flight': len(self._flights),
+            'redis': self.redis is not None,
+            'timestamp': time()
+        })
+        return stats
+
+
+class GenerationStore:
+    """Invalidation counters in a SQLite (WAL) file shared by every worker on the host.
+
+    Without Redis each worker has its own cache, so dropping keys only reaches
+    the worker that made the change. Caches that must not serve stale entries
+    anywhere put the current generation of a counter in their keys and
+    ``bump`` it instead: every worker reads the new value on its next lookup,
+    no longer finds the old entries and lets them age out.
+    """
+
+    _SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn.executescript(self._SCHEMA)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # A connection must not cross a fork: the pid check reopens it in the child
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, names: Iterable[str]) -> Tuple[int, ...]:
+        """Current generation of each name, in order (0 for names never bumped)"""
+        names = list(names)
+        rows = dict(self._conn.execute(
+            f"SELECT name, value FROM generations WHERE name IN ({', '.join('?' * len(names))})", names
+        ).fetchall())
+        return tuple(rows.get(name, 0) for name in names)
+
+    def bump(self, name: str) -> None:
+        self._conn.execute(
+            'INSERT INTO generations (name, value) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1', (name,)
+        )
+
+
+_generations: Optional[GenerationStore] = None
+_generations_lock = threading.Lock()
+
+
+def get_generations() -> GenerationStore:
+    """Return the host-wide generation store (CACHE_GENERATIONS_DB, default instance/cache_generations.db)."""
+    global _generations
+    with _generations_lock:
+        if _generations is None:
+            db_path = os.environ.get('CACHE_GENERATIONS_DB') or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'cache_generations.db'
+            )
+            _generations = GenerationStore(db_path)
+        return _generations
+
+
+def make_cache_key(name: str, args: tuple = (), kwargs: Optional[dict] = None) -> str:
+    """Stable key for a call: name plus JSON of the arguments (not str(), which can embed object ids)"""
+    if not args and not kwargs:
+        return name
+    return f"{name}:{json.dumps([list(args), kwargs or {}], sort_keys=True, default=str, separators=(',', ':'))}"
+
+
+def cached(ttl: float, key: Optional[str] = None):
+    """Decorator caching a function's JSON-serialisable result in the shared cache.
+
+    The key is ``key`` (or the function's module-qualified name) plus the call
+    arguments. ``func.invalidate(*args, **kwargs)`` drops one entry.
+    """
+    def decorator(func):
+        name = key or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return response_cache.get_or_compute(
+                make_cache_key(name, args, kwargs), lambda: func(*args, **kwargs), ttl
+            )
+
+        wrapper.invalidate = lambda *args, **kwargs: response_cache.invalidate(make_cache_key(name, args, kwargs))
+        wrapper.cache_key = name
+        return wrapper
+    return decorator
+
+
+def _build_cache() -> SharedCache:
+    redis_tier = None
+    redis_url = os.environ.get('REDIS_URL')
+    if redis_url and os.environ.get('CACHE_USE_REDIS', 'true').lower() in ('1', 'true', 'yes'):
+        # Same REDIS_URL (and same fall-back-to-memory behaviour) as utils.rate_limiter
+        try:
+            import redis
+            client = redis.from_url(redis_url)
+            client.ping()
+            redis_tier = RedisCacheTier(client)
+        except Exception as e:
+            print(f"Warning: cache falling back to in-process only, Redis unavailable: {e}")
+    return SharedCache(
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+        redis_tier=redis_tier,
+        local_ttl=float(os.environ.get('CACHE_LOCAL_TTL', 5))
+    )
+
+
+# Process-wide response cache
+response_cache = _build_cache()
@@ -0,0 +1,124 @@
+import os
+import threading
+from time import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Import Unix/Linux specific modules
+try:
+    import pwd
+    import grp
+    UNIX_MODULES_AVAILABLE = True
+except ImportError:
+    UNIX_MODULES_AVAILABLE = False
+    pwd = None
+    grp = None
+
+_MISSING = object()
+
+
+class IdNameCache:
+    """Process-wide TTL cache for user/group (NSS) lookups.
+
+    getpwuid/getgrgid can be slow when NSS is backed by sssd or LDAP, and file
+    listings call them once per entry. Unknown uids/gids are cached as their
+    numeric string; unknown names are never cached so a freshly created user is
+    visible immediately. Call ``invalidate`` after adding or removing users.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable, resolver: Callable[[], Any], cache_missing: bool = True) -> Any:
+        now = time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Resolve outside the lock so one slow NSS call doesn't block other lookups
+        value = resolver()
+        if value is _MISSING and not cache_missing:
+            return value
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (value, now + self.ttl)
+        return value
+
+    def uid_to_name(self, uid: int) -> str:
+        """Return the user name for uid, or the uid as a string if it has no passwd entry."""
+        def resolve():
+            try:
+                return pwd.getpwuid(uid).pw_name
+            except KeyError:
+                return str(uid)
+        if not UNIX_MODULES_AVAILABLE:
+            return str(uid)
+        return self._lookup(('uid', uid), resolve)
+
+    def gid_to_name(self, gid: int) -> str:
+        """Return the group name for gid, or the gid as a string if it has no group entry."""
+        def resolve():
+            try:
+                return grp.getgrgid(gid).gr_name
+            except KeyError:
+                return str(gid)
+        if not UNIX_MODULES_AVAILABLE:
+            return str(gid)
+        return self._lookup(('gid', gid), resolve)
+
+    def getpwnam(self, name: str):
+        """Cached pwd.getpwnam; raises KeyError for unknown users like the original."""
+        def resolve():
+            try:
+                return pwd.getpwnam(name)
+            except KeyError:
+                return _MISSING
+        entry = self._lookup(('pwnam', name), resolve, cache_missing=False)
+        if entry is _MISSING:
+            raise KeyError(f"getpwnam(): name not found: '{name}'")
+        return entry
+
+    def getgrnam(self, name: str):
+        """Cached grp.getgrnam; raises KeyError for unknown groups like the original."""
+        def resolve():
+            try:
+                return grp.getgrnam(name)
+            except KeyError:
+                return _MISSING
+        entry = self._lookup(('grnam', name), resolve, cache_missing=False)
+        if entry is _MISSING:
+            raise KeyError(f"getgrnam(): name not found: '{name}'")
+        return entry
+
+    def invalidate(self) -> None:
+        """Drop every cached entry (users or groups were added/removed)."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total * 100, 2) if total else 0.0,
+                'entries': len(self._entries),
+                'ttl_seconds': self.ttl,
+                'max_entries': self.max_entries
+            }
+
+
+# Global cache instance shared by file, quota and Linux user services
+id_name_cache = IdNameCache(ttl=float(os.environ.get('ID_NAME_CACHE_TTL', 300)))
@@ -6,6 +6,13 @@ from functools import wraps
 from flask import jsonify
 from models.virtual_host import VirtualHost
 
+def is_admin_user(user):
+    """Precomputed flag on a Principal; derived for a plain User row"""
+    admin = getattr(user, 'admin', None)
+    if admin is None:
+        return bool(user.is_admin or user.role == 'admin' or user.username == 'root')
+    return admin
+
 def check_virtual_host_permission(action='read'):
     """
     Decorator to check if user has permission to perform action on virtual host
@@ -17,7 +24,7 @@ def check_virtual_host_permission(action='read'):
         @wraps(f)
         def decorated_function(current_user, *args, **kwargs):
             # Admin/root users can access everything
-            if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
+            if is_admin_user(current_user):
                 return f(current_user, *args, **kwargs)
             
             # Restrict creation to admins/root only
@@ -56,14 +63,14 @@ def can_access_virtual_host(current_user, virtual_host):
     Check if user can access a specific virtual host
     
     Args:
-        current_user: User object
+        current_user: Principal from token_required (or User object)
         virtual_host: VirtualHost object
         
     Returns:
         bool: True if user can access, False otherwise
     """
     # Admin/root users can access everything
-    if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
+    if is_admin_user(current_user):
         return True
     
     # Regular users can access virtual hosts where:
@@ -77,14 +84,14 @@ def filter_virtual_hosts_by_permission(current_user, virtual_hosts):
     Filter virtual hosts list based on user permissions
     
     Args:
-        current_user: User object
+        current_user: Principal from token_required (or User object)
         virtual_hosts: List of VirtualHost objects
         
     Returns:
         List of VirtualHost objects user can access
     """
     # Admin/root users can see everything
-    if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
+    if is_admin_user(current_user):
         return virtual_hosts
     
     # Regular users can see virtual hosts where they are creator OR linux_username matches
@@ -96,7 +103,7 @@ def check_document_root_permission(current_user, document_root, virtual_host=Non
     Check if user can modify document root
     
     Args:
-        current_user: User object
+        current_user: Principal from token_required (or User object)
         document_root: Proposed document root path
         virtual_host: VirtualHost object (for updates)
         
@@ -104,7 +111,7 @@ def check_document_root_permission(current_user, document_root, virtual_host=Non
         tuple: (bool, str) - (is_allowed, error_message)
     """
     # Admin/root users can set any document root
-    if current_user.is_admin or current_user.role == 'admin' or current_user.username == 'root':
+    if is_admin_user(current_user):
         return True, None
     
     # For regular users, restrict document root to their own directories
@@ -0,0 +1,117 @@
+import os
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional
+
+from .cache import get_generations, response_cache
+
+PRINCIPAL_KEY_PREFIX = 'auth:principal:'
+PRINCIPAL_TTL = float(os.environ.get('AUTH_PRINCIPAL_TTL', 30))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Immutable view of the authenticated user handed to routes by token_required.
+
+    Carries the User columns routes read (id, username, email, role,
+    is_admin, ...) plus ``admin`` (is_admin, the admin role or root) and the
+    domains the user can reach, computed once when the principal is built.
+    """
+    id: int
+    username: str
+    email: Optional[str]
+    role: str
+    is_admin: bool
+    is_system_user: bool
+    system_uid: Optional[int]
+    created_at: Optional[datetime]
+    last_login: Optional[datetime]
+    admin: bool = False
+    # Domains of virtual hosts the user owns (user_id) or runs as (linux_username)
+    domains: FrozenSet[str] = field(default_factory=frozenset)
+    # Domains granted through DomainPermission
+    permitted_domains: FrozenSet[str] = field(default_factory=frozenset)
+
+    def can_access_domain(self, domain: Optional[str]) -> bool:
+        if self.admin:
+            return True
+        return bool(domain) and (domain in self.domains or domain in self.permitted_domains)
+
+    def to_cache(self) -> Dict:
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        data['created_at'] = self.created_at.isoformat() if self.created_at else None
+        data['last_login'] = self.last_login.isoformat() if self.last_login else None
+        data['domains'] = sorted(self.domains)
+        data['permitted_domains'] = sorted(self.permitted_domains)
+        return data
+
+    @classmethod
+    def from_cache(cls, data: Dict) -> 'Principal':
+        data = dict(data)
+        for name in ('created_at', 'last_login'):
+            data[name] = datetime.fromisoformat(data[name]) if data.get(name) else None
+        data['domains'] = frozenset(data.get('domains') or ())
+        data['permitted_domains'] = frozenset(data.get('permitted_domains') or ())
+        return cls(**data)
+
+
+def build_principal(user) -> Principal:
+    """Build a Principal from a User row (owned domains come from the access index; admins need no queries)"""
+    from models.user import DomainPermission
+    from services.access_index import access_index
+
+    admin = bool(user.is_admin or user.role == 'admin' or user.username == 'root')
+    domains = permitted = frozenset()
+    if not admin:
+        domains = frozenset(access_index.user_vhosts(user.id, user.username))
+        permitted = frozenset(domain for (domain,) in DomainPermission.query.with_entities(
+            DomainPermission.domain).filter_by(user_id=user.id))
+    return Principal(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        role=user.role,
+        is_admin=bool(user.is_admin),
+        is_system_user=bool(user.is_system_user),
+        system_uid=user.system_uid,
+        created_at=user.created_at,
+        last_login=user.last_login,
+        admin=admin,
+        domains=domains,
+        permitted_domains=permitted
+    )
+
+
+def _load_principal(user_id: int) -> Optional[Dict]:
+    from models.user import User
+    user = User.query.get(user_id)
+    return build_principal(user).to_cache() if user else None
+
+
+def get_principal(user_id: int, issued_at=None) -> Optional[Principal]:
+    """Principal for a token's user, from the shared cache keyed by user id and token issue time.
+
+    Entries live AUTH_PRINCIPAL_TTL seconds (default 30). The key also carries
+    the global and the user's principal generation, so invalidate_principal in
+    any worker retires the entry in every worker. A fresh login carries a new
+    issue time and so always gets a freshly loaded principal. Unknown users
+    are not cached.
+    """
+    everyone, user = get_generations().get((PRINCIPAL_KEY_PREFIX, f"{PRINCIPAL_KEY_PREFIX}{user_id}"))
+    key = f"{PRINCIPAL_KEY_PREFIX}{user_id}:{issued_at or 0}:{everyone}.{user}"
+    data = response_cache.get(key)
+    if data is None:
+        data = _load_principal(user_id)
+        if data is None:
+            return None
+        response_cache.set(key, data, PRINCIPAL_TTL)
+    return Principal.from_cache(data)
+
+
+def invalidate_principal(user_id: Optional[int] = None) -> int:
+    """Drop cached principals for one user (all of their tokens), or for everyone, in every worker"""
+    if user_id is None:
+        get_generations().bump(PRINCIPAL_KEY_PREFIX)
+        return response_cache.invalidate(prefix=PRINCIPAL_KEY_PREFIX)
+    get_generations().bump(f"{PRINCIPAL_KEY_PREFIX}{user_id}")
+    return response_cache.invalidate(prefix=f"{PRINCIPAL_KEY_PREFIX}{user_id}:")
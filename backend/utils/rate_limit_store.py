@@ -0,0 +1,270 @@
+import math
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Dict, List, Tuple
+
+# Sliding window counter: each key keeps the request counts of the current and
+# the previous fixed window and estimates the sliding count as
+#     previous * (share of the previous window still inside the sliding window) + current
+# Memory per key is three numbers no matter how many requests it receives.
+
+
+def window_estimate(previous: float, current: float, now: float, window: float) -> float:
+    """Requests inside the sliding window ending at now"""
+    elapsed = (now % window) / window
+    return previous * (1.0 - elapsed) + current
+
+
+def window_info(limit: int, window: float, now: float, previous: float, current: float,
+                allowed: bool) -> Tuple[bool, Dict]:
+    """The (allowed, info) pair RateLimiter.is_allowed returns, from a key's counters after the hit"""
+    estimate = window_estimate(previous, current, now, window)
+    window_end = (now // window + 1) * window
+    if allowed or previous <= 0 or current >= limit:
+        # Allowed: the counters are back to zero at the latest when the window ends.
+        # Denied by the current window alone: nothing frees up before it ends.
+        reset = window_end
+    else:
+        # Denied because of the previous window's share: one request fits again as soon as
+        # previous * (1 - elapsed) <= limit - 1 - current
+        elapsed = 1.0 - (limit - 1 - current) / previous
+        reset = (now // window + max(0.0, elapsed)) * window
+    used = int(math.ceil(estimate - 1e-9))
+    return allowed, {
+        'limit': limit,
+        'remaining': max(0, limit - used),
+        'reset': int(math.ceil(reset)),
+        'current': used if allowed else used + 1
+    }
+
+
+def _rolled(row, index: int) -> Tuple[float, float]:
+    """(previous, current) counts at window index from a stored (w, p, c) row"""
+    if row is None:
+        return 0.0, 0.0
+    w, previous, current = row
+    if w == index:
+        return previous, current
+    return (current if w == index - 1 else 0.0), 0.0
+
+
+class MemoryWindowStore:
+    """In-process sliding window counters for one worker.
+
+    Keys are spread over ``shards`` dicts, each with its own lock, so threads
+    hitting different keys rarely contend. An entry is ``[window index,
+    previous count, current count, window]``. Once both of its windows have
+    passed the entry counts nothing and is evicted by a sweep that runs on a
+    shard at most every ``sweep_interval`` seconds, inline with a hit.
+    """
+
+    def __init__(self, shards: int = 16, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._shards: List[Dict[str, list]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._swept_at = [time()] * shards
+        self.evictions = 0
+
+    def _shard(self, key: str) -> int:
+        return hash(key) % len(self._shards)
+
+    @staticmethod
+    def _roll(entry: list, index: int) -> None:
+        """Advance an entry to window index (the old current window becomes the previous one)"""
+        if entry[0] != index:
+            entry[1] = entry[2] if entry[0] == index - 1 else 0
+            entry[2] = 0
+            entry[0] = index
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> Tuple[bool, Dict]:
+        """Count cost requests for key if they fit in the limit; cost=0 only reports"""
+        now = time()
+        index = int(now // window)
+        shard = self._shard(key)
+        with self._locks[shard]:
+            entries = self._shards[shard]
+            if now - self._swept_at[shard] >= self.sweep_interval:
+                self._sweep(shard, now)
+            entry = entries.get(key)
+            if entry is None:
+                if cost <= 0:
+                    return window_info(limit, window, now, 0, 0, True)
+                entry = entries[key] = [index, 0, 0, window]
+            self._roll(entry, index)
+            allowed = window_estimate(entry[1], entry[2], now, window) + cost <= limit
+            if allowed:
+                entry[2] += cost
+            return window_info(limit, window, now, entry[1], entry[2], allowed)
+
+    def _sweep(self, shard: int, now: float) -> None:
+        entries = self._shards[shard]
+        idle = [key for key, entry in entries.items() if int(now // entry[3]) > entry[0] + 1]
+        for key in idle:
+            del entries[key]
+        self.evictions += len(idle)
+        self._swept_at[shard] = now
+
+    def sweep(self) -> int:
+        """Evict idle keys from every shard now; returns how many were dropped"""
+        before = self.evictions
+        now = time()
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                self._sweep(shard, now)
+        return self.evictions - before
+
+    def reset(self, key: str) -> None:
+        shard = self._shard(key)
+        with self._locks[shard]:
+            self._shards[shard].pop(key, None)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._shards)
+
+
+class SQLiteWindowStore:
+    """Sliding window counters in a SQLite database in WAL mode, shared by every worker on the host.
+
+    A hit is one ``BEGIN IMMEDIATE`` transaction (read the key's row, count the
+    request if it fits, write it back), so concurrent hits from different
+    processes serialise on SQLite's write lock and the limit holds across
+    gunicorn workers. Each thread of each process opens its own connection
+    (also after a fork). Rows whose two windows have passed are deleted by a
+    sweep at most every ``sweep_interval`` seconds per process.
+    """
+
+    def __init__(self, path: str, sweep_interval: float = 60.0, timeout: float = 5.0):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._swept_at = time()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit ('
+                'key TEXT PRIMARY KEY, w INTEGER NOT NULL, p REAL NOT NULL, c REAL NOT NULL, '
+                'expires REAL NOT NULL) WITHOUT ROWID'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_expires ON rate_limit (expires)')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        # Counters are cheap to lose on a power cut; skip the fsync on every commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork: the pid check reopens it in the child
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> Tuple[bool, Dict]:
+        conn = self._connection()
+        if cost <= 0:
+            now = time()
+            row = conn.execute('SELECT w, p, c FROM rate_limit WHERE key = ?', (key,)).fetchone()
+            previous, current = _rolled(row, int(now // window))
+            return window_info(limit, window, now, previous, current, True)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Read the clock once the write lock is held, so hits are applied in time order
+            now = time()
+            index = int(now // window)
+            row = conn.execute('SELECT w, p, c FROM rate_limit WHERE key = ?', (key,)).fetchone()
+            previous, current = _rolled(row, index)
+            allowed = window_estimate(previous, current, now, window) + cost <= limit
+            if allowed:
+                current += cost
+                conn.execute(
+                    'INSERT INTO rate_limit (key, w, p, c, expires) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET w = excluded.w, p = excluded.p, c = excluded.c, '
+                    'expires = excluded.expires',
+                    (key, index, previous, current, (index + 2) * window)
+                )
+            if now - self._swept_at >= self.sweep_interval:
+                conn.execute('DELETE FROM rate_limit WHERE expires <= ?', (now,))
+                self._swept_at = now
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return window_info(limit, window, now, previous, current, allowed)
+
+    def sweep(self) -> int:
+        """Delete rows whose windows have both passed; returns how many were dropped"""
+        cursor = self._connection().execute('DELETE FROM rate_limit WHERE expires <= ?', (time(),))
+        self._swept_at = time()
+        return cursor.rowcount
+
+    def reset(self, key: str) -> None:
+        self._connection().execute('DELETE FROM rate_limit WHERE key = ?', (key,))
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limit').fetchone()[0]
+
+
+# KEYS[1] = counter hash; ARGV = limit, window (seconds), cost.
+# Uses the server clock so every worker and host sees the same windows; returns
+# {allowed, now, previous, current} with the floats as strings.
+_REDIS_HIT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local index = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'w', 'p', 'c')
+local w = tonumber(state[1])
+local previous = tonumber(state[2]) or 0
+local current = tonumber(state[3]) or 0
+if w == nil then
+    previous = 0
+    current = 0
+elseif w ~= index then
+    if w == index - 1 then previous = current else previous = 0 end
+    current = 0
+end
+local elapsed = (now - index * window) / window
+local allowed = 0
+if previous * (1 - elapsed) + current + cost <= limit then
+    allowed = 1
+    if cost > 0 then
+        current = current + cost
+        redis.call('HSET', KEYS[1], 'w', index, 'p', previous, 'c', current)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(window * 2000))
+    end
+end
+return {allowed, tostring(now), tostring(previous), tostring(current)}
+"""
+
+
+class RedisWindowStore:
+    """Sliding window counters in Redis, shared by every worker and host.
+
+    Each key is a small hash (window index, previous and current count)
+    that expires two windows after its last counted request, and a hit is one
+    EVALSHA round trip.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._hit = client.register_script(_REDIS_HIT)
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> Tuple[bool, Dict]:
+        allowed, now, previous, current = self._hit(keys=[key], args=[limit, window, cost])
+        return window_info(limit, window, float(now), float(previous), float(current), bool(allowed))
+
+    def reset(self, key: str) -> None:
+        self.client.delete(key)
@@ -7,23 +7,27 @@ from datetime import datetime, timedelta
 import redis
 import os
 
+from .rate_limit_store import MemoryWindowStore, RedisWindowStore, SQLiteWindowStore
+
 class RateLimiter:
     """Rate Limiter สำหรับ API endpoints"""
     
     def __init__(self):
-        # ใช้ Redis ถ้ามี หรือ in-memory dict สำหรับ development
+        # ใช้ Redis ถ้ามี ไม่งั้นใช้ store บนเครื่อง (ดู _local_store)
+        # ทุกแบบใช้ sliding window counter: หน่วยความจำคงที่ต่อ key (utils.rate_limit_store)
         self.use_redis = os.environ.get('REDIS_URL') is not None
+        self.store = None
         
         if self.use_redis:
             try:
-                import redis
                 self.redis_client = redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
                 self.redis_client.ping()  # Test connection
+                self.store = RedisWindowStore(self.redis_client)
             except Exception:
                 self.use_redis = False
-                self.memory_store = {}
-        else:
-            self.memory_store = {}
+        
+        if self.store is None:
+            self.store = self._local_store()
         
         # Rate limiting rules
         self.limits = {
@@ -36,6 +40,19 @@ class RateLimiter:
             'sync_check': {'requests': 10, 'window': 600},           # 10 requests per 10 minutes
         }
     
+    def _local_store(self):
+        """Store เมื่อไม่มี Redis: SQLite (WAL) ที่ทุก worker บนเครื่องเดียวกันใช้ร่วมกัน
+        หรือ memory ต่อ worker ถ้า RATE_LIMIT_STORE=memory (limit จริงจะเป็น N เท่าของที่ตั้งไว้)"""
+        sweep_interval = float(os.environ.get('RATE_LIMIT_SWEEP_INTERVAL', 60))
+        if os.environ.get('RATE_LIMIT_STORE', 'sqlite').lower() == 'sqlite':
+            path = os.environ.get('RATE_LIMIT_DB') or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'rate_limit.db')
+            try:
+                return SQLiteWindowStore(path, sweep_interval=sweep_interval)
+            except Exception as e:
+                print(f"Rate limit SQLite store unavailable ({path}): {e}; using per-worker memory")
+        return MemoryWindowStore(sweep_interval=sweep_interval)
+    
     def _get_client_id(self) -> str:
         """ได้รับ client identifier (IP address หรือ user ID)"""
         if hasattr(g, 'current_user') and g.current_user:
@@ -44,78 +61,23 @@ class RateLimiter:
     
     def _get_key(self, rule_name: str, client_id: str) -> str:
         """สร้าง key สำหรับ rate limiting"""
-        return f"rate_limit:{rule_name}:{client_id}"
+        # prefix ใหม่: key แบบ sorted set ของ engine เดิมใน Redis จะหมดอายุไปเอง
+        return f"rate_limit:sw:{rule_name}:{client_id}"
     
-    def _is_allowed_redis(self, key: str, limit: int, window: int) -> tuple[bool, dict]:
-        """ตรวจสอบ rate limit ด้วย Redis"""
+    def _hit(self, key: str, limit: int, window: int, cost: int = 1) -> tuple[bool, dict]:
+        """นับ request ใน store (cost=0 = ดูสถานะอย่างเดียว ไม่นับ)"""
         try:
-            pipe = self.redis_client.pipeline()
-            pipe.multi()
-            
-            # ใช้ sliding window log algorithm
-            now = time.time()
-            cutoff = now - window
-            
-            # ลบ entries เก่า
-            pipe.zremrangebyscore(key, 0, cutoff)
-            
-            # นับจำนวน requests ปัจจุบัน
-            pipe.zcard(key)
-            
-            # เพิ่ม request ปัจจุบัน
-            pipe.zadd(key, {str(now): now})
-            
-            # Set expiry
-            pipe.expire(key, window)
-            
-            results = pipe.execute()
-            current_requests = results[1] + 1  # +1 for current request
-            
-            remaining = max(0, limit - current_requests)
-            reset_time = now + window
-            
-            return current_requests <= limit, {
-                'limit': limit,
-                'remaining': remaining,
-                'reset': int(reset_time),
-                'current': current_requests
-            }
-            
+            return self.store.hit(key, limit, window, cost)
         except Exception as e:
-            # Fallback to allowing request if Redis fails
-            print(f"Redis rate limiting error: {e}")
+            # Fallback to allowing request if the store fails
+            print(f"Rate limit store error: {e}")
             return True, {
                 'limit': limit,
-                'remaining': limit - 1,
+                'remaining': limit - cost,
                 'reset': int(time.time() + window),
-                'current': 1
+                'current': cost
             }
     
-    def _is_allowed_memory(self, key: str, limit: int, window: int) -> tuple[bool, dict]:
-        """ตรวจสอบ rate limit ด้วย in-memory storage"""
-        now = time.time()
-        cutoff = now - window
-        
-        # ลบ entries เก่า
-        if key in self.memory_store:
-            self.memory_store[key] = [req_time for req_time in self.memory_store[key] if req_time > cutoff]
-        else:
-            self.memory_store[key] = []
-        
-        # เพิ่ม request ปัจจุบัน
-        self.memory_store[key].append(now)
-        
-        current_requests = len(self.memory_store[key])
-        remaining = max(0, limit - current_requests)
-        reset_time = now + window
-        
-        return current_requests <= limit, {
-            'limit': limit,
-            'remaining': remaining,
-            'reset': int(reset_time),
-            'current': current_requests
-        }
-    
     def is_allowed(self, rule_name: str, client_id: Optional[str] = None) -> tuple[bool, dict]:
         """ตรวจสอบว่า request นี้ผ่าน rate limit หรือไม่"""
         if rule_name not in self.limits:
@@ -128,12 +90,7 @@ class RateLimiter:
         if client_id is None:
             client_id = self._get_client_id()
         
-        key = self._get_key(rule_name, client_id)
-        
-        if self.use_redis:
-            return self._is_allowed_redis(key, limit, window)
-        else:
-            return self._is_allowed_memory(key, limit, window)
+        return self._hit(self._get_key(rule_name, client_id), limit, window)
     
     def get_limit_info(self, rule_name: str, client_id: Optional[str] = None) -> dict:
         """ได้รับข้อมูล rate limit สำหรับ rule"""
@@ -141,7 +98,12 @@ class RateLimiter:
             return {'limit': 0, 'window': 0}
         
         limit_config = self.limits[rule_name]
-        allowed, info = self.is_allowed(rule_name, client_id)
+        if client_id is None:
+            client_id = self._get_client_id()
+        
+        # ดูสถานะโดยไม่นับเป็น request
+        allowed, info = self._hit(self._get_key(rule_name, client_id),
+                                  limit_config['requests'], limit_config['window'], cost=0)
         
         return {
             'rule': rule_name,
@@ -220,14 +182,7 @@ def reset_rate_limit(rule_name: str, client_id: Optional[str] = None) -> bool:
         if client_id is None:
             client_id = rate_limiter._get_client_id()
         
-        key = rate_limiter._get_key(rule_name, client_id)
-        
-        if rate_limiter.use_redis:
-            rate_limiter.redis_client.delete(key)
-        else:
-            if key in rate_limiter.memory_store:
-                del rate_limiter.memory_store[key]
-        
+        rate_limiter.store.reset(rate_limiter._get_key(rule_name, client_id))
         return True
     except Exception:
         return False 
\ No newline at end of file